@@ -104,6 +104,40 @@ def image_send_notification(bytes_written, expected_size, image_meta, request,
         LOG.error(msg)
 
 
+def get_project_usage(context, usage_fn, project_id, **kwargs):
+    """Return a usage of a project, computed at most once per request.
+
+    The usages are memoized on the request context, so that the quota
+    checks done by the different layers handling a single request do not
+    query the database for the same usage several times.
+
+    :param context: The RequestContext
+    :param usage_fn: The db api function computing the usage, called with
+                     the context, the project_id and the keyword arguments
+    :param project_id: The project whose usage is computed
+    :returns: The usage returned by usage_fn
+    """
+    memo = getattr(context, 'project_usage', None)
+    if not isinstance(memo, dict):
+        return usage_fn(context, project_id, **kwargs)
+
+    key = (usage_fn, project_id) + tuple(sorted(kwargs.items()))
+    if key not in memo:
+        memo[key] = usage_fn(context, project_id, **kwargs)
+    return memo[key]
+
+
+def drop_project_usage(context):
+    """Forget the usages memoized on the request context.
+
+    This must be called whenever the images of the projects may have
+    changed, so that the next quota check sees the current usage.
+    """
+    memo = getattr(context, 'project_usage', None)
+    if isinstance(memo, dict):
+        memo.clear()
+
+
 def get_remaining_quota(context, db_api, image_id=None):
     """Method called to see if the user is allowed to store an image.
 
@@ -143,9 +177,8 @@ def get_remaining_quota(context, db_api, image_id=None):
     if users_quota <= 0:
         return
 
-    usage = db_api.user_get_storage_usage(context,
-                                          context.owner,
-                                          image_id=image_id)
+    usage = get_project_usage(context, db_api.user_get_storage_usage,
+                              context.owner, image_id=image_id)
     return users_quota - usage
 
 
@@ -22,12 +22,16 @@ When subsequent requests for the same image file are received,
 the local cached copy of the image file is returned.
 """
 
+import functools
 import http.client as http
 import re
+import time
 
+from oslo_config import cfg
 from oslo_log import log as logging
 import webob
 
+from glance.api.common import image_send_notification
 from glance.api.common import size_checked_iter
 from glance.api import policy
 from glance.api.v2 import policy as api_policy
@@ -35,12 +39,16 @@ from glance.common import exception
 from glance.common import utils
 from glance.common import wsgi
 import glance.db
-from glance.i18n import _LE, _LI
+from glance.i18n import _, _LE, _LI
 from glance import image_cache
+from glance.image_cache import metadata as cache_metadata
+from glance.image_cache import metrics as cache_metrics
 from glance import notifier
 
 LOG = logging.getLogger(__name__)
 
+CONF = cfg.CONF
+
 PATTERNS = {
     ('v1', 'GET'): re.compile(r'^/v1/images/([^\/]+)$'),
     ('v1', 'DELETE'): re.compile(r'^/v1/images/([^\/]+)$'),
@@ -49,10 +57,46 @@ PATTERNS = {
 }
 
 
+class CacheFileReader(object):
+    """
+    File-like object for a cached image file which is handed to the
+    ``wsgi.file_wrapper`` of the WSGI server, so that the server can send
+    the file itself (e.g. using sendfile) rather than iterating over it in
+    Python.
+
+    The cached file is opened through ``ImageCache.open_for_read`` and is
+    released, updating the hit count of the image, when the server closes
+    the reader once the response is complete.
+    """
+
+    def __init__(self, cache, image_id, on_close=None):
+        self._context = cache.open_for_read(image_id)
+        self._file = self._context.__enter__()
+        self._on_close = on_close
+        self._closed = False
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._context.__exit__(None, None, None)
+        finally:
+            if self._on_close is not None:
+                self._on_close()
+
+
 class CacheFilter(wsgi.Middleware):
 
     def __init__(self, app):
         self.cache = image_cache.ImageCache()
+        self.metrics = cache_metrics.METRICS
         self.policy = policy.Enforcer()
         LOG.info(_LI("Initialized image cache middleware"))
         super(CacheFilter, self).__init__(app)
@@ -106,10 +150,16 @@ class CacheFilter(wsgi.Middleware):
         Retrieves image and for v2 api and creates adapter like object
         to access image core or custom properties on request.
         """
-        db_api = glance.db.get_api()
-        image_repo = glance.db.ImageRepo(request.context, db_api)
         try:
-            image = image_repo.get(image_id)
+            image = cache_metadata.METADATA_CACHE.get(request.context,
+                                                      image_id)
+            if image is None:
+                generation = cache_metadata.METADATA_CACHE.generation
+                db_api = glance.db.get_api()
+                image_repo = glance.db.ImageRepo(request.context, db_api)
+                image = image_repo.get(image_id)
+                cache_metadata.METADATA_CACHE.set(request.context, image,
+                                                  generation)
             # Storing image object in request as it is required in
             # _process_v2_request call.
             request.environ['api.cache.image'] = image
@@ -134,16 +184,16 @@ class CacheFilter(wsgi.Middleware):
 
         self._stash_request_info(request, image_id, method, version)
 
-        # Partial image download requests shall not be served from cache
-        # Bug: 1664709
-        # TODO(dharinic): If an image is already cached, add support to serve
-        # only the requested bytes (partial image download) from the cache.
-        if (request.headers.get('Content-Range') or
-                request.headers.get('Range')):
+        if request.method != 'GET':
             return None
 
-        if request.method != 'GET' or not self.cache.is_cached(image_id):
-            return None
+        started_at = time.monotonic()
+        coalesce = False
+        if not self.cache.is_cached(image_id):
+            coalesce = self._can_coalesce(request, image_id)
+            if not coalesce:
+                self.metrics.incr('misses')
+                return None
 
         method = getattr(self, '_get_%s_image_metadata' % version)
         image, metadata = method(request, image_id)
@@ -157,8 +207,31 @@ class CacheFilter(wsgi.Middleware):
         # middleware
         self._enforce(request, image)
 
-        LOG.debug("Cache hit for image '%s'", image_id)
-        image_iterator = self.get_from_cache(image_id)
+        if coalesce:
+            # NOTE: Without a known image size there is no telling when
+            # the image has been read completely from the cache.
+            if not metadata['size']:
+                return None
+            LOG.debug("Image '%s' is being cached, serving it from the "
+                      "cache as it is written", image_id)
+            request.environ['api.cache.range'] = None
+            self.metrics.incr('coalesced_hits')
+            image_iterator = self.cache.get_coalescing_iter(
+                image_id, int(metadata['size']),
+                fallback=functools.partial(self._get_from_backend, request))
+        else:
+            LOG.debug("Cache hit for image '%s'", image_id)
+            self.metrics.incr('hits')
+            # NOTE: Partial image download requests (Bug: 1664709) are
+            # served from the cached file as well, only the requested bytes
+            # are read.
+            range_ = self._get_request_range(request, image_id)
+            request.environ['api.cache.range'] = range_
+            offset, chunk_size = range_[:2] if range_ else (0, None)
+            image_iterator = self.metrics.count_bytes(
+                self.get_from_cache(image_id, offset=offset,
+                                    chunk_size=chunk_size),
+                'bytes_from_cache', started_at=started_at)
         method = getattr(self, '_process_%s_request' % version)
 
         try:
@@ -170,6 +243,75 @@ class CacheFilter(wsgi.Middleware):
             LOG.error(msg)
             self.cache.delete_cached_image(image_id)
 
+    def _can_coalesce(self, request, image_id):
+        """
+        Determine whether a download of an image which is not cached can
+        be served from the cache as the image is being written to it by
+        another download.
+        """
+        if not CONF.image_cache_coalesce_misses:
+            return False
+        if (request.headers.get('Range') or
+                request.headers.get('Content-Range')):
+            return False
+        return self.cache.is_being_cached(image_id)
+
+    def _get_from_backend(self, request, offset):
+        """
+        Fetch the image data from the given offset on through the rest of
+        the pipeline. Used when following an image which is being cached
+        fails.
+        """
+        backend_request = request.copy_get()
+        if offset:
+            backend_request.headers['Range'] = 'bytes=%d-' % offset
+        response = backend_request.get_response(self.application)
+        if response.status_int not in (http.OK, http.PARTIAL_CONTENT):
+            msg = _("Failed to fetch the remaining data of image "
+                    "%(image_id)s from the backend: %(status)s") % {
+                'image_id': request.environ['api.cache.image_id'],
+                'status': response.status}
+            raise exception.GlanceException(msg)
+        return response.app_iter
+
+    def _get_request_range(self, request, image_id):
+        """
+        Determine the bytes of the cached image file requested through a
+        'Range' (or, for backward compatibility, 'Content-Range') header.
+
+        :returns: tuple of offset, number of bytes and last byte position
+                  of the requested range, or None for a full image download
+        :raises: webob.exc.HTTPRequestRangeNotSatisfiable on a malformed
+                 or unsatisfiable range
+        """
+        if not (request.headers.get('Range') or
+                request.headers.get('Content-Range')):
+            return None
+
+        # NOTE: The cached file is what will be served, so validate the
+        # requested range against its actual size.
+        image_size = self.cache.get_image_size(image_id)
+        range_val = wsgi.Request(request.environ).get_range_from_request(
+            image_size)
+
+        offset = 0
+        if isinstance(range_val, webob.byterange.Range):
+            # NOTE: webob parsing is zero-indexed and the end is exclusive,
+            # i.e. "bytes=0-4" is parsed as start 0 and end 5.
+            if range_val.start >= 0:
+                offset = range_val.start
+            elif abs(range_val.start) < image_size:
+                # Suffix-length request like "bytes=-2" as per rfc7233
+                offset = image_size + range_val.start
+            stop = image_size
+            if range_val.end is not None and range_val.end < image_size:
+                stop = range_val.end
+        else:
+            offset = range_val.start
+            stop = min(range_val.stop, image_size)
+
+        return offset, stop - offset, stop - 1
+
     @staticmethod
     def _stash_request_info(request, image_id, method, version):
         """
@@ -204,10 +346,22 @@ class CacheFilter(wsgi.Middleware):
         image = request.environ['api.cache.image']
         self._verify_metadata(image_meta)
         response = webob.Response(request=request)
-        response.app_iter = size_checked_iter(response, image_meta,
-                                              image_meta['size'],
-                                              image_iterator,
-                                              notifier.Notifier())
+        range_ = request.environ.get('api.cache.range')
+        if range_ is not None:
+            offset, content_length, response_end = range_
+        else:
+            content_length = image_meta['size']
+
+        app_iter = None
+        if range_ is None and CONF.image_cache_use_file_wrapper:
+            app_iter = self._get_file_wrapper_iter(request, image_id,
+                                                   image_meta)
+        if app_iter is None:
+            app_iter = size_checked_iter(response, image_meta,
+                                         content_length,
+                                         image_iterator,
+                                         notifier.Notifier())
+        response.app_iter = app_iter
         # NOTE (flwang): Set the content-type, content-md5 and content-length
         # explicitly to be consistent with the non-cache scenario.
         # Besides, it's not worth the candle to invoke the "download" method
@@ -220,9 +374,57 @@ class CacheFilter(wsgi.Middleware):
         response.headers['Content-Type'] = 'application/octet-stream'
         if image.checksum:
             response.headers['Content-MD5'] = image.checksum
-        response.headers['Content-Length'] = str(image.size)
+        if range_ is not None:
+            response.status_int = http.PARTIAL_CONTENT
+            response.headers['Content-Range'] = 'bytes %s-%s/%s' % (
+                offset, response_end, image_meta['size'])
+            response.headers['Content-Length'] = str(content_length)
+        else:
+            response.headers['Content-Length'] = str(image.size)
         return response
 
+    def _get_file_wrapper_iter(self, request, image_id, image_meta):
+        """
+        Hand the cached image file to the ``wsgi.file_wrapper`` of the WSGI
+        server, if it provides one.
+
+        :returns: the iterable returned by ``wsgi.file_wrapper``, or None if
+                  the cached image has to be served through Python instead
+        """
+        file_wrapper = request.environ.get('wsgi.file_wrapper')
+        if file_wrapper is None:
+            return None
+
+        expected_size = int(image_meta['size'])
+        try:
+            cached_size = self.cache.get_image_size(image_id)
+        except OSError:
+            # NOTE: The image is not (or no longer) cached.
+            return None
+
+        def _send_notification():
+            # NOTE: The server sends the data directly from the file, so
+            # the amount of data sent can not be observed from here. The
+            # size of the cached file has been verified up front instead.
+            image_send_notification(expected_size, expected_size,
+                                    image_meta, request,
+                                    notifier.Notifier())
+            self.metrics.incr('bytes_from_cache', expected_size)
+
+        if cached_size != expected_size:
+            LOG.warning("Cached file for image %(image_id)s has size "
+                        "%(size)d, expected %(expected)d bytes. Not handing "
+                        "it to the WSGI server.",
+                        {'image_id': image_id, 'size': cached_size,
+                         'expected': expected_size})
+            return None
+
+        reader = CacheFileReader(self.cache, image_id,
+                                 on_close=_send_notification)
+        LOG.debug("Handing cached image '%s' to wsgi.file_wrapper",
+                  image_id)
+        return file_wrapper(reader, 65536)
+
     def process_response(self, resp):
         """
         We intercept the response coming back from the main
@@ -260,6 +462,7 @@ class CacheFilter(wsgi.Middleware):
             return process_response_method(resp, image_id, version=version)
 
     def _process_DELETE_response(self, resp, image_id, version=None):
+        cache_metadata.invalidate(image_id)
         if self.cache.is_cached(image_id):
             LOG.debug("Removing image %s from cache", image_id)
             self.cache.delete_cached_image(image_id)
@@ -303,9 +506,28 @@ class CacheFilter(wsgi.Middleware):
             return response.status_int
         return response.status
 
-    def get_from_cache(self, image_id):
-        """Called if cache hit"""
+    def get_from_cache(self, image_id, offset=0, chunk_size=None):
+        """
+        Called if cache hit
+
+        :param image_id: Image ID
+        :param offset: position of the first byte to return
+        :param chunk_size: number of bytes to return, None for all bytes
+                           from offset to the end of the cached file
+        """
         with self.cache.open_for_read(image_id) as cache_file:
-            chunks = utils.chunkiter(cache_file)
-            for chunk in chunks:
+            if offset:
+                cache_file.seek(offset)
+            if chunk_size is None:
+                chunks = utils.chunkiter(cache_file)
+                for chunk in chunks:
+                    yield chunk
+                return
+
+            remaining = chunk_size
+            while remaining > 0:
+                chunk = cache_file.read(min(remaining, 65536))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
                 yield chunk
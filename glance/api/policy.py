@@ -17,9 +17,11 @@
 """Policy Engine For Glance"""
 
 from collections import abc
+import re
 
 from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_policy import _checks
 from oslo_policy import policy
 
 from glance.common import exception
@@ -31,6 +33,8 @@ LOG = logging.getLogger(__name__)
 CONF = cfg.CONF
 _ENFORCER = None
 
+_TARGET_KEY_RE = re.compile(r'%\(([^)]+)\)s')
+
 
 class Enforcer(policy.Enforcer):
     """Responsible for loading and enforcing rules"""
@@ -90,6 +94,47 @@ class Enforcer(policy.Enforcer):
                                              target,
                                              context)
 
+    def get_target_keys(self, action):
+        """Return the keys of the target the rule of an action depends on.
+
+           :param action: String representing the action to be checked
+           :returns: A sorted tuple of the target keys referenced by the
+                     rule, or None if the rule uses checks whose inputs
+                     can not be determined.
+        """
+        self.load_rules()
+        keys = set()
+        if not self._collect_target_keys(self.rules.get(action), keys,
+                                         set()):
+            return None
+        return tuple(sorted(keys))
+
+    def _collect_target_keys(self, check, keys, seen_rules):
+        # NOTE: Only oslo_policy._checks defines all the kinds of checks, the
+        # policy module does not export the true, false, role and generic
+        # ones.
+        if check is None or isinstance(check, (_checks.TrueCheck,
+                                               _checks.FalseCheck)):
+            return True
+        if isinstance(check, (_checks.AndCheck, _checks.OrCheck)):
+            return all(self._collect_target_keys(rule, keys, seen_rules)
+                       for rule in check.rules)
+        if isinstance(check, _checks.NotCheck):
+            return self._collect_target_keys(check.rule, keys, seen_rules)
+        if isinstance(check, _checks.RuleCheck):
+            if check.match in seen_rules:
+                return True
+            seen_rules.add(check.match)
+            return self._collect_target_keys(self.rules.get(check.match),
+                                             keys, seen_rules)
+        # NOTE: Role and generic checks only read the target through the
+        # %(key)s substitutions of their match, any other kind of check may
+        # read the whole target.
+        if type(check) in (_checks.RoleCheck, _checks.GenericCheck):
+            keys.update(_TARGET_KEY_RE.findall(check.match))
+            return True
+        return False
+
     def check_is_admin(self, context):
         """Check if the given context is associated with an admin role,
            as defined via the 'context_is_admin' RBAC rule.
@@ -115,27 +160,34 @@ def _enforce_image_visibility(policy, context, visibility, target):
         policy.enforce(context, 'communitize_image', target)
 
 
+def _get_image_target_keys():
+    return tuple(k for k in dir(proxy.Image)
+                 if not k.startswith('__')
+                 # NOTE(lbragstad): The locations attributes is an
+                 # instance of ImageLocationsProxy, which isn't
+                 # serialized into anything oslo.policy can use. If
+                 # we need to use locations in policies, we need to
+                 # modify how we represent those location objects
+                 # before we call enforcement with target
+                 # information. Omitting for not until that is a
+                 # necessity.
+                 if not k == 'locations'
+                 if not callable(getattr(proxy.Image, k)))
+
+
 class ImageTarget(abc.Mapping):
     SENTINEL = object()
 
+    # NOTE: The attributes of proxy.Image are the same for every target, so
+    # they are only looked up once rather than for each image.
+    _target_keys = _get_image_target_keys()
+
     def __init__(self, target):
         """Initialize the object
 
         :param target: Object being targeted
         """
         self.target = target
-        self._target_keys = [k for k in dir(proxy.Image)
-                             if not k.startswith('__')
-                             # NOTE(lbragstad): The locations attributes is an
-                             # instance of ImageLocationsProxy, which isn't
-                             # serialized into anything oslo.policy can use. If
-                             # we need to use locations in policies, we need to
-                             # modify how we represent those location objects
-                             # before we call enforcement with target
-                             # information. Omitting for not until that is a
-                             # necessity.
-                             if not k == 'locations'
-                             if not callable(getattr(proxy.Image, k))]
 
     def __getitem__(self, key):
         """Return the value of 'key' from the target.
@@ -64,6 +64,35 @@ class ProtectedImageRepoProxy(glance.domain.proxy.Repo):
                 for image in images]
 
 
+class ReadOnlyProtectedImageRepoProxy(object):
+
+    def __init__(self, image_repo, context, property_rules):
+        """List images with their read protected properties removed.
+
+        Unlike ProtectedImageRepoProxy, the images are not proxied: the
+        extra properties of each of them are filtered once, and the read
+        rule of a property is only checked once per list.
+        """
+        self.context = context
+        self.image_repo = image_repo
+        self.property_rules = property_rules
+
+    def list(self, *args, **kwargs):
+        images = self.image_repo.list(*args, **kwargs)
+        readable = {}
+        for image in images:
+            extra_properties = {}
+            for key, value in dict(image.extra_properties).items():
+                if key not in readable:
+                    readable[key] = self.property_rules.check_property_rules(
+                        key, 'read', self.context)
+                if readable[key]:
+                    extra_properties[key] = value
+            image.extra_properties = glance.domain.ExtraProperties(
+                extra_properties)
+        return images
+
+
 class ProtectedImageProxy(glance.domain.proxy.Image):
 
     def __init__(self, image, context, property_rules):
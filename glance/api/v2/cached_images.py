@@ -17,6 +17,7 @@
 Controller for Image Cache Management API
 """
 
+import itertools
 import queue
 import threading
 
@@ -25,6 +26,7 @@ from oslo_concurrency import lockutils
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import encodeutils
+from oslo_utils import strutils
 import webob.exc
 
 from glance.api import policy
@@ -243,11 +245,14 @@ class CacheController(object):
         """
         GET /cache/ - Get currently cached and queued images
 
-        Returns dict of cached and queued images
+        Returns dict of cached and queued images, along with the hit/miss
+        and byte counters and latency histograms of the image cache of the
+        API worker serving the request.
         """
         self._enforce(req, new_policy='cache_list')
         return dict(cached_images=self.cache.get_cached_images(),
-                    queued_images=self.cache.get_queued_images())
+                    queued_images=self.cache.get_queued_images(),
+                    metrics=self.cache.get_metrics())
 
     def queue_image_from_api(self, req, image_id):
         """
@@ -256,7 +261,20 @@ class CacheController(object):
         Queues an image for caching. We do not check to see if
         the image is in the registry here. That is done by the
         prefetcher...
+
+        The optional 'x-image-cache-priority' header holds an integer,
+        images with a higher priority are cached first.
         """
+        priority = req.headers.get('x-image-cache-priority', '0')
+        try:
+            priority = int(priority)
+        except ValueError:
+            reason = _("If provided 'x-image-cache-priority' must be an "
+                       "integer.")
+            raise webob.exc.HTTPBadRequest(explanation=reason,
+                                           request=req,
+                                           content_type='text/plain')
+
         image_repo = self.gateway.get_repo(req.context)
         try:
             image = image_repo.get(image_id)
@@ -272,8 +290,8 @@ class CacheController(object):
                     "queueing")
             raise webob.exc.HTTPBadRequest(explanation=msg)
 
-        self.cache.queue_image(image_id)
-        WORKER.submit(image_id)
+        self.cache.queue_image(image_id, priority=priority)
+        WORKER.submit(image_id, priority=priority)
 
     @lockutils.synchronized('glance-cache-clean', external=True)
     def clean_cache(self, req):
@@ -293,8 +311,25 @@ class CacheController(object):
 
         Removes cached images when the cache size exceeds the maximum
         configured size. Returns the number of files and bytes pruned.
+
+        If the 'x-image-cache-prune-dry-run' header is true, nothing is
+        removed; instead the images every eviction policy would remove
+        are reported.
         """
         self._enforce(req, new_policy='cache_prune')
+        dry_run = req.headers.get('x-image-cache-prune-dry-run', 'false')
+        try:
+            dry_run = strutils.bool_from_string(dry_run, strict=True)
+        except ValueError:
+            reason = _("If provided 'x-image-cache-prune-dry-run' must be "
+                       "'true' or 'false'.")
+            raise webob.exc.HTTPBadRequest(explanation=reason,
+                                           request=req,
+                                           content_type='text/plain')
+        if dry_run:
+            return dict(eviction_policy=CONF.image_cache_eviction_policy,
+                        policies=self.cache.get_prune_report())
+
         total_files_pruned, total_bytes_pruned = self.cache.prune()
         return dict(total_files_pruned=total_files_pruned,
                     total_bytes_pruned=total_bytes_pruned)
@@ -304,7 +339,11 @@ class CacheWorker(threading.Thread):
     EXIT_SENTINEL = object()
 
     def __init__(self, *args, **kwargs):
-        self.q = queue.Queue(maxsize=-1)
+        # NOTE: Jobs are queued as (-priority, sequence, job) tuples, so
+        # that the jobs with the highest priority are processed first, in
+        # the order they were submitted.
+        self.q = queue.PriorityQueue(maxsize=-1)
+        self.sequence = itertools.count()
         # NOTE(abhishekk): Importing the prefetcher just in time to avoid
         # import loop during initialization
         from glance.image_cache import prefetcher  # noqa
@@ -315,20 +354,21 @@ class CacheWorker(threading.Thread):
         # not hang for the thread which will never exit.
         self.daemon = True
 
-    def submit(self, job):
-        self.q.put(job)
+    def submit(self, job, priority=0):
+        self.q.put((-priority, next(self.sequence), job))
 
     def terminate(self):
         # NOTE(danms): Make the API workers call this before we exit
         # to make sure any cache operations finish.
         LOG.info('Signaling cache worker thread to exit')
-        self.q.put(self.EXIT_SENTINEL)
+        # NOTE: Let the worker process the jobs submitted so far first.
+        self.q.put((float('inf'), next(self.sequence), self.EXIT_SENTINEL))
         self.join()
         LOG.info('Cache worker thread exited')
 
     def run(self):
         while True:
-            task = self.q.get()
+            task = self.q.get()[-1]
             if task == self.EXIT_SENTINEL:
                 LOG.debug("CacheWorker thread exiting")
                 break
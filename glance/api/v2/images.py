@@ -542,7 +542,9 @@ class ImagesController(object):
             limit = CONF.limit_param_default
         limit = min(CONF.api_limit_max, limit)
 
-        image_repo = self.gateway.get_repo(req.context)
+        # NOTE: The listed images are only read to be serialized, so they
+        # do not need the layers of the full image repo.
+        image_repo = self.gateway.get_readonly_repo(req.context)
         try:
             # NOTE(danms): This is just a "do you have permission to
             # list images" check. Each image is checked against
@@ -556,10 +558,10 @@ class ImagesController(object):
                                      filters=filters,
                                      member_status=member_status)
             db_image_count = len(images)
+            list_policy = api_policy.ImageListAPIPolicy(req.context,
+                                                        self.policy)
             images = [image for image in images
-                      if api_policy.ImageAPIPolicy(req.context, image,
-                                                   self.policy
-                                                   ).check('get_image')]
+                      if list_policy.check_get_image(image)]
 
             # NOTE(danms): we need to include the next marker if the DB
             # paginated. Since we filter images based on policy, we can
@@ -1744,8 +1746,13 @@ class ResponseSerializer(wsgi.JSONResponseSerializer):
             image_view['created_at'] = timeutils.isotime(image.created_at)
             image_view['updated_at'] = timeutils.isotime(image.updated_at)
 
-            if CONF.show_multiple_locations:
+            # NOTE: The locations are read once for all the fields below
+            locations = None
+            if (CONF.show_multiple_locations or CONF.show_image_direct_url or
+                    CONF.enabled_backends):
                 locations = _get_image_locations(image)
+
+            if CONF.show_multiple_locations:
                 if locations:
                     image_view['locations'] = []
                     for loc in locations:
@@ -1762,10 +1769,12 @@ class ResponseSerializer(wsgi.JSONResponseSerializer):
                               image.image_id)
 
             if CONF.show_image_direct_url:
-                locations = _get_image_locations(image)
                 if locations:
                     # Choose best location configured strategy
-                    loc = utils.sort_image_locations(locations)[0]
+                    if len(locations) > 1:
+                        loc = utils.sort_image_locations(locations)[0]
+                    else:
+                        loc = locations[0]
                     image_view['direct_url'] = loc['url']
                 else:
                     LOG.debug("The 'locations' list of image %s is empty, "
@@ -1780,7 +1789,6 @@ class ResponseSerializer(wsgi.JSONResponseSerializer):
 
             # add store information to image
             if CONF.enabled_backends:
-                locations = _get_image_locations(image)
                 if locations:
                     stores = []
                     for loc in locations:
@@ -1826,7 +1834,6 @@ class ResponseSerializer(wsgi.JSONResponseSerializer):
         params.pop('marker', None)
         query = urlparse.urlencode(params)
         body = {
-            'images': [self._format_image(i) for i in result['images']],
             'first': '/v2/images',
             'schema': '/v2/schemas/images',
         }
@@ -1836,8 +1843,8 @@ class ResponseSerializer(wsgi.JSONResponseSerializer):
             params['marker'] = result['next_marker']
             next_query = urlparse.urlencode(params)
             body['next'] = '/v2/images?%s' % next_query
-        response.unicode_body = json.dumps(body, ensure_ascii=False)
-        response.content_type = 'application/json'
+        images = [self._format_image(i) for i in result['images']]
+        self.stream_collection(response, 'images', images, body)
 
     def delete_from_store(self, response, result):
         response.status_int = http.NO_CONTENT
@@ -657,8 +657,12 @@ class ResponseSerializer(wsgi.JSONResponseSerializer):
             next_query = urlparse.urlencode(params)
             result.next = '/v2/metadefs/namespaces?%s' % next_query
 
+        namespaces = [json.tojson(Namespace, namespace)
+                      for namespace in result.namespaces]
+        result.namespaces = []
         ns_json = json.tojson(Namespaces, result)
-        response = self.__render(ns_json, response)
+        ns_json.pop('namespaces', None)
+        self.stream_collection(response, 'namespaces', namespaces, ns_json)
 
     def update(self, response, namespace):
         ns_json = json.tojson(Namespace, namespace)
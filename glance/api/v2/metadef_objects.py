@@ -429,10 +429,13 @@ class ResponseSerializer(wsgi.JSONResponseSerializer):
 
     def index(self, response, result):
         result.schema = "v2/schemas/metadefs/objects"
+        metadata_objects = [json.tojson(MetadefObject, metadata_object)
+                            for metadata_object in result.objects]
+        result.objects = []
         metadata_objects_json = json.tojson(MetadefObjects, result)
-        body = jsonutils.dumps(metadata_objects_json, ensure_ascii=False)
-        response.unicode_body = body
-        response.content_type = 'application/json'
+        metadata_objects_json.pop('objects', None)
+        self.stream_collection(response, 'objects', metadata_objects,
+                               metadata_objects_json)
 
     def delete(self, response, result):
         response.status_int = http.NO_CONTENT
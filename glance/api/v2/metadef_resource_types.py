@@ -244,10 +244,13 @@ class ResponseSerializer(wsgi.JSONResponseSerializer):
         response.content_type = 'application/json'
 
     def index(self, response, result):
+        resource_types = [json.tojson(ResourceType, resource_type)
+                          for resource_type in result.resource_types]
+        result.resource_types = []
         resource_type_json = json.tojson(ResourceTypes, result)
-        body = jsonutils.dumps(resource_type_json, ensure_ascii=False)
-        response.unicode_body = body
-        response.content_type = 'application/json'
+        resource_type_json.pop('resource_types', None)
+        self.stream_collection(response, 'resource_types', resource_types,
+                               resource_type_json)
 
     def create(self, response, result):
         resource_type_json = json.tojson(ResourceTypeAssociation, result)
@@ -473,10 +473,13 @@ class ResponseSerializer(wsgi.JSONResponseSerializer):
         self.show(response, metadata_tag)
 
     def index(self, response, result):
+        metadata_tags = [json.tojson(MetadefTag, metadata_tag)
+                         for metadata_tag in result.tags]
+        result.tags = []
         metadata_tags_json = json.tojson(MetadefTags, result)
-        body = jsonutils.dumps(metadata_tags_json, ensure_ascii=False)
-        response.unicode_body = body
-        response.content_type = 'application/json'
+        metadata_tags_json.pop('tags', None)
+        self.stream_collection(response, 'tags', metadata_tags,
+                               metadata_tags_json)
 
     def delete(self, response, result):
         response.status_int = http.NO_CONTENT
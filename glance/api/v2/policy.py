@@ -310,6 +310,48 @@ class ImageAPIPolicy(APIPolicyBase):
         self._enforce('copy_image')
 
 
+class ImageListAPIPolicy(object):
+    _MISSING = object()
+
+    def __init__(self, context, enforcer=None):
+        """Image list API policy module.
+
+        Checks get_image for each image of a list. The decision is memoized
+        on the values of the target keys referenced by the get_image rule,
+        such as owner, visibility and member, so that it is evaluated once
+        for each distinct set of inputs instead of once per image.
+
+        :param context: The RequestContext
+        :param enforcer: The policy.Enforcer object to use for enforcement
+                         operations. If not provided (or None), the default
+                         enforcer will be selected.
+        """
+        self._context = context
+        self.enforcer = enforcer or policy.Enforcer()
+        self._keys = None
+        if isinstance(self.enforcer, policy.Enforcer):
+            self._keys = self.enforcer.get_target_keys('get_image')
+        self._decisions = {}
+
+    def check_get_image(self, image):
+        """Return whether get_image is allowed for an image of the list."""
+        image_policy = ImageAPIPolicy(self._context, image, self.enforcer)
+        if self._keys is None:
+            return image_policy.check('get_image')
+
+        target = image_policy._target
+        key = tuple(target.get(k, self._MISSING) for k in self._keys)
+        try:
+            return self._decisions[key]
+        except KeyError:
+            decision = image_policy.check('get_image')
+            self._decisions[key] = decision
+            return decision
+        except TypeError:
+            # NOTE: Some of the values are not hashable
+            return image_policy.check('get_image')
+
+
 class MetadefAPIPolicy(APIPolicyBase):
     def __init__(self, context, md_resource=None, target=None, enforcer=None):
         self._context = context
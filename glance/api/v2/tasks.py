@@ -336,8 +336,6 @@ class ResponseSerializer(wsgi.JSONResponseSerializer):
         params.pop('marker', None)
         query = urlparse.urlencode(params)
         body = {
-            'tasks': [self._format_task_stub(self.partial_task_schema, task)
-                      for task in result['tasks']],
             'first': '/v2/tasks',
             'schema': '/v2/schemas/tasks',
         }
@@ -347,8 +345,9 @@ class ResponseSerializer(wsgi.JSONResponseSerializer):
             params['marker'] = result['next_marker']
             next_query = urlparse.urlencode(params)
             body['next'] = '/v2/tasks?%s' % next_query
-        response.unicode_body = json.dumps(body, ensure_ascii=False)
-        response.content_type = 'application/json'
+        tasks = [self._format_task_stub(self.partial_task_schema, task)
+                 for task in result['tasks']]
+        self.stream_collection(response, 'tasks', tasks, body)
 
 
 _TASK_SCHEMA = {
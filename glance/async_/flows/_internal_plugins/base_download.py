@@ -15,19 +15,27 @@
 #    under the License.
 
 import abc
+from concurrent import futures
+import http.client
+import os
+import urllib.request
 
 import glance_store as store_api
 from glance_store import backend
 from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_utils import excutils
+from oslo_utils import units
 from taskflow import task
 
 from glance.common import exception
-from glance.i18n import _, _LE
+from glance.common.scripts import utils as script_utils
+from glance.i18n import _, _LE, _LI
 
 LOG = logging.getLogger(__name__)
 
 CONF = cfg.CONF
+SEGMENT_CHUNK_SIZE = 64 * units.Ki
 
 
 class BaseDownload(task.Task, metaclass=abc.ABCMeta):
@@ -99,6 +107,129 @@ class BaseDownload(task.Task, metaclass=abc.ABCMeta):
         store.configure()
         return store
 
+    def _get_staging_file(self):
+        if CONF.enabled_backends:
+            staging_dir = getattr(
+                CONF, 'os_glance_staging_store').filesystem_store_datadir
+        else:
+            staging_dir = CONF.node_staging_uri[7:]
+        return os.path.join(staging_dir, str(self.image_id))
+
+    def _get_segments(self, data, size):
+        """Split the image data in byte ranges if the source allows it.
+
+        :returns: A list of (first byte, last byte) tuples, empty when the
+                  data should be downloaded as a single stream
+        """
+        segments = CONF.image_import_opts.download_segments
+        min_size = CONF.image_import_opts.download_segment_min_size * units.Mi
+        headers = getattr(data, 'headers', None)
+        if segments < 2 or not size or headers is None:
+            return []
+        if headers.get('Accept-Ranges', '').lower() != 'bytes':
+            return []
+
+        segments = min(segments, size // min_size)
+        if segments < 2:
+            return []
+        segment_size = size // segments
+        bounds = [i * segment_size for i in range(segments)] + [size]
+        return [(start, end - 1) for start, end in zip(bounds, bounds[1:])]
+
+    def _download_segment(self, opener, url, headers, fd, start, end):
+        headers = dict(headers, Range='bytes=%d-%d' % (start, end))
+        request = urllib.request.Request(url, headers=headers)
+        offset = start
+        with opener.open(request) as response:
+            content_range = response.headers.get('Content-Range', '')
+            if (response.status != http.client.PARTIAL_CONTENT or
+                    not content_range.startswith('bytes %d-%d/' % (start,
+                                                                   end))):
+                msg = (_("Task %(task_id)s failed because the source did "
+                         "not return the byte range %(start)d-%(end)d") %
+                       {'task_id': self.task_id, 'start': start,
+                        'end': end})
+                raise exception.ImportTaskError(msg)
+
+            while True:
+                chunk = response.read(SEGMENT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                os.pwrite(fd, chunk, offset)
+                offset += len(chunk)
+
+        if offset != end + 1:
+            msg = (_("Task %(task_id)s failed because the byte range "
+                     "%(start)d-%(end)d was truncated at %(offset)d") %
+                   {'task_id': self.task_id, 'start': start, 'end': end,
+                    'offset': offset})
+            raise exception.ImportTaskError(msg)
+        return offset - start
+
+    def _download_segments(self, data, size, headers=None):
+        """Download the image data with concurrent range requests.
+
+        When the source of the image data advertises byte ranges, the data
+        is downloaded in segments, each by its own request, into a staging
+        file preallocated to the size of the image.
+
+        :param data: The response to the request of the image data
+        :param size: The size of the image data
+        :param headers: The headers to send with the range requests
+        :returns: The staging path of the image data, or None if the data
+                  should be staged from data as a single stream
+        """
+        segments = self._get_segments(data, size)
+        if not segments:
+            return None
+
+        # NOTE: Only a strong validator makes sure that all the ranges are
+        # taken from the same version of the image data; the source returns
+        # the whole data instead of a range if it changed.
+        headers = dict(headers or {})
+        validator = data.headers.get('ETag')
+        if not validator or validator.startswith('W/'):
+            validator = data.headers.get('Last-Modified')
+        if validator:
+            headers['If-Range'] = validator
+        url = data.geturl()
+        data.close()
+
+        LOG.info(_LI("Downloading %(size)d bytes of image %(image_id)s in "
+                     "%(segments)d segments"),
+                 {'size': size, 'image_id': self.image_id,
+                  'segments': len(segments)})
+        file_path = self._get_staging_file()
+        opener = urllib.request.build_opener(script_utils.SafeRedirectHandler)
+        with open(file_path, 'xb') as staging_file:
+            self._path = 'file://%s' % file_path
+            fd = staging_file.fileno()
+            try:
+                os.posix_fallocate(fd, 0, size)
+            except (AttributeError, OSError):
+                os.ftruncate(fd, size)
+
+            with futures.ThreadPoolExecutor(
+                    max_workers=len(segments)) as executor:
+                downloads = [executor.submit(self._download_segment, opener,
+                                             url, headers, fd, start, end)
+                             for start, end in segments]
+                try:
+                    bytes_written = sum(d.result() for d in downloads)
+                except Exception:
+                    with excutils.save_and_reraise_exception():
+                        for download in downloads:
+                            download.cancel()
+
+        if bytes_written != size or os.path.getsize(file_path) != size:
+            msg = (_("Task %(task_id)s failed because downloaded data "
+                     "size %(data_size)i is different from expected %("
+                     "expected)i") % {"task_id": self.task_id,
+                                      "data_size": bytes_written,
+                                      "expected": size})
+            raise exception.ImportTaskError(msg)
+        return self._path
+
     def revert(self, result, **kwargs):
         LOG.error(_LE('Task: %(task_id)s failed to import image '
                       '%(image_id)s to the filesystem.'),
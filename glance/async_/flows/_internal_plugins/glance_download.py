@@ -77,6 +77,11 @@ class _DownloadGlanceImage(base_download.BaseDownload):
                         "task_id": self.task_id
                     })
 
+        if self._download_segments(data, image_size,
+                                   headers={'X-Auth-Token': token}
+                                   ) is not None:
+            return self._path
+
         self._path, bytes_written = self.store.add(self.image_id, data, 0)[0:2]
         if bytes_written != image_size:
             msg = (_("Task %(task_id)s failed because downloaded data "
@@ -55,6 +55,9 @@ class _WebDownload(base_download.BaseDownload):
                           {"error": e,
                            "task_id": self.task_id})
 
+        if self._download_segments(data, size) is not None:
+            return self._path
+
         self._path, bytes_written = self.store.add(self.image_id, data,
                                                    size)[0:2]
 
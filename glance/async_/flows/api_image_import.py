@@ -94,6 +94,38 @@ enabled.
 
 Possible values:
     * A positive integer (1 means sequential imports)
+""")),
+    cfg.IntOpt('download_segments',
+               default=1,
+               min=1,
+               help=_("""
+Maximum number of byte ranges of the image data downloaded at the same time
+by the web-download and glance-download import methods.
+
+When this value is greater than 1 and the source of the image data advertises
+``Accept-Ranges: bytes`` with a known size, the data is split into this many
+byte ranges, which are downloaded concurrently into a preallocated file of the
+staging area. Otherwise, or when the image is smaller than two segments of
+``download_segment_min_size``, the data is downloaded as a single stream.
+
+Possible values:
+    * A positive integer (1 means a single stream)
+
+Related options:
+    * ``download_segment_min_size``
+""")),
+    cfg.IntOpt('download_segment_min_size',
+               default=64,
+               min=1,
+               help=_("""
+Minimum size, in MiB, of the byte ranges downloaded concurrently by the
+web-download and glance-download import methods.
+
+Possible values:
+    * A positive integer
+
+Related options:
+    * ``download_segments``
 """)),
 ]
 
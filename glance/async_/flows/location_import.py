@@ -12,20 +12,22 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
-import hashlib
-
 import glance_store as store
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import excutils
+from oslo_utils import timeutils
+from oslo_utils import units
 from taskflow.patterns import linear_flow as lf
 from taskflow import retry
 from taskflow import task
 
 import glance.async_.flows.api_image_import as image_import
 from glance.common import exception
+from glance.common.scripts import utils as script_utils
 from glance.common import store_utils
-from glance.i18n import _, _LW
+from glance.common import utils
+from glance.i18n import _, _LI, _LW
 from glance import task_cancellation_tracker as tracker
 
 
@@ -54,30 +56,72 @@ class _HashCalculationCanceled(exception.GlanceException):
 class _CalculateHash(task.Task):
 
     def __init__(self, task_id, task_type, image_repo, image_id,
-                 hashing_algo, status=None):
+                 hashing_algo, status=None, task_repo=None):
         self.task_id = task_id
         self.task_type = task_type
         self.image_repo = image_repo
         self.image_id = image_id
         self.hashing_algo = hashing_algo
         self.image_status = status
+        self.task_repo = task_repo
+        # NOTE: The digests are kept across the retries of the hash
+        # calculation, so that a retry resumes at the offset reached by the
+        # previous attempt instead of reading the image data from its start.
+        self.hasher = None
+        self.last_status = 0
         super(_CalculateHash, self).__init__(
             name='%s-CalculateHash-%s' % (task_type, task_id))
 
-    def _calculate_hash(self, image):
-        current_os_hash_value = hashlib.new(self.hashing_algo)
-        current_checksum = hashlib.md5(usedforsecurity=False)
-        for chunk in image.get_data():
+    def _report_progress(self):
+        # NOTE: Only update the task every minute
+        if (self.task_repo is None or
+                timeutils.now() - self.last_status < 60):
+            return
+        self.last_status = timeutils.now()
+        task = script_utils.get_task(self.task_repo, self.task_id)
+        if task is not None:
+            task.message = _('Hashed %i MiB') % (
+                self.hasher.bytes_read // units.Mi)
+            self.task_repo.save(task)
+
+    def _new_hasher(self):
+        self.hasher = utils.MultiHasher(('md5', self.hashing_algo))
+
+    def _hash_data(self, image, offset):
+        for chunk in image.get_data(offset=offset):
             if tracker.is_canceled(self.task_id):
                 raise _HashCalculationCanceled(
                     _('Hash calculation for image %s has been '
                       'canceled') % self.image_id)
             if chunk is None:
                 break
-            current_checksum.update(chunk)
-            current_os_hash_value.update(chunk)
-        image.checksum = current_checksum.hexdigest()
-        image.os_hash_value = current_os_hash_value.hexdigest()
+            self.hasher.update(chunk)
+            self._report_progress()
+
+    def _calculate_hash(self, image):
+        # NOTE: The size of the image is the only way to tell whether the
+        # store honoured the offset, only resume when it is known.
+        if self.hasher is None or not image.size:
+            self._new_hasher()
+        offset = self.hasher.bytes_read
+        if offset:
+            LOG.info(_LI('Resuming hash calculation of image %(image_id)s '
+                         'at offset %(offset)d'),
+                     {'image_id': self.image_id, 'offset': offset})
+
+        self._hash_data(image, offset)
+
+        if offset and self.hasher.bytes_read != image.size:
+            # NOTE: Not every store honours the offset of get_data, some
+            # return the data from its start. Hash it again from scratch.
+            LOG.info(_LI('Image %(image_id)s data was not returned from '
+                         'offset %(offset)d, hashing it from its start'),
+                     {'image_id': self.image_id, 'offset': offset})
+            self._new_hasher()
+            self._hash_data(image, 0)
+
+        image.checksum = self.hasher.hexdigest('md5')
+        image.os_hash_value = self.hasher.hexdigest(self.hashing_algo)
 
     def _set_checksum_and_hash(self, image):
         tracker.register_operation(self.task_id)
@@ -333,7 +377,8 @@ def get_flow(**kwargs):
         if val_data:
             flow.add(
                 _CalculateHash(task_id, task_type, image_repo, image_id,
-                               hashing_algo, status='importing'))
+                               hashing_algo, status='importing',
+                               task_repo=task_repo))
             flow.add(
                 _VerifyValidationData(task_id, task_type, image_repo,
                                       image_id, val_data))
@@ -346,7 +391,7 @@ def get_flow(**kwargs):
                     task_id, task_type, image_repo, image_id))
             flow.add(
                 _CalculateHash(task_id, task_type, image_repo, image_id,
-                               hashing_algo))
+                               hashing_algo, task_repo=task_repo))
     elif val_data:
         flow.add(
             _SetHashValues(task_id, task_type, image_repo, image_id,
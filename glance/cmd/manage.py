@@ -324,7 +324,8 @@ class DbCommands(object):
         metadata.db_export_metadefs(db_api.get_engine(),
                                     path)
 
-    def _purge(self, age_in_days, max_rows, purge_images_only=False):
+    def _purge(self, age_in_days, max_rows, purge_images_only=False,
+               batch_size=None, batch_sleep=0):
         try:
             age_in_days = int(age_in_days)
         except ValueError:
@@ -341,36 +342,85 @@ class DbCommands(object):
             sys.exit(_("Maximal age is count of days since epoch."))
         if max_rows < -1:
             sys.exit(_("Minimal rows limit is -1."))
+
+        kwargs = {}
+        if batch_size is not None:
+            try:
+                batch_size = int(batch_size)
+                batch_sleep = float(batch_sleep)
+            except ValueError:
+                sys.exit(_("Invalid value for batch_size or batch_sleep: "
+                           "%(batch_size)s, %(batch_sleep)s") %
+                         {'batch_size': batch_size,
+                          'batch_sleep': batch_sleep})
+            if batch_size < 1:
+                sys.exit(_("Must supply a positive value for batch_size."))
+            if batch_sleep < 0:
+                sys.exit(_("Must supply a non-negative value for "
+                           "batch_sleep."))
+            kwargs = {'batch_size': batch_size, 'batch_sleep': batch_sleep}
+
         ctx = context.get_admin_context(show_deleted=True)
         try:
             if purge_images_only:
-                db_api.purge_deleted_rows_from_images(ctx, age_in_days,
-                                                      max_rows)
+                report = db_api.purge_deleted_rows_from_images(
+                    ctx, age_in_days, max_rows, **kwargs)
             else:
-                db_api.purge_deleted_rows(ctx, age_in_days, max_rows)
+                report = db_api.purge_deleted_rows(ctx, age_in_days,
+                                                   max_rows, **kwargs)
         except exception.Invalid as exc:
             sys.exit(exc.msg)
         except db_exc.DBReferenceError:
             sys.exit(_("Purge command failed, check glance-manage"
                        " logs for more details."))
 
+        for tbl, rows, elapsed in report or ():
+            print(_('Purged %(rows)d row(s) from table %(tbl)s in '
+                    '%(elapsed).2f second(s)') %
+                  {'rows': rows, 'tbl': tbl, 'elapsed': elapsed})
+
     @args('--age_in_days', type=int,
           help='Purge deleted rows older than age in days')
     @args('--max_rows', type=int,
           help='Limit number of records to delete. All deleted rows will be '
                'purged if equals -1.')
-    def purge(self, age_in_days=30, max_rows=100):
+    @args('--batch_size', type=int,
+          help='Delete the rows of each table in batches of this many rows, '
+               'each in its own transaction.')
+    @args('--batch_sleep', type=float,
+          help='Seconds to sleep between two batches, when --batch_size is '
+               'set.')
+    def purge(self, age_in_days=30, max_rows=100, batch_size=None,
+              batch_sleep=0):
         """Purge deleted rows older than a given age from glance tables."""
-        self._purge(age_in_days, max_rows)
+        self._purge(age_in_days, max_rows, batch_size=batch_size,
+                    batch_sleep=batch_sleep)
 
     @args('--age_in_days', type=int,
           help='Purge deleted rows older than age in days')
     @args('--max_rows', type=int,
           help='Limit number of records to delete. All deleted rows will be '
                'purged if equals -1.')
-    def purge_images_table(self, age_in_days=180, max_rows=100):
+    @args('--batch_size', type=int,
+          help='Delete the rows in batches of this many rows, each in its '
+               'own transaction.')
+    @args('--batch_sleep', type=float,
+          help='Seconds to sleep between two batches, when --batch_size is '
+               'set.')
+    def purge_images_table(self, age_in_days=180, max_rows=100,
+                           batch_size=None, batch_sleep=0):
         """Purge deleted rows older than a given age from images table."""
-        self._purge(age_in_days, max_rows, purge_images_only=True)
+        self._purge(age_in_days, max_rows, purge_images_only=True,
+                    batch_size=batch_size, batch_sleep=batch_sleep)
+
+    @args('--project_id', metavar='<project_id>',
+          help='Project whose usage counters should be rebuilt. The '
+               'counters of every project are rebuilt by default.')
+    def reconcile_usage(self, project_id=None):
+        """Rebuild the project usage counters from the images."""
+        ctx = context.get_admin_context(show_deleted=True)
+        projects = db_api.project_usage_reconcile(ctx, project_id=project_id)
+        print(_('Rebuilt the usage counters of %s project(s)') % projects)
 
 
 class DbLegacyCommands(object):
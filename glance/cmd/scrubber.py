@@ -20,6 +20,7 @@ Glance Scrub Service
 """
 
 import os
+import signal
 import sys
 
 import subprocess
@@ -80,6 +81,7 @@ def main():
             app.revert_image_status(CONF.restore)
         elif CONF.daemon:
             server = scrubber.Daemon(CONF.wakeup_time)
+            signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
             server.start(app)
             server.wait()
         else:
@@ -319,6 +319,55 @@ Possible values:
 Related options:
     * limit_param_default
 
+""")),
+    cfg.StrOpt('image_list_visibility_plan', default='union',
+               choices=('union', 'exists'),
+               help=_("""
+Query plan used to select the images visible to a non-admin user.
+
+When listing images, a non-admin user sees the public and community
+images, the images owned by their project and the shared images their
+project is a member of. With ``union``, the images are selected by three
+queries whose results are combined with ``UNION``, which requires the
+database to sort and deduplicate every matching image before a page can be
+returned. With ``exists``, the images are selected by a single query where
+the membership is checked by an ``EXISTS`` subquery, which lets the
+database walk the ``(owner, created_at, id)`` and
+``(visibility, created_at, id)`` indexes in the order of the default sort
+keys and stop as soon as a page is filled.
+
+Both plans return the same images.
+
+Possible values:
+    * union
+    * exists
+
+Related options:
+    * None
+
+""")),
+    cfg.StrOpt('image_list_filter_plan', default='join',
+               choices=('join', 'semijoin'),
+               help=_("""
+Query plan used to filter an image list on image properties and tags.
+
+With ``join``, the ``image_properties`` or ``image_tags`` table is joined
+to the images once per property or tag filter. With ``semijoin``, every
+filter is turned into an ``IN (SELECT image_id ...)`` subquery which is
+resolved through the ``(name, value)`` index of ``image_properties`` or the
+``(value, image_id)`` index of ``image_tags``, so that the cost of a
+filtered list depends on the number of matching images rather than on the
+size of those tables.
+
+Both plans return the same images.
+
+Possible values:
+    * join
+    * semijoin
+
+Related options:
+    * image_list_visibility_plan
+
 """)),
     cfg.BoolOpt('show_image_direct_url', default=False,
                 help=_("""
@@ -481,6 +530,31 @@ considered to be zero, and thus reject all new resource requests.
 These per-tenant resource limits are independent from the static
 global ones configured in this config file. If this is enabled, the
 relevant static global limits will be ignored.
+""")),
+    cfg.BoolOpt('use_project_usage_counters', default=False,
+                help=_("""
+Maintain per-project usage counters for the quota checks.
+
+By default, the storage and staging usages and the image counts of a
+project are computed from the images of the project every time a quota is
+checked. When this option is enabled, they are kept in the
+``project_usages`` table, updated in the same transaction as the images,
+so that a quota check reads a single row regardless of the number of
+images of the project.
+
+The counters of a project are initialized the first time they are read or
+written. They are not maintained while this option is disabled, so run
+``glance-manage db reconcile_usage`` after enabling it again, and if the
+option is not set identically on every API and worker node.
+
+Possible values:
+    * True
+    * False
+
+Related options:
+    * use_keystone_limits
+    * user_storage_quota
+
 """)),
     cfg.HostAddressOpt('pydev_worker_debug_host',
                        sample_default='localhost',
@@ -20,10 +20,13 @@
 System-level utilities and helper functions.
 """
 
+from concurrent import futures
 import errno
+import hashlib
 import ipaddress
 import socket
 import sqlite3
+import threading
 
 import functools
 import os
@@ -158,6 +161,14 @@ def cooperative_read(fd):
 
 
 MAX_COOP_READER_BUFFER_SIZE = 134217728  # 128M seems like a sane buffer limit
+# NOTE: hashlib releases the GIL while hashing buffers larger than 2047
+# bytes, but handing a chunk to a worker thread is only worth it for chunks
+# much larger than that.
+HASH_OFFLOAD_MIN_SIZE = 1048576  # 1M
+HASH_WORKERS = 4
+
+_hash_executor = None
+_hash_executor_lock = threading.Lock()
 
 CONF.import_group('import_filtering_opts',
                   'glance.async_.flows._internal_plugins')
@@ -393,6 +404,93 @@ class LimitingReader(object):
         return result
 
 
+def _get_hash_executor():
+    global _hash_executor
+    with _hash_executor_lock:
+        if _hash_executor is None:
+            _hash_executor = futures.ThreadPoolExecutor(
+                max_workers=HASH_WORKERS, thread_name_prefix='glance-hash')
+        return _hash_executor
+
+
+def new_hash(algorithm):
+    """Return a new hash object of the given algorithm.
+
+    MD5 is only used for the legacy image checksum, so it is flagged as not
+    used for security to keep working on FIPS enabled hosts.
+    """
+    if algorithm == 'md5':
+        return hashlib.md5(usedforsecurity=False)
+    return hashlib.new(algorithm)
+
+
+class MultiHasher(object):
+    """
+    Computes the digests of several hash algorithms in a single pass over
+    the image data.
+
+    Each chunk is fed to all the digests as it is read. The digests of large
+    chunks are computed in parallel by worker threads, as hashlib releases the
+    GIL while hashing them.
+    """
+    def __init__(self, algorithms):
+        """
+        :param algorithms: Names of the hash algorithms, as understood by
+                           hashlib.new
+        """
+        self.hashes = {}
+        for algorithm in algorithms:
+            self.hashes.setdefault(algorithm, new_hash(algorithm))
+        self.bytes_read = 0
+
+    def update(self, chunk):
+        self.bytes_read += len(chunk)
+        hashes = list(self.hashes.values())
+        if len(hashes) > 1 and len(chunk) >= HASH_OFFLOAD_MIN_SIZE:
+            executor = _get_hash_executor()
+            offloaded = [executor.submit(h.update, chunk)
+                         for h in hashes[1:]]
+            hashes[0].update(chunk)
+            for future in offloaded:
+                future.result()
+        else:
+            for h in hashes:
+                h.update(chunk)
+
+    def hexdigest(self, algorithm):
+        return self.hashes[algorithm].hexdigest()
+
+    def hexdigests(self):
+        return {algorithm: h.hexdigest()
+                for algorithm, h in self.hashes.items()}
+
+
+class HashingReader(object):
+    """
+    Reader feeding the image data to a MultiHasher as it passes through.
+
+    The digests are available from the hasher once the data has been
+    consumed, so that they can be reused instead of reading the data again.
+    """
+    def __init__(self, data, hasher):
+        """
+        :param data: Underlying image data object
+        :param hasher: MultiHasher to feed the data to
+        """
+        self.data = data
+        self.hasher = hasher
+
+    def __iter__(self):
+        for chunk in self.data:
+            self.hasher.update(chunk)
+            yield chunk
+
+    def read(self, i):
+        result = self.data.read(i)
+        self.hasher.update(result)
+        return result
+
+
 def wrap_data_for_store_upload(data, size_cap=None):
     """Wrap an image data iterator for backend store upload."""
     if size_cap is None:
@@ -38,11 +38,19 @@ from glance.common import exception
 from glance import i18n
 from glance.i18n import _, _LE
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 LOG = logging.getLogger(__name__)
 
 CONF = cfg.CONF
 profiler_opts.set_defaults(CONF)
 
+# Size of the chunks a streamed collection is written in
+STREAM_CHUNK_SIZE = 64 * units.Ki
+
 
 def _get_uwsgi():
     try:
@@ -432,6 +440,58 @@ class JSONResponseSerializer(object):
     def to_json(self, data):
         return jsonutils.dump_as_bytes(data, default=self._sanitizer)
 
+    def _dump_as_bytes(self, data):
+        """Encode data as UTF-8 JSON, with orjson when it is available."""
+        if orjson is not None:
+            try:
+                # NOTE: datetimes are left to the sanitizer so that they
+                # are formatted like jsonutils does.
+                return orjson.dumps(data, default=self._sanitizer,
+                                    option=orjson.OPT_PASSTHROUGH_DATETIME)
+            except TypeError:
+                # NOTE: orjson.JSONEncodeError is a TypeError, raised for
+                # the values it does not support such as large integers.
+                pass
+        return jsonutils.dump_as_bytes(data, default=self._sanitizer,
+                                       ensure_ascii=False)
+
+    def _iter_collection(self, key, items, body):
+        head = self._dump_as_bytes({key: []})[:-2]
+        tail = self._dump_as_bytes(body)[1:-1]
+        chunk = [head]
+        size = len(head)
+        for index, item in enumerate(items):
+            encoded = self._dump_as_bytes(item)
+            if index:
+                chunk.append(b',')
+            chunk.append(encoded)
+            size += len(encoded) + 1
+            if size >= STREAM_CHUNK_SIZE:
+                yield b''.join(chunk)
+                chunk = []
+                size = 0
+        chunk.append(b']')
+        if tail:
+            chunk.extend((b',', tail))
+        chunk.append(b'}')
+        yield b''.join(chunk)
+
+    def stream_collection(self, response, key, items, body=None):
+        """Write a JSON object holding a collection as it is encoded.
+
+        The items are only encoded while the response is sent, in chunks of
+        about STREAM_CHUNK_SIZE bytes. Since errors raised at that time can
+        no longer change the status of the response, the items must already
+        be formatted.
+
+        :param response: The webob.Response to write to
+        :param key: The key of the collection in the JSON object
+        :param items: A list of the formatted, JSON serializable items
+        :param body: An optional dict of the other keys of the JSON object
+        """
+        response.content_type = 'application/json'
+        response.app_iter = self._iter_collection(key, items, body or {})
+
     def default(self, response, result):
         response.content_type = 'application/json'
         body = self.to_json(result)
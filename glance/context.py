@@ -67,6 +67,9 @@ class RequestContext(context.RequestContext):
         super(RequestContext, self).__init__(**kwargs)
         self.service_catalog = service_catalog
         self.policy_enforcer = policy_enforcer or policy.Enforcer()
+        # NOTE: Usages of projects memoized for the quota checks of the
+        # request, see glance.api.common.get_project_usage.
+        self.project_usage = {}
         if not self.is_admin:
             self.is_admin = self.policy_enforcer.check_is_admin(self)
 
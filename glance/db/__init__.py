@@ -21,6 +21,7 @@ from oslo_config import cfg
 from oslo_utils import importutils
 from wsme.rest import json
 
+from glance.api import common as api_common
 from glance.api.v2.model.metadef_property_type import PropertyType
 from glance.common import crypt
 from glance.common import exception
@@ -76,6 +77,7 @@ class ImageRepo(object):
             raise exception.ImageNotFound(msg)
         tags = self.db_api.image_tag_get_all(self.context, image_id)
         image = self._format_image_from_db(db_api_image, tags)
+        image.mark_clean()
         return ImageProxy(image, self.context, self.db_api)
 
     def list(self, marker=None, limit=None, sort_key=None,
@@ -142,8 +144,7 @@ class ImageRepo(object):
             member=member,
         )
 
-    def _format_image_to_db(self, image):
-        locations = image.locations
+    def _format_locations_to_db(self, locations):
         if CONF.metadata_encryption_key:
             key = CONF.metadata_encryption_key
             ld = []
@@ -154,6 +155,10 @@ class ImageRepo(object):
                            # NOTE(zhiyan): New location has no ID field.
                            'id': loc.get('id')})
             locations = ld
+        return locations
+
+    def _format_image_to_db(self, image):
+        locations = self._format_locations_to_db(image.locations)
         return {
             'id': image.image_id,
             'name': image.name,
@@ -187,24 +192,46 @@ class ImageRepo(object):
         new_values = self.db_api.image_create(self.context, image_values)
         self.db_api.image_tag_set_all(self.context,
                                       image.image_id, image.tags)
+        api_common.drop_project_usage(self.context)
         image.created_at = new_values['created_at']
         image.updated_at = new_values['updated_at']
+        image.mark_clean()
 
     def save(self, image, from_state=None):
-        image_values = self._format_image_to_db(image)
-        if (image_values['size'] is not None
+        changes = image.get_changes()
+        if changes is None:
+            image_values = self._format_image_to_db(image)
+            purge_props = True
+            delete_props = None
+            tags = image.tags
+        else:
+            # NOTE: Only the columns, properties, locations and tags which
+            # changed since the image was loaded or last saved are written.
+            image_values = {key: changes[key]
+                            for key in glance.domain.Image.tracked_attributes
+                            if key in changes}
+            if 'locations' in changes:
+                image_values['locations'] = self._format_locations_to_db(
+                    changes['locations'])
+            image_values['properties'] = changes.get('extra_properties', {})
+            purge_props = False
+            delete_props = changes.get('deleted_properties')
+            tags = changes.get('tags')
+        if (image_values.get('size') is not None
            and image_values['size'] > CONF.image_size_cap):
             raise exception.ImageSizeLimitExceeded
         new_values = self.db_api.image_update(self.context,
                                               image.image_id,
                                               image_values,
-                                              purge_props=True,
+                                              purge_props=purge_props,
                                               from_state=from_state,
                                               atomic_props=(
-                                                  IMAGE_ATOMIC_PROPS))
-        self.db_api.image_tag_set_all(self.context, image.image_id,
-                                      image.tags)
+                                                  IMAGE_ATOMIC_PROPS),
+                                              delete_props=delete_props,
+                                              tags=tags)
+        api_common.drop_project_usage(self.context)
         image.updated_at = new_values['updated_at']
+        image.mark_clean()
 
     def remove(self, image):
         try:
@@ -216,15 +243,18 @@ class ImageRepo(object):
             raise exception.ImageNotFound(msg)
         # NOTE(markwash): don't update tags?
         new_values = self.db_api.image_destroy(self.context, image.image_id)
+        api_common.drop_project_usage(self.context)
         image.updated_at = new_values['updated_at']
 
     def set_property_atomic(self, image, name, value):
         self.db_api.image_set_property_atomic(
             image.image_id, name, value)
+        api_common.drop_project_usage(self.context)
 
     def delete_property_atomic(self, image, name, value):
         self.db_api.image_delete_property_atomic(
             image.image_id, name, value)
+        api_common.drop_project_usage(self.context)
 
 
 class ImageProxy(glance.domain.proxy.Image):
@@ -707,6 +707,30 @@ def image_location_delete(context, image_id, location_id, status,
         raise exception.NotFound(msg)
 
 
+@log_call
+def image_location_get_pending_delete(context, deleted_before,
+                                      marker=None, limit=None):
+    locations = []
+    for loc in DATA['locations']:
+        image = DATA['images'].get(loc['image_id'])
+        if (image is None or image['status'] != 'pending_delete' or
+                not image['deleted'] or
+                image['deleted_at'] > deleted_before or
+                loc['status'] != 'pending_delete'):
+            continue
+        if marker is not None and (loc['image_id'], loc['id']) <= marker:
+            continue
+        locations.append({'image_id': loc['image_id'],
+                          'id': loc['id'],
+                          'url': loc['url'],
+                          'metadata': loc['metadata'] or {}})
+
+    locations.sort(key=lambda loc: (loc['image_id'], loc['id']))
+    if limit is not None:
+        locations = locations[:limit]
+    return copy.deepcopy(locations)
+
+
 def _image_locations_set(context, image_id, locations):
     # NOTE(zhiyan): 1. Remove records from DB for deleted locations
     used_loc_ids = [loc['id'] for loc in locations if loc.get('id')]
@@ -799,7 +823,8 @@ def image_create(context, image_values, v1_mode=False):
 
 @log_call
 def image_update(context, image_id, image_values, purge_props=False,
-                 from_state=None, v1_mode=False, atomic_props=None):
+                 from_state=None, v1_mode=False, atomic_props=None,
+                 delete_props=None, tags=None):
     global DATA
     try:
         image = DATA['images'][image_id]
@@ -813,6 +838,9 @@ def image_update(context, image_id, image_values, purge_props=False,
     if atomic_props is None:
         atomic_props = []
 
+    if delete_props is None:
+        delete_props = []
+
     # replace values for properties that already exist
     new_properties = image_values.pop('properties', {})
     for prop in image['properties']:
@@ -820,7 +848,8 @@ def image_update(context, image_id, image_values, purge_props=False,
             continue
         elif prop['name'] in new_properties:
             prop['value'] = new_properties.pop(prop['name'])
-        elif purge_props:
+            prop['deleted'] = False
+        elif purge_props or prop['name'] in delete_props:
             # this matches weirdness in the sqlalchemy api
             prop['deleted'] = True
 
@@ -829,6 +858,8 @@ def image_update(context, image_id, image_values, purge_props=False,
                   {k: v for k, v in new_properties.items()
                    if k not in atomic_props})
     DATA['images'][image_id] = image
+    if tags is not None:
+        DATA['tags'][image_id] = list(tags)
 
     image = _normalize_locations(context, copy.deepcopy(image))
     if v1_mode:
@@ -2257,6 +2288,28 @@ def get_least_recently_accessed(context, node_reference_url):
     return None
 
 
+@log_call
+def get_images_to_prune(context, node_reference_url, overage):
+    global DATA
+    all_images = sorted(get_cached_images(context, node_reference_url),
+                        key=lambda image: image['last_accessed'])
+    entries = []
+    total_size = 0
+    for image in all_images:
+        if total_size >= overage:
+            break
+        entries.append((image['image_id'], image['size']))
+        total_size += image['size']
+    return entries
+
+
+@log_call
+def delete_cached_images(context, image_ids, node_reference_url):
+    global DATA
+    for image_id in image_ids:
+        delete_cached_image(context, image_id, node_reference_url)
+
+
 @log_call
 def is_image_cached_for_node(context, node_reference_url, image_id):
     global DATA
@@ -2308,9 +2361,9 @@ def update_hit_count(context, image_id, node_reference_url):
         'last_accessed': last_accessed
     }
 
-    for image_id in all_images:
-        if all_images[image_id]['node_reference_id'] == \
+    for image in all_images:
+        if all_images[image]['node_reference_id'] == \
                 node_reference['node_reference_id'] and image_id == \
-                all_images[image_id]['image_id']:
-            all_images[image_id].update(values)
+                all_images[image]['image_id']:
+            all_images[image].update(values)
             break
@@ -0,0 +1,48 @@
+# Copyright 2026 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""add composite indexes used to list the images visible to a user
+
+Revision ID: 2026_2_expand01
+Revises: 2024_1_expand01
+Create Date: 2026-10-16 10:12:41.503912
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '2026_2_expand01'
+down_revision = '2024_1_expand01'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('images') as batch_op:
+        batch_op.create_index(
+            'owner_created_at_id_image_idx',
+            ['owner', 'created_at', 'id'],
+        )
+        batch_op.create_index(
+            'visibility_created_at_id_image_idx',
+            ['visibility', 'created_at', 'id'],
+        )
+
+    with op.batch_alter_table('image_members') as batch_op:
+        batch_op.create_index(
+            'ix_image_members_member_status_image_id',
+            ['member', 'status', 'image_id'],
+        )
@@ -0,0 +1,47 @@
+# Copyright 2026 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""add indexes used to filter images on properties and tags
+
+Revision ID: 2026_2_expand02
+Revises: 2026_2_expand01
+Create Date: 2026-10-16 14:37:09.218640
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '2026_2_expand02'
+down_revision = '2026_2_expand01'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('image_properties') as batch_op:
+        # NOTE: The value column is a TEXT column, MySQL can only index a
+        # prefix of it.
+        batch_op.create_index(
+            'ix_image_properties_name_value',
+            ['name', 'value'],
+            mysql_length={'value': 255},
+        )
+
+    with op.batch_alter_table('image_tags') as batch_op:
+        batch_op.create_index(
+            'ix_image_tags_value_image_id',
+            ['value', 'image_id'],
+        )
@@ -0,0 +1,49 @@
+# Copyright 2026 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""add project_usages table
+
+Revision ID: 2026_2_expand03
+Revises: 2026_2_expand02
+Create Date: 2026-10-16 16:05:52.734108
+
+"""
+
+from alembic import op
+from sqlalchemy.schema import Column, PrimaryKeyConstraint
+
+from glance.db.sqlalchemy.schema import (
+    Integer, BigInteger, DateTime, String)  # noqa
+
+# revision identifiers, used by Alembic.
+revision = '2026_2_expand03'
+down_revision = '2026_2_expand02'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('project_usages',
+                    Column('project_id', String(length=255),
+                           nullable=False),
+                    Column('storage', BigInteger(), nullable=False),
+                    Column('staging', BigInteger(), nullable=False),
+                    Column('image_count', Integer(), nullable=False),
+                    Column('uploading_count', Integer(), nullable=False),
+                    Column('updated_at', DateTime(), nullable=False),
+                    PrimaryKeyConstraint('project_id'),
+                    mysql_engine='InnoDB',
+                    mysql_charset='utf8',
+                    extend_existing=True)
@@ -22,8 +22,8 @@
 """Defines interface for DB access."""
 
 import datetime
-import itertools
 import threading
+import time
 
 from oslo_config import cfg
 from oslo_db import api as db_api
@@ -61,6 +61,9 @@ STATUSES = ['active', 'saving', 'queued', 'killed', 'pending_delete',
 
 CONF = cfg.CONF
 CONF.import_group("profiler", "glance.common.wsgi")
+CONF.import_opt("image_list_visibility_plan", "glance.common.config")
+CONF.import_opt("image_list_filter_plan", "glance.common.config")
+CONF.import_opt("use_project_usage_counters", "glance.common.config")
 
 _main_context_lock = threading.Lock()
 _main_context_manager = None
@@ -152,8 +155,10 @@ def _check_mutate_authorization(context, image_ref):
 def image_create(context, values, v1_mode=False):
     """Create an image from the values dictionary."""
     with session_for_write() as session:
+        track_usage = _project_usage_track(session, None)
         image_ref = _image_update(
             context, session, None, values, purge_props=False)
+        track_usage(image_ref.id)
 
     with session_for_read() as session:
         image = _image_get(context, session, image_ref.id)
@@ -167,16 +172,25 @@ def image_create(context, values, v1_mode=False):
 @db_api.wrap_db_retry(max_retries=50, retry_interval=0.5,
                       inc_retry_interval=False, retry_on_deadlock=True)
 def image_update(context, image_id, values, purge_props=False,
-                 from_state=None, v1_mode=False, atomic_props=None):
+                 from_state=None, v1_mode=False, atomic_props=None,
+                 delete_props=None, tags=None):
     """
     Set the given properties on an image and update it.
 
+    :param delete_props: If non-None, names of the properties to delete
+    :param tags: If non-None, the tags to set on the image in the same
+                 transaction
     :raises: ImageNotFound if image does not exist.
     """
     with session_for_write() as session:
+        track_usage = _project_usage_track(session, image_id)
         image_ref = _image_update(
             context, session, image_id, values, purge_props,
-            from_state=from_state, atomic_props=atomic_props)
+            from_state=from_state, atomic_props=atomic_props,
+            delete_props=delete_props)
+        if tags is not None:
+            _image_tag_set_all(context, session, image_id, tags)
+        track_usage()
 
     with session_for_read() as session:
         image = _image_get(context, session, image_ref.id)
@@ -197,9 +211,11 @@ def image_restore(context, image_id):
                      'from_state=pending_delete)') % image_ref.status)
             raise exception.Conflict(msg)
 
+        track_usage = _project_usage_track(session, image_id)
         query = session.query(models.Image).filter_by(id=image_id)
         values = {'status': 'active', 'deleted': 0}
         query.update(values, synchronize_session='fetch')
+        track_usage()
 
 
 @db_api.wrap_db_retry(max_retries=50, retry_interval=0.5,
@@ -212,6 +228,7 @@ def image_destroy(context, image_id):
         # Perform authorization check
         _check_mutate_authorization(context, image_ref)
 
+        track_usage = _project_usage_track(session, image_id)
         image_ref.delete(session=session)
         delete_time = image_ref.deleted_at
 
@@ -222,6 +239,7 @@ def image_destroy(context, image_id):
         _image_member_delete_all(context, session, image_id, delete_time)
 
         _image_tag_delete_all(context, session, image_id, delete_time)
+        track_usage()
 
     return _normalize_locations(context, image_ref.to_dict())
 
@@ -282,15 +300,21 @@ def _check_image_id(image_id):
         raise exception.ImageNotFound()
 
 
-def _image_get(context, session, image_id, force_show_deleted=False):
-    """Get an image or raise if it does not exist."""
+def _image_get(context, session, image_id, force_show_deleted=False,
+               load_children=True):
+    """Get an image or raise if it does not exist.
+
+    :param load_children: If false, the properties and locations of the
+                          image are not loaded along with it
+    """
     _check_image_id(image_id)
 
     try:
-        query = session.query(models.Image).options(
-            sa_orm.joinedload(models.Image.properties)).options(
-                sa_orm.joinedload(
-                    models.Image.locations)).filter_by(id=image_id)
+        query = session.query(models.Image).filter_by(id=image_id)
+        if load_children:
+            query = query.options(
+                sa_orm.joinedload(models.Image.properties)).options(
+                    sa_orm.joinedload(models.Image.locations))
 
         # filter out deleted images if context disallows it
         if not force_show_deleted and not context.can_see_deleted:
@@ -365,6 +389,12 @@ def _paginate_query(query, model, limit, sort_keys, marker=None,
 
     We also have to cope with different sort_directions.
 
+    When all the keys are sorted in the same direction and none of them can
+    be NULL, the lexicographical ordering is expressed as a single row value
+    comparison instead, (k1, k2, k3) > (X1, X2, X3), which the database can
+    resolve with a range scan of an index on the sort keys (keyset
+    pagination).
+
     Typically, the id of the last row is used as the client-facing pagination
     marker, then the actual marker object must be fetched from the db and
     passed in to us as marker.
@@ -427,6 +457,18 @@ def _paginate_query(query, model, limit, sort_keys, marker=None,
                 v = default
             marker_values.append(v)
 
+        if _can_use_keyset(model, sort_keys, sort_dirs):
+            keys = sa_sql.tuple_(*[getattr(model, sort_key)
+                                   for sort_key in sort_keys])
+            values = sa_sql.tuple_(*marker_values)
+            if sort_dirs[0] == 'desc':
+                query = query.filter(keys < values)
+            else:
+                query = query.filter(keys > values)
+            if limit is not None:
+                query = query.limit(limit)
+            return query
+
         # Build up an array of sort criteria as in the docstring
         criteria_list = []
         for i in range(len(sort_keys)):
@@ -466,6 +508,19 @@ def _paginate_query(query, model, limit, sort_keys, marker=None,
     return query
 
 
+def _can_use_keyset(model, sort_keys, sort_dirs):
+    """
+    Returns whether the pagination criteria for the supplied sort keys can
+    be expressed as a row value comparison.
+    """
+    if len(set(sort_dirs)) != 1 or sort_dirs[0] not in ('asc', 'desc'):
+        return False
+    for sort_key in sort_keys:
+        if getattr(model, sort_key).property.columns[0].nullable:
+            return False
+    return True
+
+
 def _make_conditions_from_filters(filters, is_public=None):
     # NOTE(venkatesh) make copy of the filters are to be altered in this
     # method.
@@ -593,6 +648,11 @@ def _select_images_query(context, session, image_conditions, admin_as_user,
 
     regular_user = (not context.is_admin) or admin_as_user
 
+    if regular_user and CONF.image_list_visibility_plan == 'exists':
+        return _select_visible_images_query(context, session,
+                                            img_conditional_clause,
+                                            member_status)
+
     query_member = session.query(models.Image).join(
         models.Image.members).filter(img_conditional_clause)
     if regular_user:
@@ -627,6 +687,34 @@ def _select_images_query(context, session, image_conditions, admin_as_user,
         return query_image
 
 
+def _select_visible_images_query(context, session, img_conditional_clause,
+                                 member_status):
+    """
+    Select the images visible to a regular user with a single query, the
+    equivalent of the union of public and community images, images owned by
+    the user and shared images the user is a member of.
+    """
+    member_filters = [
+        models.ImageMember.image_id == models.Image.id,
+        models.ImageMember.deleted == sa_sql.false(),
+    ]
+    if context.owner is not None:
+        member_filters.append(models.ImageMember.member == context.owner)
+        if member_status != 'all':
+            member_filters.append(models.ImageMember.status == member_status)
+    is_member = sa_sql.exists().where(sa_sql.and_(*member_filters))
+
+    visibility_filters = [
+        models.Image.visibility.in_(['public', 'community']),
+        sa_sql.and_(models.Image.visibility == 'shared', is_member),
+    ]
+    if context.owner is not None:
+        visibility_filters.append(models.Image.owner == context.owner)
+
+    return session.query(models.Image).filter(
+        img_conditional_clause).filter(sa_sql.or_(*visibility_filters))
+
+
 def image_get_all(
     context, filters=None, marker=None, limit=None,
     sort_key=None, sort_dir=None,
@@ -665,6 +753,14 @@ def image_get_all(
             v1_mode=v1_mode)
 
 
+def _select_image_ids(alias, conditions):
+    """
+    Select the ids of the images with a property or a tag matching the
+    conditions, to be used as an ``IN`` subquery.
+    """
+    return sa_sql.select(alias.image_id).where(sa_sql.and_(*conditions))
+
+
 def _image_get_all(
     context, session, filters=None, marker=None, limit=None,
     sort_key=None, sort_dir=None,
@@ -714,20 +810,29 @@ def _image_get_all(
         ]
         query = query.filter(sa_sql.or_(*community_filters))
 
-    if prop_cond:
-        for alias, prop_condition in prop_cond:
-            query = query.join(alias).filter(sa_sql.and_(*prop_condition))
+    if CONF.image_list_filter_plan == 'semijoin':
+        for alias, condition in prop_cond + tag_cond:
+            query = query.filter(
+                models.Image.id.in_(_select_image_ids(alias, condition)))
+    else:
+        if prop_cond:
+            for alias, prop_condition in prop_cond:
+                query = query.join(alias).filter(
+                    sa_sql.and_(*prop_condition))
 
-    if tag_cond:
-        for alias, tag_condition in tag_cond:
-            query = query.join(alias).filter(sa_sql.and_(*tag_condition))
+        if tag_cond:
+            for alias, tag_condition in tag_cond:
+                query = query.join(alias).filter(
+                    sa_sql.and_(*tag_condition))
 
     marker_image = None
     if marker is not None:
+        # NOTE: Only the values of the sort keys of the marker are needed.
         marker_image = _image_get(context,
                                   session,
                                   marker,
-                                  force_show_deleted=showing_deleted)
+                                  force_show_deleted=showing_deleted,
+                                  load_children=False)
 
     for key in ['created_at', 'id']:
         if key not in sort_key:
@@ -740,14 +845,33 @@ def _image_get_all(
                             sort_dir=None,
                             sort_dirs=sort_dir)
 
-    query = query.options(sa_orm.joinedload(
-        models.Image.properties)).options(
-            sa_orm.joinedload(models.Image.locations))
+    # NOTE: Select the ids of the images of the page first, then load the
+    # images and their children by id. Eager loading the children along
+    # with the paginated query would make the database join them to every
+    # candidate row, before the page is cut.
+    images_by_id = {}
+    image_ids = []
+    for (image_id,) in query.with_entities(models.Image.id):
+        if image_id not in images_by_id:
+            images_by_id[image_id] = None
+            image_ids.append(image_id)
+    if not image_ids:
+        return []
+
+    query = session.query(models.Image).filter(
+        models.Image.id.in_(image_ids)).options(
+            sa_orm.selectinload(models.Image.properties)).options(
+                sa_orm.selectinload(models.Image.locations))
     if return_tag:
-        query = query.options(sa_orm.joinedload(models.Image.tags))
+        query = query.options(sa_orm.selectinload(models.Image.tags))
+    images_by_id.update((image.id, image) for image in query)
 
     images = []
-    for image in query.all():
+    for image_id in image_ids:
+        image = images_by_id[image_id]
+        if image is None:
+            # NOTE: The image was purged in the meantime.
+            continue
         image_dict = image.to_dict()
         image_dict = _normalize_locations(
             context, image_dict, force_show_deleted=showing_deleted)
@@ -769,93 +893,238 @@ def _drop_protected_attrs(model_class, values):
             del values[attr]
 
 
+def _image_storage_usage_query(session):
+    # NOTE: An image consumes its size once per location which is not
+    # deleted, sum it in the database rather than loading every image of
+    # the owner along with its locations.
+    query = session.query(sqlalchemy.func.sum(models.Image.size))
+    query = query.join(models.ImageLocation,
+                       models.ImageLocation.image_id == models.Image.id)
+    query = query.filter(models.Image.size > 0)
+    query = query.filter(~models.Image.status.in_([
+        'killed', 'deleted', 'pending_delete']))
+    return query.filter(models.ImageLocation.status != 'deleted')
+
+
 def _image_get_disk_usage_by_owner(context, session, owner, image_id=None):
-    query = session.query(models.Image)
+    query = _image_storage_usage_query(session)
     query = query.filter(models.Image.owner == owner)
     if image_id is not None:
         query = query.filter(models.Image.id != image_id)
-    query = query.filter(models.Image.size > 0)
-    query = query.filter(~models.Image.status.in_([
-        'killed', 'deleted', 'pending_delete']))
-    images = query.all()
+    return int(query.scalar() or 0)
 
-    total = 0
-    for i in images:
-        locations = [location for location in i.locations
-                     if location['status'] != 'deleted']
-        total += (i.size * len(locations))
-    return total
 
+def _image_is_copying(excluded_statuses):
+    """
+    Return the condition matching the images which are being copied to
+    stores, for the images which are not in one of the excluded statuses.
+    """
+    return sa_sql.and_(
+        ~models.Image.status.in_(excluded_statuses),
+        sa_sql.exists().where(sa_sql.and_(
+            models.ImageProperty.image_id == models.Image.id,
+            models.ImageProperty.name == 'os_glance_importing_to_stores',
+            models.ImageProperty.value != '')))
 
-def _image_get_staging_usage_by_owner(context, session, owner):
-    # NOTE(danms): We could do this in a single query, but I think it is
-    # easier to understand as two that we concatenate while generating
-    # results.
 
+def _image_staging_usage_query(session):
     # Images in uploading or importing state are consuming staging
     # space.
-    query = session.query(models.Image)
-    query = query.filter(models.Image.owner == owner)
-    query = query.filter(models.Image.size > 0)
-    query = query.filter(models.Image.status.in_(('uploading',
-                                                  'importing')))
-    importing_images = query.all()
+    importing_statuses = ('uploading', 'importing')
 
     # Images with non-empty os_glance_importing_to_stores properties
     # may also be consuming staging space. Filter our deleted images
-    # or importing ones included in the above query.
-    props = session.query(models.ImageProperty).filter(
-        models.ImageProperty.name == 'os_glance_importing_to_stores',
-        models.ImageProperty.value != '').subquery()
-    query = session.query(models.Image)
-    query = query.join(props, props.c.image_id == models.Image.id)
-    query = query.filter(models.Image.owner == owner)
-    query = query.filter(models.Image.size > 0)
-    query = query.filter(~models.Image.status.in_(('uploading',
-                                                   'importing',
-                                                   'killed',
-                                                   'deleted',
-                                                   'pending_delete')))
-    copying_images = query.all()
+    # or importing ones included in the above statuses.
+    copying = _image_is_copying(importing_statuses + ('killed', 'deleted',
+                                                      'pending_delete'))
 
-    return sum(i.size for i in itertools.chain(importing_images,
-                                               copying_images))
+    query = session.query(sqlalchemy.func.sum(models.Image.size))
+    query = query.filter(models.Image.size > 0)
+    return query.filter(sa_sql.or_(
+        models.Image.status.in_(importing_statuses), copying))
 
 
-def _image_get_count_by_owner(context, session, owner):
-    query = session.query(models.Image)
+def _image_get_staging_usage_by_owner(context, session, owner):
+    query = _image_staging_usage_query(session)
     query = query.filter(models.Image.owner == owner)
-    query = query.filter(~models.Image.status.in_([
+    return int(query.scalar() or 0)
+
+
+def _image_count_query(session):
+    query = session.query(sqlalchemy.func.count(models.Image.id))
+    return query.filter(~models.Image.status.in_([
         'killed', 'pending_delete', 'deleted']))
-    return query.count()
 
 
-def _image_get_uploading_count_by_owner(context, session, owner):
-    """Return a count of the images uploading or importing."""
+def _image_get_count_by_owner(context, session, owner):
+    query = _image_count_query(session)
+    query = query.filter(models.Image.owner == owner)
+    return query.scalar()
 
-    importing_statuses = ('saving', 'uploading', 'importing')
 
+def _image_uploading_count_query(session):
     # Images in any state indicating uploading, including through image_upload
     # or importing count for this.
-    query = session.query(models.Image)
-    query = query.filter(models.Image.owner == owner)
-    query = query.filter(models.Image.status.in_(importing_statuses))
-    uploading = query.count()
+    importing_statuses = ('saving', 'uploading', 'importing')
 
     # Images that are not in the above list, but are not deleted and
     # in the process of doing a copy count for this.
-    props = session.query(models.ImageProperty).filter(
-        models.ImageProperty.name == 'os_glance_importing_to_stores',
-        models.ImageProperty.value != '').subquery()
-    query = session.query(models.Image)
-    query = query.join(props, props.c.image_id == models.Image.id)
+    copying = _image_is_copying(importing_statuses + ('killed', 'deleted',
+                                                      'pending_delete'))
+
+    query = session.query(sqlalchemy.func.count(models.Image.id))
+    return query.filter(sa_sql.or_(
+        models.Image.status.in_(importing_statuses), copying))
+
+
+def _image_get_uploading_count_by_owner(context, session, owner):
+    """Return a count of the images uploading or importing."""
+    query = _image_uploading_count_query(session)
     query = query.filter(models.Image.owner == owner)
-    query = query.filter(~models.Image.status.in_(importing_statuses +
-                                                  ('killed', 'deleted',
-                                                   'pending_delete')))
-    copying = query.count()
+    return query.scalar()
+
+
+# NOTE: The usage counters of the project_usages table, along with the
+# query computing each of them from the images.
+_USAGE_QUERIES = (
+    ('storage', _image_storage_usage_query),
+    ('staging', _image_staging_usage_query),
+    ('image_count', _image_count_query),
+    ('uploading_count', _image_uploading_count_query),
+)
+
+
+def _image_usage(session, image_id):
+    """
+    Return the owner of an image along with the amount the image adds to
+    each usage counter of the owner.
+    """
+    if image_id is None:
+        return None, {}
+
+    owner = session.query(models.Image.owner).filter_by(
+        id=image_id).scalar()
+    usage = {}
+    for name, usage_query in _USAGE_QUERIES:
+        query = usage_query(session).filter(models.Image.id == image_id)
+        usage[name] = int(query.scalar() or 0)
+    return owner, usage
+
+
+def _project_usage_track(session, image_id):
+    """
+    Return a function to call once an image is written, which applies the
+    change of the usage of the image to the usage counters of its owner, in
+    the same transaction as the write.
+    """
+    if not CONF.use_project_usage_counters:
+        return lambda new_image_id=None: None
+
+    before = _image_usage(session, image_id)
+
+    def _apply(new_image_id=None):
+        after = _image_usage(session, new_image_id or image_id)
+        deltas = {}
+        for owner, usage, sign in (before + (-1,), after + (1,)):
+            if owner is None:
+                continue
+            delta = deltas.setdefault(owner, dict.fromkeys(usage, 0))
+            for name, value in usage.items():
+                delta[name] += sign * value
+
+        for owner, delta in deltas.items():
+            values = {getattr(models.ProjectUsage, name):
+                      getattr(models.ProjectUsage, name) + value
+                      for name, value in delta.items() if value}
+            if not values:
+                continue
+            query = session.query(models.ProjectUsage).filter_by(
+                project_id=owner)
+            if query.update(values, synchronize_session=False):
+                continue
+            # NOTE: The project has no counters yet, initialize them from
+            # its images, this write included. When another transaction
+            # initialized them first, it could not see this write, so apply
+            # the change to them.
+            if _project_usage_create(session, owner) is None:
+                query.update(values, synchronize_session=False)
+
+    return _apply
+
+
+def _project_usage_compute(session, owners=None):
+    """
+    Compute the usage counters of the owners, or of every owner when owners
+    is None, from their images.
+
+    :returns: A dict of the usage counters by owner
+    """
+    usages = {}
+    for name, usage_query in _USAGE_QUERIES:
+        query = usage_query(session).add_columns(models.Image.owner)
+        query = query.filter(models.Image.owner.isnot(None))
+        if owners is not None:
+            query = query.filter(models.Image.owner.in_(owners))
+        for value, owner in query.group_by(models.Image.owner):
+            usage = usages.setdefault(owner, dict.fromkeys(
+                (name for name, _query in _USAGE_QUERIES), 0))
+            usage[name] = int(value or 0)
+    for owner in owners or ():
+        usages.setdefault(owner, dict.fromkeys(
+            (name for name, _query in _USAGE_QUERIES), 0))
+    return usages
+
+
+def _project_usage_create(session, owner):
+    """
+    Initialize the usage counters of a project from its images, in a
+    savepoint of the transaction of the session.
+
+    :returns: The usage counters of the project, or None when another
+              transaction already created them
+    """
+    usage = _project_usage_compute(session, [owner])[owner]
+    try:
+        with session.begin_nested():
+            session.add(models.ProjectUsage(project_id=owner, **usage))
+    except db_exception.DBDuplicateEntry:
+        return None
+    return usage
+
+
+def _project_usage_reconcile(session, owners=None):
+    """
+    Compute the usage counters of the owners from their images and store
+    them. All the counters are rebuilt when owners is None.
+
+    :returns: A dict of the usage counters by owner
+    """
+    usages = _project_usage_compute(session, owners)
+
+    query = session.query(models.ProjectUsage)
+    if owners is not None:
+        query = query.filter(models.ProjectUsage.project_id.in_(owners))
+    query.delete(synchronize_session=False)
+    for owner, usage in usages.items():
+        usage_ref = models.ProjectUsage(project_id=owner, **usage)
+        usage_ref.save(session=session)
+    return usages
 
-    return uploading + copying
+
+def _project_usage_get(context, owner):
+    """Return the usage counters of a project."""
+    with session_for_read() as session:
+        usage_ref = session.query(models.ProjectUsage).filter_by(
+            project_id=owner).first()
+        if usage_ref is not None:
+            return {name: usage_ref[name] for name, _query in _USAGE_QUERIES}
+
+    with session_for_write() as session:
+        usage = _project_usage_create(session, owner)
+    if usage is None:
+        # NOTE: Another request initialized the counters in the meantime.
+        return _project_usage_get(context, owner)
+    return usage
 
 
 def _validate_image(values, mandatory_status=True):
@@ -911,6 +1180,7 @@ def image_set_property_atomic(image_id, name, value):
     :raises Duplicate: If the property already exists
     """
     with session_for_write() as session:
+        track_usage = _project_usage_track(session, image_id)
         connection = session.connection()
         table = models.ImageProperty.__table__
 
@@ -924,6 +1194,7 @@ def image_set_property_atomic(image_id, name, value):
                             value=value, deleted=False))
         if result.rowcount == 1:
             # Found and updated a deleted property, so we win
+            track_usage()
             return
 
         # There might have been no deleted property, or the property
@@ -943,6 +1214,7 @@ def image_set_property_atomic(image_id, name, value):
 
         # If we got here, we created a new row, UniqueConstraint would have
         # caused us to fail if we lost the race
+        track_usage()
 
 
 def image_delete_property_atomic(image_id, name, value):
@@ -958,6 +1230,7 @@ def image_delete_property_atomic(image_id, name, value):
     :raises NotFound: If the property does not exist
     """
     with session_for_write() as session:
+        track_usage = _project_usage_track(session, image_id)
         connection = session.connection()
         table = models.ImageProperty.__table__
 
@@ -967,6 +1240,7 @@ def image_delete_property_atomic(image_id, name, value):
                         table.c.image_id == image_id,
                         table.c.deleted == sa_sql.false())))
         if result.rowcount == 1:
+            track_usage()
             return
 
         raise exception.NotFound()
@@ -974,7 +1248,7 @@ def image_delete_property_atomic(image_id, name, value):
 
 @utils.no_4byte_params
 def _image_update(context, session, image_id, values, purge_props=False,
-                  from_state=None, atomic_props=None):
+                  from_state=None, atomic_props=None, delete_props=None):
     """
     Used internally by image_create and image_update
 
@@ -987,6 +1261,7 @@ def _image_update(context, session, image_id, values, purge_props=False,
                         not present in values
     :param atomic_props: If non-None, refuse to create or update properties
                          in this list
+    :param delete_props: If non-None, delete the properties in this list
     """
     # NOTE(jbresnah) values is altered in this so a copy is needed
     values = values.copy()
@@ -1074,7 +1349,7 @@ def _image_update(context, session, image_id, values, purge_props=False,
 
     _set_properties_for_image(
         context, session, image_ref, properties, purge_props,
-        atomic_props)
+        atomic_props, delete_props)
 
     if location_data:
         _image_locations_set(
@@ -1085,7 +1360,9 @@ def _image_update(context, session, image_id, values, purge_props=False,
 
 def image_location_add(context, image_id, location):
     with session_for_write() as session:
+        track_usage = _project_usage_track(session, image_id)
         _image_location_add(context, session, image_id, location)
+        track_usage()
 
 
 @utils.no_4byte_params
@@ -1103,7 +1380,9 @@ def _image_location_add(context, session, image_id, location):
 
 def image_location_update(context, image_id, location):
     with session_for_write() as session:
+        track_usage = _project_usage_track(session, image_id)
         _image_location_update(context, session, image_id, location)
+        track_usage()
 
 
 @utils.no_4byte_params
@@ -1138,9 +1417,11 @@ def _image_location_update(context, session, image_id, location):
 def image_location_delete(context, image_id, location_id, status,
                           delete_time=None):
     with session_for_write() as session:
+        track_usage = _project_usage_track(session, image_id)
         _image_location_delete(
             context, session, image_id, location_id, status, delete_time=None,
         )
+        track_usage()
 
 
 def _image_location_delete(
@@ -1201,9 +1482,59 @@ def _image_locations_delete_all(
                                delete_time=delete_time)
 
 
+def image_location_get_pending_delete(context, deleted_before,
+                                      marker=None, limit=None):
+    """
+    Get a page of the locations waiting to be scrubbed.
+
+    Only the locations in ``pending_delete`` status of the images in
+    ``pending_delete`` status deleted before the given time are returned,
+    ordered by image and location id, without loading the images.
+
+    :param deleted_before: A datetime, only images deleted before it are
+                           considered
+    :param marker: The (image_id, location id) tuple of the last location of
+                   the previous page
+    :param limit: Maximum number of locations to return
+    :returns: A list of dicts with the image_id, id, url and metadata of the
+              locations
+    """
+    with session_for_read() as session:
+        query = session.query(
+            models.ImageLocation.image_id,
+            models.ImageLocation.id,
+            models.ImageLocation.value,
+            models.ImageLocation.meta_data,
+        ).join(
+            models.Image, models.Image.id == models.ImageLocation.image_id,
+        ).filter(
+            models.Image.status == 'pending_delete',
+            models.Image.deleted == sa_sql.true(),
+            models.Image.deleted_at <= deleted_before,
+            models.ImageLocation.status == 'pending_delete',
+        )
+        if marker is not None:
+            marker_image_id, marker_id = marker
+            query = query.filter(sa_sql.or_(
+                models.ImageLocation.image_id > marker_image_id,
+                sa_sql.and_(models.ImageLocation.image_id == marker_image_id,
+                            models.ImageLocation.id > marker_id)))
+        query = query.order_by(models.ImageLocation.image_id,
+                               models.ImageLocation.id)
+        if limit is not None:
+            query = query.limit(limit)
+
+        return [{'image_id': image_id,
+                 'id': loc_id,
+                 'url': url,
+                 'metadata': meta_data or {}}
+                for image_id, loc_id, url, meta_data in query.all()]
+
+
 @utils.no_4byte_params
 def _set_properties_for_image(context, session, image_ref, properties,
-                              purge_props=False, atomic_props=None):
+                              purge_props=False, atomic_props=None,
+                              delete_props=None):
     """
     Create or update a set of image_properties for a given image
 
@@ -1215,6 +1546,8 @@ def _set_properties_for_image(context, session, image_ref, properties,
                         that are not in properties
     :param atomic_props: If non-None, skip update/create/delete of properties
                          named in this list
+    :param delete_props: If non-None, delete the properties in the database
+                         named in this list
     """
 
     if atomic_props is None:
@@ -1224,28 +1557,73 @@ def _set_properties_for_image(context, session, image_ref, properties,
     for prop_ref in image_ref.properties:
         orig_properties[prop_ref.name] = prop_ref
 
+    # NOTE: The properties are written with at most one statement for each
+    # of the created, updated and deleted ones, instead of one statement
+    # per property. Properties whose value is unchanged are not written.
+    created = []
+    updated = []
     for name, value in properties.items():
-        prop_values = {'image_id': image_ref.id,
-                       'name': name,
-                       'value': value}
         if name in atomic_props:
             # NOTE(danms): Never update or create properties in the list
             # of atomics
             continue
         elif name in orig_properties:
             prop_ref = orig_properties[name]
-            _image_property_update(context, session, prop_ref, prop_values)
+            if prop_ref.deleted or prop_ref.value != value:
+                updated.append({'prop_id': prop_ref.id, 'prop_value': value})
         else:
-            _image_property_create(context, session, prop_values)
+            created.append({'image_id': image_ref.id,
+                            'name': name,
+                            'value': value,
+                            'deleted': False})
 
     if purge_props:
-        for key in orig_properties.keys():
-            if key in atomic_props:
-                continue
-            elif key not in properties:
-                prop_ref = orig_properties[key]
-                _image_property_delete(context, session, prop_ref.name,
-                                       image_ref.id)
+        delete_props = [key for key in orig_properties
+                        if key not in properties]
+
+    deleted = [orig_properties[key].id for key in delete_props or []
+               if key not in atomic_props and key in orig_properties and
+               not orig_properties[key].deleted]
+
+    _image_properties_create(session, created)
+    _image_properties_update(session, updated)
+    _image_properties_delete(session, deleted)
+
+
+def _image_properties_create(session, values):
+    """Create several image properties with a single statement."""
+    if not values:
+        return
+    table = models.ImageProperty.__table__
+    session.connection().execute(table.insert(), values)
+
+
+def _image_properties_update(session, values):
+    """
+    Set the values of several image properties with a single statement.
+
+    :param values: A list of dicts with the id of a property as prop_id and
+                   its new value as prop_value
+    """
+    if not values:
+        return
+    table = models.ImageProperty.__table__
+    session.connection().execute(
+        table.update().where(
+            table.c.id == sa_sql.bindparam('prop_id')).values(
+                value=sa_sql.bindparam('prop_value'), deleted=False),
+        values)
+
+
+def _image_properties_delete(session, prop_ids, delete_time=None):
+    """Soft delete several image properties with a single statement."""
+    if not prop_ids:
+        return
+    table = models.ImageProperty.__table__
+    delete_time = delete_time or oslo_timeutils.utcnow()
+    session.connection().execute(
+        table.update().where(table.c.id.in_(prop_ids)).values(
+            deleted=True, deleted_at=delete_time))
 
 
 def _image_child_entry_delete_all(
@@ -1282,7 +1660,10 @@ def _image_child_entry_delete_all(
 def image_property_create(context, values):
     """Create an ImageProperty object."""
     with session_for_write() as session:
-        return _image_property_create(context, session, values)
+        track_usage = _project_usage_track(session, values.get('image_id'))
+        prop = _image_property_create(context, session, values)
+        track_usage()
+        return prop
 
 
 def _image_property_create(context, session, values):
@@ -1304,7 +1685,10 @@ def _image_property_update(context, session, prop_ref, values):
 
 def image_property_delete(context, prop_ref, image_ref):
     with session_for_write() as session:
-        return _image_property_delete(context, session, prop_ref, image_ref)
+        track_usage = _project_usage_track(session, image_ref)
+        prop = _image_property_delete(context, session, prop_ref, image_ref)
+        track_usage()
+        return prop
 
 
 def _image_property_delete(context, session, prop_ref, image_ref):
@@ -1471,17 +1855,50 @@ def image_tag_set_all(context, image_id, tags):
     # NOTE(kragniz): tag ordering should match exactly what was provided, so a
     # subsequent call to image_tag_get_all returns them in the correct order
     with session_for_write() as session:
-        existing_tags = _image_tag_get_all(context, session, image_id)
+        _image_tag_set_all(context, session, image_id, tags)
 
-        tags_created = []
-        for tag in tags:
-            if tag not in tags_created and tag not in existing_tags:
-                tags_created.append(tag)
-                _image_tag_create(context, session, image_id, tag)
 
-        for tag in existing_tags:
-            if tag not in tags:
-                _image_tag_delete(context, session, image_id, tag)
+def _image_tag_set_all(context, session, image_id, tags):
+    existing_tags = _image_tag_get_all(context, session, image_id)
+
+    tags_created = []
+    for tag in tags:
+        if tag not in tags_created and tag not in existing_tags:
+            tags_created.append(tag)
+
+    tags_deleted = [tag for tag in existing_tags if tag not in tags]
+
+    _image_tags_create(context, session, image_id, tags_created)
+    _image_tags_delete(context, session, image_id, tags_deleted)
+
+
+def _image_tags_create(context, session, image_id, values):
+    """Create several image tags with a single statement."""
+    if not values:
+        return
+    for value in values:
+        if utils.REGEX_4BYTE_UNICODE.findall(value):
+            msg = _("Param values can't contain 4 byte unicode.")
+            raise exception.Invalid(msg)
+    table = models.ImageTag.__table__
+    session.connection().execute(
+        table.insert(),
+        [{'image_id': image_id, 'value': value, 'deleted': False}
+         for value in values])
+
+
+def _image_tags_delete(context, session, image_id, values):
+    """Soft delete several image tags with a single statement."""
+    if not values:
+        return
+    table = models.ImageTag.__table__
+    session.connection().execute(
+        table.update().where(
+            sa_sql.and_(table.c.image_id == image_id,
+                        table.c.value.in_(values),
+                        table.c.deleted == sa_sql.false())).values(
+                            deleted=True,
+                            deleted_at=oslo_timeutils.utcnow()))
 
 
 def image_tag_create(context, image_id, value):
@@ -1560,11 +1977,67 @@ def visit_delete_from_select(element, compiler, **kw):
         compiler.process(element.select))
 
 
-def purge_deleted_rows(context, age_in_days, max_rows):
+def _purge_rows(tab, column, query, order_column, max_rows,
+                batch_size=None, batch_sleep=0):
+    """
+    Delete the rows of a table whose column is selected by query, oldest
+    first according to order_column.
+
+    Without a batch_size, the rows are deleted by a single statement limited
+    to max_rows. Otherwise they are deleted in batches of batch_size rows,
+    each in its own transaction, sleeping batch_sleep seconds between two
+    batches. Each batch resumes from the order_column value where the
+    previous one stopped, rather than scanning the deleted rows again.
+
+    :returns: The number of deleted rows
+    """
+    if not batch_size:
+        query = query.order_by(order_column)
+        if max_rows != -1:
+            query = query.limit(max_rows)
+        with session_for_write() as session:
+            result = session.execute(DeleteFromSelect(tab, query, column))
+        return result.rowcount
+
+    rows = 0
+    cursor = None
+    while max_rows == -1 or rows < max_rows:
+        limit = batch_size
+        if max_rows != -1:
+            limit = min(batch_size, max_rows - rows)
+
+        batch_query = query.add_columns(order_column)
+        if cursor is not None:
+            batch_query = batch_query.where(order_column >= cursor)
+        batch_query = batch_query.order_by(order_column).limit(limit)
+
+        with session_for_write() as session:
+            batch = session.execute(batch_query).all()
+            if batch:
+                session.execute(tab.delete().where(
+                    column.in_([row[0] for row in batch])))
+
+        rows += len(batch)
+        if len(batch) < limit:
+            break
+        cursor = batch[-1][1]
+        LOG.debug('Deleted %(rows)d row(s) from table %(tbl)s so far',
+                  {'rows': rows, 'tbl': tab.name})
+        time.sleep(batch_sleep)
+    return rows
+
+
+def purge_deleted_rows(context, age_in_days, max_rows, batch_size=None,
+                       batch_sleep=0):
     """Purges soft deleted rows
 
     Deletes rows of table images, table tasks and all dependent tables
     according to given age for relevant models.
+
+    :param batch_size: If set, delete the rows of each table in batches of
+                       this many rows, each in its own transaction
+    :param batch_sleep: Seconds to sleep between two batches
+    :returns: A list of (table, deleted rows, elapsed seconds) tuples
     """
     # check max_rows for its maximum limit
     _validate_db_int(max_rows=max_rows)
@@ -1573,6 +2046,7 @@ def purge_deleted_rows(context, age_in_days, max_rows):
     engine = get_engine()
     deleted_age = oslo_timeutils.utcnow() - datetime.timedelta(
         days=age_in_days)
+    report = []
 
     tables = []
     for model_class in models.__dict__.values():
@@ -1590,27 +2064,24 @@ def purge_deleted_rows(context, age_in_days, max_rows):
     joined_rec = ti.join(t, t.c.id == ti.c.task_id)
     deleted_task_info = sa_sql.\
         select(ti.c.task_id).where(t.c.deleted_at < deleted_age).\
-        select_from(joined_rec).\
-        order_by(t.c.deleted_at)
-    if max_rows != -1:
-        deleted_task_info = deleted_task_info.limit(max_rows)
-    delete_statement = DeleteFromSelect(ti, deleted_task_info,
-                                        ti.c.task_id)
+        select_from(joined_rec)
     LOG.info(_LI('Purging deleted rows older than %(age_in_days)d day(s) '
                  'from table %(tbl)s'),
              {'age_in_days': age_in_days, 'tbl': ti})
+    started = time.monotonic()
     try:
-        with session_for_write() as session:
-            result = session.execute(delete_statement)
+        rows = _purge_rows(ti, ti.c.task_id, deleted_task_info,
+                           t.c.deleted_at, max_rows, batch_size=batch_size,
+                           batch_sleep=batch_sleep)
     except (db_exception.DBError, db_exception.DBReferenceError) as ex:
         LOG.exception(_LE('DBError detected when force purging '
                           'table=%(table)s: %(error)s'),
                       {'table': ti, 'error': str(ex)})
         raise
 
-    rows = result.rowcount
     LOG.info(_LI('Deleted %(rows)d row(s) from table %(tbl)s'),
              {'rows': rows, 'tbl': ti})
+    report.append((ti.name, rows, time.monotonic() - started))
 
     # get rid of FK constraints
     for tbl in ('images', 'tasks'):
@@ -1638,32 +2109,37 @@ def purge_deleted_rows(context, age_in_days, max_rows):
         deleted_at_column = tab.c.deleted_at
 
         query_delete = sa_sql.select(column).\
-            where(deleted_at_column < deleted_age).\
-            order_by(deleted_at_column)
-        if max_rows != -1:
-            query_delete = query_delete.limit(max_rows)
-
-        delete_statement = DeleteFromSelect(tab, query_delete, column)
+            where(deleted_at_column < deleted_age)
 
+        started = time.monotonic()
         try:
-            with session_for_write() as session:
-                result = session.execute(delete_statement)
+            rows = _purge_rows(tab, column, query_delete, deleted_at_column,
+                               max_rows, batch_size=batch_size,
+                               batch_sleep=batch_sleep)
         except db_exception.DBReferenceError as ex:
             with excutils.save_and_reraise_exception():
                 LOG.error(_LE('DBError detected when purging from '
                           "%(tablename)s: %(error)s"),
                           {'tablename': tbl, 'error': str(ex)})
 
-        rows = result.rowcount
         LOG.info(_LI('Deleted %(rows)d row(s) from table %(tbl)s'),
                  {'rows': rows, 'tbl': tbl})
+        report.append((tbl, rows, time.monotonic() - started))
+
+    return report
 
 
-def purge_deleted_rows_from_images(context, age_in_days, max_rows):
+def purge_deleted_rows_from_images(context, age_in_days, max_rows,
+                                   batch_size=None, batch_sleep=0):
     """Purges soft deleted rows
 
     Deletes rows of table images table according to given age for
     relevant models.
+
+    :param batch_size: If set, delete the rows in batches of this many rows,
+                       each in its own transaction
+    :param batch_sleep: Seconds to sleep between two batches
+    :returns: A list of (table, deleted rows, elapsed seconds) tuples
     """
     # check max_rows for its maximum limit
     _validate_db_int(max_rows=max_rows)
@@ -1685,29 +2161,35 @@ def purge_deleted_rows_from_images(context, age_in_days, max_rows):
 
     query_delete = sa_sql.\
         select(column).\
-        where(deleted_at_column < deleted_age).\
-        order_by(deleted_at_column)
-    if max_rows != -1:
-        query_delete = query_delete.limit(max_rows)
-
-    delete_statement = DeleteFromSelect(tab, query_delete, column)
+        where(deleted_at_column < deleted_age)
 
+    started = time.monotonic()
     try:
-        with session_for_write() as session:
-            result = session.execute(delete_statement)
+        rows = _purge_rows(tab, column, query_delete, deleted_at_column,
+                           max_rows, batch_size=batch_size,
+                           batch_sleep=batch_sleep)
     except db_exception.DBReferenceError as ex:
         with excutils.save_and_reraise_exception():
             LOG.error(_LE('DBError detected when purging from '
                       "%(tablename)s: %(error)s"),
                       {'tablename': tbl, 'error': str(ex)})
 
-    rows = result.rowcount
     LOG.info(_LI('Deleted %(rows)d row(s) from table %(tbl)s'),
              {'rows': rows, 'tbl': tbl})
+    return [(tbl, rows, time.monotonic() - started)]
 
 
 def user_get_storage_usage(context, owner_id, image_id=None):
     _check_image_id(image_id)
+    if CONF.use_project_usage_counters:
+        total_size = _project_usage_get(context, owner_id)['storage']
+        if image_id is not None:
+            with session_for_read() as session:
+                owner, usage = _image_usage(session, image_id)
+            if owner == owner_id:
+                total_size -= usage['storage']
+        return total_size
+
     with session_for_read() as session:
         total_size = _image_get_disk_usage_by_owner(
             context, session, owner_id, image_id=image_id)
@@ -1715,20 +2197,41 @@ def user_get_storage_usage(context, owner_id, image_id=None):
 
 
 def user_get_staging_usage(context, owner_id):
+    if CONF.use_project_usage_counters:
+        return _project_usage_get(context, owner_id)['staging']
+
     with session_for_read() as session:
         return _image_get_staging_usage_by_owner(context, session, owner_id)
 
 
 def user_get_image_count(context, owner_id):
+    if CONF.use_project_usage_counters:
+        return _project_usage_get(context, owner_id)['image_count']
+
     with session_for_read() as session:
         return _image_get_count_by_owner(context, session, owner_id)
 
 
 def user_get_uploading_count(context, owner_id):
+    if CONF.use_project_usage_counters:
+        return _project_usage_get(context, owner_id)['uploading_count']
+
     with session_for_read() as session:
         return _image_get_uploading_count_by_owner(context, session, owner_id)
 
 
+def project_usage_reconcile(context, project_id=None):
+    """
+    Rebuild the usage counters of a project, or of every project, from
+    their images.
+
+    :returns: The number of projects whose counters were rebuilt
+    """
+    owners = None if project_id is None else [project_id]
+    with session_for_write() as session:
+        return len(_project_usage_reconcile(session, owners))
+
+
 def _task_info_format(task_info_ref):
     """Format a task info ref for consumption outside of this module"""
     if task_info_ref is None:
@@ -2448,6 +2951,46 @@ def get_least_recently_accessed(context, node_reference_url):
     return image_id
 
 
+def get_images_to_prune(context, node_reference_url, overage):
+    """
+    Return a list of (image_id, size) tuples of the least recently accessed
+    images cached on the node, ordered by access time, whose cumulative size
+    is at least overage bytes.
+    """
+    node_id = models.NodeReference.node_reference_id
+    entries = []
+    total_size = 0
+    with session_for_read() as session:
+        query = session.query(
+            models.CachedImages.image_id, models.CachedImages.size).join(
+            models.NodeReference,
+            node_id == models.CachedImages.node_reference_id,
+            isouter=True).filter(
+            models.NodeReference.node_reference_url == node_reference_url)
+        query = query.order_by(models.CachedImages.last_accessed)
+        for image_id, size in query.yield_per(100):
+            if total_size >= overage:
+                break
+            entries.append((image_id, size))
+            total_size += size
+
+    return entries
+
+
+def delete_cached_images(context, image_ids, node_reference_url):
+    with session_for_write() as session:
+        node_id = session.query(models.NodeReference.node_reference_id).filter(
+            models.NodeReference.node_reference_url == node_reference_url
+        ).scalar_subquery()
+
+        query = session.query(models.CachedImages)
+        query = query.filter(
+            models.CachedImages.image_id.in_(image_ids))
+        query = query.filter_by(node_reference_id=node_id)
+
+        query.delete(synchronize_session=False)
+
+
 def is_image_cached_for_node(context, node_reference_url, image_id):
     node_id = models.NodeReference.node_reference_id
     filters = [
@@ -120,7 +120,11 @@ class Image(BASE, GlanceBase):
                       Index('created_at_image_idx', 'created_at'),
                       Index('updated_at_image_idx', 'updated_at'),
                       Index('os_hidden_image_idx', 'os_hidden'),
-                      Index('os_hash_value_image_idx', 'os_hash_value'))
+                      Index('os_hash_value_image_idx', 'os_hash_value'),
+                      Index('owner_created_at_id_image_idx',
+                            'owner', 'created_at', 'id'),
+                      Index('visibility_created_at_id_image_idx',
+                            'visibility', 'created_at', 'id'))
 
     id = Column(String(36), primary_key=True,
                 default=lambda: str(uuid.uuid4()))
@@ -150,6 +154,10 @@ class ImageProperty(BASE, GlanceBase):
     __tablename__ = 'image_properties'
     __table_args__ = (Index('ix_image_properties_image_id', 'image_id'),
                       Index('ix_image_properties_deleted', 'deleted'),
+                      Index('ix_image_properties_name_value',
+                            'name',
+                            'value',
+                            mysql_length={'value': 255}),
                       UniqueConstraint('image_id',
                                        'name',
                                        name='ix_image_properties_'
@@ -170,7 +178,10 @@ class ImageTag(BASE, GlanceBase):
     __table_args__ = (Index('ix_image_tags_image_id', 'image_id'),
                       Index('ix_image_tags_image_id_tag_value',
                             'image_id',
-                            'value'),)
+                            'value'),
+                      Index('ix_image_tags_value_image_id',
+                            'value',
+                            'image_id'),)
 
     id = Column(Integer, primary_key=True, nullable=False)
     image_id = Column(String(36), ForeignKey('images.id'), nullable=False)
@@ -201,6 +212,10 @@ class ImageMember(BASE, GlanceBase):
                       Index('ix_image_members_image_id_member',
                             'image_id',
                             'member'),
+                      Index('ix_image_members_member_status_image_id',
+                            'member',
+                            'status',
+                            'image_id'),
                       UniqueConstraint('image_id',
                                        'member',
                                        'deleted_at',
@@ -294,6 +309,20 @@ class CachedImages(BASE, models.ModelBase):
         nullable=False)
 
 
+class ProjectUsage(BASE, models.ModelBase):
+    """Represents the usage counters of a project in the datastore."""
+    __tablename__ = 'project_usages'
+
+    project_id = Column(String(255), primary_key=True, nullable=False)
+    storage = Column(BigInteger(), nullable=False, default=0)
+    staging = Column(BigInteger(), nullable=False, default=0)
+    image_count = Column(Integer, nullable=False, default=0)
+    uploading_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False,
+                        default=lambda: timeutils.utcnow(),
+                        onupdate=lambda: timeutils.utcnow())
+
+
 def register_models(engine):
     """Create database tables for all models with the given engine."""
     models = (Image, ImageProperty, ImageMember)
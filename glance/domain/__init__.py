@@ -15,6 +15,7 @@
 #    under the License.
 
 from collections import abc
+import copy
 import datetime
 import uuid
 
@@ -114,7 +115,16 @@ class Image(object):
         'deactivated': ('active', 'deleted'),
     }
 
+    # NOTE: Attributes stored in the columns of the images table, whose
+    # changes are tracked so that only the modified ones get saved.
+    tracked_attributes = ('name', 'status', 'visibility', 'os_hidden',
+                          'min_disk', 'min_ram', 'protected', 'checksum',
+                          'os_hash_algo', 'os_hash_value', 'owner',
+                          'disk_format', 'container_format', 'size',
+                          'virtual_size')
+
     def __init__(self, image_id, status, created_at, updated_at, **kwargs):
+        self._saved_state = None
         self.image_id = image_id
         self.status = status
         self.created_at = created_at
@@ -286,6 +296,49 @@ class Image(object):
     def set_data(self, data, size=None, backend=None, set_active=True):
         raise NotImplementedError()
 
+    def _get_state(self):
+        state = {attr: getattr(self, attr)
+                 for attr in self.tracked_attributes}
+        state['locations'] = copy.deepcopy(list(self.locations))
+        state['extra_properties'] = dict(self.extra_properties)
+        state['tags'] = set(self.tags)
+        return state
+
+    def mark_clean(self):
+        """Record the current state of the image as the saved one."""
+        self._saved_state = self._get_state()
+
+    def get_changes(self):
+        """Return the changes made to the image since it was saved.
+
+        The changes are a dict of the modified attributes and their new
+        values, except for the extra properties, which are split between
+        'extra_properties' with the properties added or modified and
+        'deleted_properties' with the names of the removed ones.
+
+        :returns: The changes, or None when the saved state of the image
+                  is unknown.
+        """
+        if self._saved_state is None:
+            return None
+
+        state = self._get_state()
+        saved_properties = self._saved_state['extra_properties']
+        properties = state.pop('extra_properties')
+        changes = {key: value for key, value in state.items()
+                   if value != self._saved_state[key]}
+
+        modified = {name: value for name, value in properties.items()
+                    if name not in saved_properties or
+                    saved_properties[name] != value}
+        if modified:
+            changes['extra_properties'] = modified
+        deleted = [name for name in saved_properties
+                   if name not in properties]
+        if deleted:
+            changes['deleted_properties'] = deleted
+        return changes
+
 
 class ExtraProperties(abc.MutableMapping, dict):
 
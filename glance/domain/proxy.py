@@ -211,6 +211,12 @@ class Image(object):
     def get_data(self, *args, **kwargs):
         return self.base.get_data(*args, **kwargs)
 
+    def mark_clean(self):
+        self.base.mark_clean()
+
+    def get_changes(self):
+        return self.base.get_changes()
+
 
 class ImageMember(object):
     def __init__(self, base):
@@ -93,6 +93,26 @@ class Gateway(object):
 
         return repo
 
+    def get_readonly_repo(self, context):
+        """Get an ImageRepo-like object to list images for display.
+
+        Only the DB layer and the property protections of the onion built
+        by get_repo change what an image reads like, so the images listed
+        through this repo skip the other layers. They must not be saved,
+        nor have their data or locations modified.
+
+        :param context: The RequestContext
+        :returns: An ImageRepo-like object with a list method
+
+        """
+        repo = glance.db.ImageRepo(context, self.db_api)
+        property_rules = self._get_property_rules()
+        if property_rules is not None:
+            repo = property_protections.ReadOnlyProtectedImageRepoProxy(
+                repo, context, property_rules)
+
+        return repo
+
     def get_member_repo(self, image, context):
         repo = glance.db.ImageMemberRepo(
             context, self.db_api, image)
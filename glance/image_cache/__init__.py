@@ -16,7 +16,8 @@
 """
 LRU Cache for Image Data
 """
-import hashlib
+import os
+import time
 
 from oslo_config import cfg
 from oslo_log import log as logging
@@ -27,6 +28,8 @@ from oslo_utils import units
 from glance.common import exception
 from glance.common import utils
 from glance.i18n import _, _LE, _LI, _LW
+from glance.image_cache import eviction
+from glance.image_cache import metrics
 
 LOG = logging.getLogger(__name__)
 
@@ -98,6 +101,62 @@ Possible values:
 Related options:
     * None
 
+""")),
+
+    cfg.StrOpt('image_cache_eviction_policy', default='lru',
+               choices=(('lru', 'Evict the least recently accessed images '
+                                'first'),
+                        ('lfu', 'Evict the least frequently accessed '
+                                'images first'),
+                        ('gdsf', 'Evict the images with the fewest hits '
+                                 'per byte first'),
+                        ('max_age', 'Evict the images cached longer than '
+                                    '``image_cache_max_age`` seconds, then '
+                                    'the least recently accessed images')),
+               ignore_case=True,
+               help=_("""
+The policy used by the cache-pruner to choose the images to evict.
+
+When the image cache grows beyond ``image_cache_max_size``, the cache-pruner
+removes cached images until the size of the cache is within the limit. This
+configuration option determines which images are removed first. All image
+cache drivers support all of the policies, as they are based on the number of
+hits, size and access and modification times every driver records for the
+cached images.
+
+The least recently used policy suits most workloads. When a few large images
+are used regularly but not very often, while many other images are only used
+once, the ``lfu`` or ``gdsf`` policies keep the large popular images cached.
+
+Possible values:
+    * lru
+    * lfu
+    * gdsf
+    * max_age
+
+Related options:
+    * ``image_cache_max_size``
+    * ``image_cache_max_age``
+
+""")),
+
+    cfg.IntOpt('image_cache_max_age', default=0, min=0,
+               help=_("""
+The amount of time, in seconds, an image remains in the cache when the
+``max_age`` eviction policy is used.
+
+With the ``max_age`` eviction policy, the cache-pruner removes the images which
+were cached longer ago than specified here, even if the image cache is below
+``image_cache_max_size``. If the image cache is still too large afterwards,
+the least recently accessed images are removed. A value of 0 disables the
+expiry of cached images, in which case the policy behaves like ``lru``.
+
+Possible values:
+    * Any non-negative integer
+
+Related options:
+    * ``image_cache_eviction_policy``
+
 """)),
 
     cfg.IntOpt('image_cache_stall_time', default=86400,  # 24 hours
@@ -144,7 +203,8 @@ task like cache-pruner and cache-cleaner, to cache images ahead of their usage.
 Upon receiving the request to cache an image, Glance touches a file in the
 ``queue`` directory with the image id as the file name. The cache-prefetcher,
 when running, polls for the files in ``queue`` directory and starts
-downloading them in the order they were created. When the download is
+downloading them in order of the priority recorded in them, then in the order
+they were created. When the download is
 successful, the zero-sized file is deleted from the ``queue`` directory.
 If the download fails, the zero-sized file remains and it'll be retried the
 next time cache-prefetcher runs.
@@ -155,18 +215,149 @@ Possible values:
 Related options:
     * ``image_cache_sqlite_db``
 
+""")),
+
+    cfg.BoolOpt('image_cache_use_file_wrapper', default=False,
+                help=_("""
+Hand cached image files to the WSGI server for delivery.
+
+When enabled, a full download of a cached image hands the open cache file to
+the ``wsgi.file_wrapper`` provided by the WSGI server (for example uWSGI or
+mod_wsgi) instead of reading it in Python. Such servers can then send the file
+using ``sendfile(2)``, letting the kernel copy the image data directly to the
+socket, which considerably lowers the CPU cost of serving cached images.
+
+Since the data no longer passes through Glance, the size of the cached file is
+verified against the image size before the response is started, and the
+``image.send`` notification reports the size of the cached file once the
+server has finished sending it.
+
+If the WSGI server does not provide ``wsgi.file_wrapper``, or for partial
+image downloads, cached images are served the usual way.
+
+Possible values:
+    * True
+    * False
+
+Related options:
+    * ``image_cache_dir``
+
+""")),
+
+    cfg.BoolOpt('image_cache_coalesce_misses', default=False,
+                help=_("""
+Serve concurrent downloads of an image which is being cached from the cache.
+
+By default, only the first download of an image which is not cached yet fills
+the image cache, while every other download of the same image started before
+caching has completed streams the image data from the backend store on its own.
+When many clients download a new image at the same time, this results in as
+many simultaneous connections to the backend store.
+
+When enabled, downloads of an image which is currently being written to the
+cache on this node attach to the incomplete cache file and stream the image
+data from it as it grows, instead of opening their own backend connection. If
+caching the image fails, or makes no progress for
+``image_cache_coalesce_timeout`` seconds, the remaining image data is fetched
+from the backend store.
+
+Partial image downloads of an image which is being cached are always served
+from the backend store.
+
+Possible values:
+    * True
+    * False
+
+Related options:
+    * ``image_cache_coalesce_timeout``
+
+""")),
+
+    cfg.IntOpt('image_cache_coalesce_timeout', default=60, min=1,
+               help=_("""
+The amount of time, in seconds, a download attached to an image which is being
+cached waits for more image data to be written to the cache, before fetching
+the remaining image data from the backend store.
+
+Possible values:
+    * Any positive integer
+
+Related options:
+    * ``image_cache_coalesce_misses``
+
+""")),
+
+    cfg.IntOpt('image_cache_metadata_ttl', default=0, min=0,
+               help=_("""
+The amount of time, in seconds, the image cache middleware keeps the metadata
+of the images it serves from the cache.
+
+By default, every download of a cached image reads the metadata of the image
+from the database before the image data is served. When this option is set,
+the metadata is kept in memory for the given amount of time, so that repeated
+downloads of a cached image do not hit the database.
+
+The metadata of an image is dropped as soon as the image, or its members, are
+updated or deleted through the same API worker. Changes made through other
+API workers or nodes, such as the deactivation or deletion of an image or the
+removal of an image member, may take up to this amount of time to be noticed
+by the worker. A value of 0 disables the metadata cache.
+
+Possible values:
+    * Any non-negative integer
+
+Related options:
+    * None
+
+""")),
+
+    cfg.IntOpt('image_cache_prefetch_workers', default=4, min=1,
+               help=_("""
+The maximum number of images the cache-prefetcher fetches concurrently.
+
+Each image being prefetched holds a connection to its backend store. Queued
+images are fetched in order of their priority, then in the order they were
+queued, with at most this many fetches in progress at any time.
+
+Possible values:
+    * Any positive integer
+
+Related options:
+    * ``image_cache_prefetch_rate_limit``
+
+""")),
+
+    cfg.IntOpt('image_cache_prefetch_rate_limit', default=0, min=0,
+               help=_("""
+The maximum rate, in bytes per second, at which the cache-prefetcher reads
+image data from the backend stores.
+
+The limit applies to all the images being prefetched at the same time
+combined, so that prefetching does not starve image downloads and uploads of
+bandwidth. A value of 0 means no limit.
+
+Possible values:
+    * Any non-negative integer
+
+Related options:
+    * ``image_cache_prefetch_workers``
+
 """)),
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(image_cache_opts)
 
+COALESCE_CHUNK_SIZE = 64 * units.Ki
+COALESCE_POLL_INTERVAL = 0.1
+
 
 class ImageCache(object):
 
     """Provides an LRU cache for image data."""
 
     def __init__(self):
+        self.metrics = metrics.METRICS
         self.init_driver()
 
     def init_driver(self):
@@ -220,6 +411,15 @@ class ImageCache(object):
         """
         return self.driver.is_cached(image_id)
 
+    def is_being_cached(self, image_id):
+        """
+        Returns True if the image with supplied id is currently
+        in the process of having its image file cached.
+
+        :param image_id: Image ID
+        """
+        return self.driver.is_being_cached(image_id)
+
     def is_queued(self, image_id):
         """
         Returns True if the image identifier is in our cache queue.
@@ -248,6 +448,13 @@ class ImageCache(object):
         """
         return self.driver.get_cached_images()
 
+    def get_metrics(self):
+        """
+        Returns the hit/miss and byte counters and latency histograms of
+        the image cache for the current process.
+        """
+        return self.metrics.to_dict()
+
     def get_cached_nodes(self, image_id):
         """
         Returns a list of nodes where image is cached.
@@ -284,35 +491,70 @@ class ImageCache(object):
         """
         self.driver.delete_queued_image(image_id)
 
+    def get_images_to_prune(self, policy_name=None):
+        """
+        Returns a list of tuples containing the image_id and size of the
+        cached images the supplied (or configured) eviction policy would
+        remove to bring the cache below its maximum size.
+
+        :param policy_name: Name of the eviction policy
+        """
+        policy = eviction.get_policy(self.driver, policy_name)
+        max_size = CONF.image_cache_max_size
+        current_size = self.driver.get_cache_size()
+        if max_size > current_size and not policy.evicts_below_max_size:
+            LOG.debug("Image cache has free space, skipping prune...")
+            return []
+
+        overage = max(current_size - max_size, 0)
+        LOG.debug("Image cache currently %(overage)d bytes over max "
+                  "size. Starting prune to max size of %(max_size)d "
+                  "using the '%(policy)s' eviction policy",
+                  {'overage': overage, 'max_size': max_size,
+                   'policy': policy.name})
+        return policy.get_images_to_prune(overage)
+
+    def get_prune_report(self):
+        """
+        Returns a mapping of every eviction policy to the images it would
+        remove from the cache, without removing any of them.
+        """
+        report = {}
+        for policy_name in sorted(eviction.POLICIES):
+            entries = self.get_images_to_prune(policy_name)
+            report[policy_name] = {
+                'images': [image_id for image_id, size in entries],
+                'total_files': len(entries),
+                'total_bytes': sum(size for image_id, size in entries),
+            }
+        return report
+
     def prune(self):
         """
         Removes all cached image files above the cache's maximum
         size. Returns a tuple containing the total number of cached
         files removed and the total size of all pruned image files.
         """
-        max_size = CONF.image_cache_max_size
-        current_size = self.driver.get_cache_size()
-        if max_size > current_size:
-            LOG.debug("Image cache has free space, skipping prune...")
+        # NOTE: Determine all the images to prune in one go and delete
+        # them in bulk instead of looking up and deleting the least
+        # recently accessed image one at a time.
+        started_at = time.monotonic()
+        self.metrics.incr('prune_runs')
+        entries = self.get_images_to_prune()
+        if not entries:
             return (0, 0)
 
-        overage = current_size - max_size
-        LOG.debug("Image cache currently %(overage)d bytes over max "
-                  "size. Starting prune to max size of %(max_size)d ",
-                  {'overage': overage, 'max_size': max_size})
-
-        total_bytes_pruned = 0
-        total_files_pruned = 0
-        entry = self.driver.get_least_recently_accessed()
-        while entry and current_size > max_size:
-            image_id, size = entry
+        for image_id, size in entries:
             LOG.debug("Pruning '%(image_id)s' to free %(size)d bytes",
                       {'image_id': image_id, 'size': size})
-            self.driver.delete_cached_image(image_id)
-            total_bytes_pruned = total_bytes_pruned + size
-            total_files_pruned = total_files_pruned + 1
-            current_size = current_size - size
-            entry = self.driver.get_least_recently_accessed()
+        self.driver.delete_cached_images(
+            [image_id for image_id, size in entries])
+
+        total_bytes_pruned = sum(size for image_id, size in entries)
+        total_files_pruned = len(entries)
+        self.metrics.incr('pruned_files', total_files_pruned)
+        self.metrics.incr('pruned_bytes', total_bytes_pruned)
+        self.metrics.observe('prune_time', time.monotonic() - started_at)
 
         LOG.debug("Pruning finished pruning. "
                   "Pruned %(total_files_pruned)d and "
@@ -328,7 +570,7 @@ class ImageCache(object):
         """
         self.driver.clean(stall_time)
 
-    def queue_image(self, image_id):
+    def queue_image(self, image_id, priority=0):
         """
         This adds a image to be cache to the queue.
 
@@ -336,8 +578,19 @@ class ImageCache(object):
         cached, we return False, True otherwise
 
         :param image_id: Image ID
+        :param priority: Images with a higher priority are prefetched first
+        """
+        return self.driver.queue_image(image_id, priority=priority)
+
+    def get_prefetch_queue(self):
+        """
+        Returns a list of the image IDs in the queue, ordered from the
+        highest priority down, and by the time the image ID was inserted
+        into the queue among images of the same priority.
         """
-        return self.driver.queue_image(image_id)
+        return sorted(self.get_queued_images(),
+                      key=lambda image_id: -self.driver.get_queue_priority(
+                          image_id))
 
     def get_caching_iter(self, image_id, image_checksum, image_iter):
         """
@@ -351,37 +604,43 @@ class ImageCache(object):
         :param image_iter: Iterator that will read image contents
         """
         if not self.driver.is_cacheable(image_id):
-            return image_iter
+            return self.metrics.count_bytes(image_iter, 'bytes_from_backend')
 
         LOG.debug("Tee'ing image '%s' into cache", image_id)
 
         return self.cache_tee_iter(image_id, image_iter, image_checksum)
 
     def cache_tee_iter(self, image_id, image_iter, image_checksum):
+        started_at = time.monotonic()
         try:
-            current_checksum = hashlib.md5(usedforsecurity=False)
+            hasher = utils.MultiHasher(('md5',))
 
             with self.driver.open_for_write(image_id) as cache_file:
-                for chunk in image_iter:
+                for chunk in utils.HashingReader(image_iter, hasher):
                     try:
                         cache_file.write(chunk)
                     finally:
-                        current_checksum.update(chunk)
+                        self.metrics.incr('bytes_from_backend', len(chunk))
                         yield chunk
                 cache_file.flush()
 
                 if (image_checksum and
-                        image_checksum != current_checksum.hexdigest()):
+                        image_checksum != hasher.hexdigest('md5')):
+                    self.metrics.incr('checksum_aborts')
                     msg = _("Checksum verification failed. Aborted "
                             "caching of image '%s'.") % image_id
                     raise exception.GlanceException(msg)
 
+            self.metrics.incr('fills_completed')
+            self.metrics.observe('fill_time', time.monotonic() - started_at)
         except exception.GlanceException as e:
             with excutils.save_and_reraise_exception():
+                self.metrics.incr('fill_failures')
                 # image_iter has given us bad, (size_checked_iter has found a
                 # bad length), or corrupt data (checksum is wrong).
                 LOG.exception(str(e))
         except Exception as e:
+            self.metrics.incr('fill_failures')
             LOG.exception(_LE("Exception encountered while tee'ing "
                               "image '%(image_id)s' into cache: %(error)s. "
                               "Continuing with response."),
@@ -390,8 +649,113 @@ class ImageCache(object):
 
             # If no checksum provided continue responding even if
             # caching failed.
-            for chunk in image_iter:
+            for chunk in self.metrics.count_bytes(image_iter,
+                                                  'bytes_from_backend'):
+                yield chunk
+
+    def get_coalescing_iter(self, image_id, image_size, fallback=None):
+        """
+        Returns an iterator over the image file which is currently being
+        written to the cache by another download of the same image. The
+        incomplete cache file is followed as it grows until ``image_size``
+        bytes have been read.
+
+        If caching the image fails or makes no progress for
+        ``image_cache_coalesce_timeout`` seconds, the rest of the image
+        data is read from the iterator returned by ``fallback``.
+
+        :param image_id: Image ID
+        :param image_size: Size of the image in bytes
+        :param fallback: Callable taking the number of bytes already read
+                         and returning an iterator over the remaining image
+                         data
+        """
+        incomplete_path = self.driver.get_image_filepath(image_id,
+                                                         'incomplete')
+        bytes_read = 0
+        try:
+            cache_file = open(incomplete_path, 'rb')
+        except FileNotFoundError:
+            cache_file = None
+
+        if cache_file is None and self.is_cached(image_id):
+            # NOTE: Caching the image completed in the meantime.
+            with self.open_for_read(image_id) as cache_file:
+                yield from self.metrics.count_bytes(
+                    utils.chunkiter(cache_file), 'bytes_from_cache')
+            return
+
+        if cache_file is not None:
+            LOG.debug("Following image '%s' while it is being cached",
+                      image_id)
+            with cache_file:
+                bytes_read = yield from self._follow_incomplete_file(
+                    image_id, cache_file, incomplete_path, image_size)
+            self.metrics.incr('bytes_from_cache', bytes_read)
+
+        if bytes_read < image_size:
+            if fallback is None:
+                msg = _("Caching of image '%s' failed while following "
+                        "it.") % image_id
+                raise exception.GlanceException(msg)
+
+            LOG.warning(_LW("Caching of image '%(image_id)s' did not "
+                            "complete, reading the remaining "
+                            "%(remaining)d bytes from the backend."),
+                        {'image_id': image_id,
+                         'remaining': image_size - bytes_read})
+            remaining_iter = fallback(bytes_read)
+            try:
+                yield from self.metrics.count_bytes(remaining_iter,
+                                                    'bytes_from_backend')
+            finally:
+                if hasattr(remaining_iter, 'close'):
+                    remaining_iter.close()
+            return
+
+        # NOTE: All the image data has been read, but the writer
+        # verifies the checksum only once it has written everything, so
+        # make sure the image was actually committed to the cache.
+        if not self._wait_for_cached(image_id, incomplete_path):
+            msg = _("Checksum verification failed while caching image "
+                    "'%s'.") % image_id
+            raise exception.GlanceException(msg)
+
+    def _follow_incomplete_file(self, image_id, cache_file, incomplete_path,
+                                image_size):
+        timeout = CONF.image_cache_coalesce_timeout
+        bytes_read = 0
+        last_progress = time.time()
+        while bytes_read < image_size:
+            # NOTE: Check whether the writer is done before reading, so
+            # that the read below sees everything it has written.
+            writer_done = not os.path.exists(incomplete_path)
+            chunk = cache_file.read(COALESCE_CHUNK_SIZE)
+            if chunk:
+                bytes_read += len(chunk)
+                last_progress = time.time()
                 yield chunk
+                continue
+
+            if writer_done:
+                break
+            if time.time() - last_progress > timeout:
+                LOG.warning(_LW("Caching of image '%(image_id)s' made no "
+                                "progress for %(timeout)d seconds."),
+                            {'image_id': image_id, 'timeout': timeout})
+                break
+            time.sleep(COALESCE_POLL_INTERVAL)
+
+        return bytes_read
+
+    def _wait_for_cached(self, image_id, incomplete_path):
+        timeout = CONF.image_cache_coalesce_timeout
+        started = time.time()
+        while os.path.exists(incomplete_path):
+            if time.time() - started > timeout:
+                return False
+            time.sleep(COALESCE_POLL_INTERVAL)
+        return self.is_cached(image_id)
 
     def cache_image_iter(self, image_id, image_iter, image_checksum=None):
         """
@@ -127,6 +127,15 @@ class Driver(object):
         """
         raise NotImplementedError
 
+    def is_being_cached(self, image_id):
+        """
+        Returns True if the image with supplied id is currently
+        in the process of having its image file cached.
+
+        :param image_id: Image ID
+        """
+        raise NotImplementedError
+
     def is_queued(self, image_id):
         """
         Returns True if the image identifier is in our cache queue.
@@ -165,13 +174,28 @@ class Driver(object):
         """
         raise NotImplementedError
 
-    def queue_image(self, image_id):
+    def queue_image(self, image_id, priority=0):
         """
         Puts an image identifier in a queue for caching. Return True
         on successful add to the queue, False otherwise...
 
+        :param image_id: Image ID
+        :param priority: Images with a higher priority are prefetched first
+        """
+
+    def get_queue_priority(self, image_id):
+        """
+        Returns the priority with which the image was queued, 0 if it was
+        queued without priority or is not queued.
+
         :param image_id: Image ID
         """
+        path = self.get_image_filepath(image_id, 'queue')
+        try:
+            with open(path) as queue_file:
+                return int(queue_file.read() or 0)
+        except (OSError, ValueError):
+            return 0
 
     def clean(self, stall_time=None):
         """
@@ -187,6 +211,26 @@ class Driver(object):
         """
         raise NotImplementedError
 
+    def get_images_to_prune(self, overage):
+        """
+        Return a list of tuples containing the image_id and size of the
+        least recently accessed cached files, ordered from least recently
+        accessed on, whose cumulative size is at least ``overage`` bytes
+        (or all cached files if their total size is smaller).
+
+        :param overage: Number of bytes to free
+        """
+        raise NotImplementedError
+
+    def delete_cached_images(self, image_ids):
+        """
+        Removes the cached image files and any attributes about the images
+        with the supplied identifiers.
+
+        :param image_ids: List of image IDs
+        """
+        raise NotImplementedError
+
     def open_for_write(self, image_id):
         """
         Open a file for writing the image file for an image
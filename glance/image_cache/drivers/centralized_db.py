@@ -176,6 +176,21 @@ class Driver(base.Driver):
         self.db_api.delete_cached_image(
             self.context, image_id, node_reference_url)
 
+    def delete_cached_images(self, image_ids):
+        """
+        Removes the cached image files and any attributes about the images
+        with the supplied identifiers.
+
+        :param image_ids: List of image IDs
+        """
+        if not image_ids:
+            return
+        node_reference_url = CONF.worker_self_reference_url
+        for image_id in image_ids:
+            delete_cached_file(self.get_image_filepath(image_id))
+        self.db_api.delete_cached_images(
+            self.context, image_ids, node_reference_url)
+
     def delete_all_queued_images(self):
         """
         Removes all queued image files and any attributes about the images
@@ -227,6 +242,18 @@ class Driver(base.Driver):
             size = 0
         return image_id, size
 
+    def get_images_to_prune(self, overage):
+        """
+        Return a list of tuples containing the image_id and size of the
+        least recently accessed cached files whose cumulative size is at
+        least ``overage`` bytes.
+
+        :param overage: Number of bytes to free
+        """
+        node_reference_url = CONF.worker_self_reference_url
+        return self.db_api.get_images_to_prune(
+            self.context, node_reference_url, overage)
+
     @contextmanager
     def open_for_write(self, image_id):
         """
@@ -307,7 +334,7 @@ class Driver(base.Driver):
             self.db_api.update_hit_count(
                 self.context, image_id, node_reference_url)
 
-    def queue_image(self, image_id):
+    def queue_image(self, image_id, priority=0):
         """
         This adds a image to be cache to the queue.
 
@@ -315,6 +342,7 @@ class Driver(base.Driver):
         cached, we return False, True otherwise
 
         :param image_id: Image ID
+        :param priority: Images with a higher priority are prefetched first
         """
         if self.is_cached(image_id):
             LOG.info(_LI("Not queueing image '%s'. Already cached."), image_id)
@@ -331,9 +359,11 @@ class Driver(base.Driver):
 
         path = self.get_image_filepath(image_id, 'queue')
 
-        # Touch the file to add it to the queue
-        with open(path, "w"):
-            pass
+        # Touch the file to add it to the queue, recording the priority
+        # of the image in it
+        with open(path, "w") as queue_file:
+            if priority:
+                queue_file.write(str(priority))
 
         return True
 
@@ -227,6 +227,20 @@ class Driver(base.Driver):
                        (image_id, ))
             db.commit()
 
+    def delete_cached_images(self, image_ids):
+        """
+        Removes the cached image files and any attributes about the images
+        with the supplied identifiers.
+
+        :param image_ids: List of image IDs
+        """
+        with common.get_db(self.db_path) as db:
+            for image_id in image_ids:
+                delete_cached_file(self.get_image_filepath(image_id))
+            db.executemany("""DELETE FROM cached_images WHERE image_id = ?""",
+                           [(image_id, ) for image_id in image_ids])
+            db.commit()
+
     def delete_all_queued_images(self):
         """
         Removes all queued image files and any attributes about the images
@@ -282,6 +296,26 @@ class Driver(base.Driver):
             size = 0
         return image_id, size
 
+    def get_images_to_prune(self, overage):
+        """
+        Return a list of tuples containing the image_id and size of the
+        least recently accessed cached files whose cumulative size is at
+        least ``overage`` bytes.
+
+        :param overage: Number of bytes to free
+        """
+        entries = []
+        total_size = 0
+        with common.get_db(self.db_path) as db:
+            cur = db.execute("""SELECT image_id, size FROM cached_images
+                             ORDER BY last_accessed""")
+            for image_id, size in cur:
+                if total_size >= overage:
+                    break
+                entries.append((image_id, size))
+                total_size += size
+        return entries
+
     @contextmanager
     def open_for_write(self, image_id):
         """
@@ -369,7 +403,7 @@ class Driver(base.Driver):
                        (now, image_id))
             db.commit()
 
-    def queue_image(self, image_id):
+    def queue_image(self, image_id, priority=0):
         """
         This adds a image to be cache to the queue.
 
@@ -377,6 +411,7 @@ class Driver(base.Driver):
         cached, we return False, True otherwise
 
         :param image_id: Image ID
+        :param priority: Images with a higher priority are prefetched first
         """
         if self.is_cached(image_id):
             LOG.info(_LI("Not queueing image '%s'. Already cached."), image_id)
@@ -393,9 +428,11 @@ class Driver(base.Driver):
 
         path = self.get_image_filepath(image_id, 'queue')
 
-        # Touch the file to add it to the queue
-        with open(path, "w"):
-            pass
+        # Touch the file to add it to the queue, recording the priority
+        # of the image in it
+        with open(path, "w") as queue_file:
+            if priority:
+                queue_file.write(str(priority))
 
         return True
 
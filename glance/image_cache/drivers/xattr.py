@@ -211,6 +211,16 @@ class Driver(base.Driver):
         path = self.get_image_filepath(image_id)
         delete_cached_file(path)
 
+    def delete_cached_images(self, image_ids):
+        """
+        Removes the cached image files and any attributes about the images
+        with the supplied identifiers.
+
+        :param image_ids: List of image IDs
+        """
+        for image_id in image_ids:
+            delete_cached_file(self.get_image_filepath(image_id))
+
     def delete_all_queued_images(self):
         """
         Removes all queued image files and any attributes about the images
@@ -247,6 +257,31 @@ class Driver(base.Driver):
         stats.sort()
         return os.path.basename(stats[0][2]), stats[0][1]
 
+    def get_images_to_prune(self, overage):
+        """
+        Return a list of tuples containing the image_id and size of the
+        least recently accessed cached files whose cumulative size is at
+        least ``overage`` bytes.
+
+        :param overage: Number of bytes to free
+        """
+        stats = []
+        for path in get_all_regular_files(self.base_dir):
+            file_info = os.stat(path)
+            stats.append((file_info[stat.ST_ATIME],  # access time
+                          file_info[stat.ST_SIZE],   # size in bytes
+                          path))                     # absolute path
+        stats.sort()
+
+        entries = []
+        total_size = 0
+        for atime, size, path in stats:
+            if total_size >= overage:
+                break
+            entries.append((os.path.basename(path), size))
+            total_size += size
+        return entries
+
     @contextmanager
     def open_for_write(self, image_id):
         """
@@ -320,7 +355,7 @@ class Driver(base.Driver):
         path = self.get_image_filepath(image_id)
         inc_xattr(path, 'hits', 1)
 
-    def queue_image(self, image_id):
+    def queue_image(self, image_id, priority=0):
         """
         This adds a image to be cache to the queue.
 
@@ -328,6 +363,7 @@ class Driver(base.Driver):
         cached, we return False, True otherwise
 
         :param image_id: Image ID
+        :param priority: Images with a higher priority are prefetched first
         """
         if self.is_cached(image_id):
             LOG.info(_LI("Not queueing image '%s'. Already cached."), image_id)
@@ -345,9 +381,11 @@ class Driver(base.Driver):
         path = self.get_image_filepath(image_id, 'queue')
         LOG.debug("Queueing image '%s'.", image_id)
 
-        # Touch the file to add it to the queue
-        with open(path, "w"):
-            pass
+        # Touch the file to add it to the queue, recording the priority
+        # of the image in it
+        with open(path, "w") as queue_file:
+            if priority:
+                queue_file.write(str(priority))
 
         return True
 
@@ -0,0 +1,166 @@
+# Copyright 2026 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Eviction policies deciding which images are pruned from the image cache
+"""
+
+import time
+
+from oslo_config import cfg
+
+CONF = cfg.CONF
+
+
+class EvictionPolicy(object):
+
+    """
+    Base class of the image cache eviction policies.
+
+    A policy orders the records about cached images returned by the
+    ``get_cached_images`` method of the cache driver, and selects the
+    images to evict in that order until enough space has been freed.
+    """
+
+    name = None
+
+    # Whether the policy evicts images even if the cache is not full
+    evicts_below_max_size = False
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    def sort_key(self, entry):
+        """
+        Return the key by which the supplied cached image record is ordered,
+        images with the lowest keys are evicted first.
+
+        :param entry: Cached image record
+        """
+        raise NotImplementedError
+
+    def get_images_to_prune(self, overage):
+        """
+        Return a list of tuples containing the image_id and size of the
+        cached images to evict in order to free at least ``overage`` bytes.
+
+        :param overage: Number of bytes to free
+        """
+        entries = sorted(self.driver.get_cached_images(), key=self.sort_key)
+        return _select(entries, overage)
+
+
+class LRUPolicy(EvictionPolicy):
+
+    """Evicts the least recently accessed images first."""
+
+    name = 'lru'
+
+    def sort_key(self, entry):
+        return entry['last_accessed']
+
+    def get_images_to_prune(self, overage):
+        # NOTE: The drivers are able to determine the least recently
+        # accessed images without gathering all cached image records.
+        return self.driver.get_images_to_prune(overage)
+
+
+class LFUPolicy(EvictionPolicy):
+
+    """
+    Evicts the least frequently accessed images first, the least recently
+    accessed first among images with the same number of hits.
+    """
+
+    name = 'lfu'
+
+    def sort_key(self, entry):
+        return (entry['hits'], entry['last_accessed'])
+
+
+class GDSFPolicy(EvictionPolicy):
+
+    """
+    Greedy-Dual-Size-Frequency style policy, evicts the images with the
+    fewest hits per byte first. Large images which are rarely used are
+    evicted before small popular ones, while large images which are used
+    often are kept.
+    """
+
+    name = 'gdsf'
+
+    def sort_key(self, entry):
+        return ((entry['hits'] + 1) / max(entry['size'], 1),
+                entry['last_accessed'])
+
+
+class MaxAgePolicy(EvictionPolicy):
+
+    """
+    Evicts all images which have been cached for longer than
+    ``image_cache_max_age`` seconds, regardless of the size of the cache,
+    and then the least recently accessed images if more space is needed.
+    """
+
+    name = 'max_age'
+    evicts_below_max_size = True
+
+    def sort_key(self, entry):
+        return entry['last_accessed']
+
+    def get_images_to_prune(self, overage):
+        max_age = CONF.image_cache_max_age
+        if not max_age:
+            return LRUPolicy(self.driver).get_images_to_prune(overage)
+
+        older_than = time.time() - max_age
+        expired = []
+        others = []
+        for entry in sorted(self.driver.get_cached_images(),
+                            key=self.sort_key):
+            if entry['last_modified'] < older_than:
+                expired.append((entry['image_id'], entry['size']))
+            else:
+                others.append(entry)
+
+        freed = sum(size for image_id, size in expired)
+        return expired + _select(others, overage - freed)
+
+
+POLICIES = {policy.name: policy
+            for policy in (LRUPolicy, LFUPolicy, GDSFPolicy, MaxAgePolicy)}
+
+
+def get_policy(driver, name=None):
+    """
+    Return the eviction policy with the supplied name, or the one configured
+    through ``image_cache_eviction_policy``, for the supplied cache driver.
+
+    :param driver: Image cache driver
+    :param name: Name of the eviction policy
+    """
+    name = name or CONF.image_cache_eviction_policy
+    return POLICIES[name.lower()](driver)
+
+
+def _select(entries, overage):
+    selected = []
+    total_size = 0
+    for entry in entries:
+        if total_size >= overage:
+            break
+        selected.append((entry['image_id'], entry['size']))
+        total_size += entry['size']
+    return selected
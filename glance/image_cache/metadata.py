@@ -0,0 +1,116 @@
+# Copyright 2026 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Short-lived cache of the metadata of images served from the image cache
+"""
+
+import threading
+import time
+
+from oslo_config import cfg
+
+CONF = cfg.CONF
+
+# Maximum number of images whose metadata is kept
+MAX_IMAGES = 1024
+
+
+class ImageMetadataCache(object):
+
+    """
+    Keeps the images looked up by the image cache middleware for
+    ``image_cache_metadata_ttl`` seconds.
+
+    Whether an image is visible depends on the project and admin status of
+    the requester, so the image is kept separately for each of those. The
+    images are dropped as soon as they are updated or deleted through this
+    process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._images = {}
+        # NOTE: Incremented on every invalidation, so that an image read
+        # from the database before it was invalidated is not cached.
+        self.generation = 0
+
+    @staticmethod
+    def _get_key(context):
+        return (context.owner, context.is_admin)
+
+    def get(self, context, image_id):
+        """
+        Returns the image with the supplied ID as seen from the supplied
+        context, or None if it is not cached or has expired.
+        """
+        if not CONF.image_cache_metadata_ttl:
+            return None
+
+        with self._lock:
+            expires_at, image = self._images.get(image_id, {}).get(
+                self._get_key(context), (0, None))
+        if expires_at < time.monotonic():
+            return None
+        return image
+
+    def set(self, context, image, generation):
+        """
+        Caches the supplied image as seen from the supplied context.
+
+        :param generation: value of ``generation`` before the image was
+                           read from the database
+        """
+        if not CONF.image_cache_metadata_ttl:
+            return
+
+        expires_at = time.monotonic() + CONF.image_cache_metadata_ttl
+        with self._lock:
+            if generation != self.generation:
+                return
+            if (image.image_id not in self._images and
+                    len(self._images) >= MAX_IMAGES):
+                self._evict()
+            self._images.setdefault(image.image_id, {})[
+                self._get_key(context)] = (expires_at, image)
+
+    def _evict(self):
+        now = time.monotonic()
+        for image_id, entries in list(self._images.items()):
+            if all(expires_at < now for expires_at, image in
+                   entries.values()):
+                del self._images[image_id]
+
+        if len(self._images) >= MAX_IMAGES:
+            # NOTE: Drop the image which was cached first.
+            del self._images[next(iter(self._images))]
+
+    def invalidate(self, image_id):
+        """Drops the image with the supplied ID from the cache."""
+        with self._lock:
+            self.generation += 1
+            self._images.pop(image_id, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._images.clear()
+
+
+METADATA_CACHE = ImageMetadataCache()
+
+
+def invalidate(image_id):
+    METADATA_CACHE.invalidate(image_id)
@@ -0,0 +1,141 @@
+# Copyright 2026 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Counters and latency histograms about the use of the image cache
+"""
+
+import bisect
+import threading
+import time
+
+# Upper bounds, in seconds, of the buckets of the latency histograms
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+
+COUNTERS = (
+    # Downloads served entirely from the image cache
+    'hits',
+    # Downloads served while the image was being written to the cache
+    'coalesced_hits',
+    # Downloads of images which were not cached
+    'misses',
+    'bytes_from_cache',
+    'bytes_from_backend',
+    # Images written to the cache completely, or not
+    'fills_completed',
+    'fill_failures',
+    # Images not cached because their checksum did not match
+    'checksum_aborts',
+    'prune_runs',
+    'pruned_files',
+    'pruned_bytes',
+)
+
+HISTOGRAMS = (
+    'hit_time_to_first_byte',
+    'fill_time',
+    'prune_time',
+)
+
+
+class Histogram(object):
+
+    """Distribution of observed durations over fixed buckets."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def to_dict(self):
+        """
+        Returns the histogram with the cumulative number of observations
+        below or equal to the upper bound of every bucket.
+        """
+        buckets = {}
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            buckets[str(bound)] = total
+        return {'count': self.count, 'sum': self.sum, 'buckets': buckets}
+
+
+class CacheMetrics(object):
+
+    """
+    Thread-safe counters and latency histograms of the image cache.
+
+    The metrics are kept in memory and cover the requests served by the
+    current process since it was started.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = dict.fromkeys(COUNTERS, 0)
+            self.histograms = {name: Histogram() for name in HISTOGRAMS}
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def observe(self, name, value):
+        with self._lock:
+            self.histograms[name].observe(value)
+
+    def count_bytes(self, image_iter, counter, started_at=None):
+        """
+        Returns an iterator over the supplied one, adding the length of
+        every chunk to the supplied counter.
+
+        :param image_iter: Iterator over image data
+        :param counter: Name of the counter of bytes
+        :param started_at: Monotonic time at which the request was received.
+                           If supplied, the time until the first chunk is
+                           available is recorded as time-to-first-byte.
+        """
+        for chunk in image_iter:
+            if started_at is not None:
+                self.observe('hit_time_to_first_byte',
+                             time.monotonic() - started_at)
+                started_at = None
+            self.incr(counter, len(chunk))
+            yield chunk
+
+    def to_dict(self):
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = {name: histogram.to_dict()
+                          for name, histogram in self.histograms.items()}
+        downloads = (counters['hits'] + counters['coalesced_hits'] +
+                     counters['misses'])
+        hit_ratio = None
+        if downloads:
+            hit_ratio = (counters['hits'] +
+                         counters['coalesced_hits']) / downloads
+        return {'counters': counters, 'hit_ratio': hit_ratio,
+                'histograms': histograms}
+
+
+METRICS = CacheMetrics()
@@ -17,6 +17,9 @@
 Prefetches images into the Image Cache
 """
 
+import threading
+import time
+
 import glance_store
 from oslo_concurrency import lockutils
 from oslo_config import cfg
@@ -32,6 +35,36 @@ CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
 
 
+class RateLimiter(object):
+    """
+    Limits the rate at which image data is read, in bytes per second,
+    across all the threads sharing the limiter.
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._available_at = time.monotonic()
+
+    def consume(self, num_bytes):
+        """
+        Accounts for ``num_bytes`` bytes read, sleeping as long as needed to
+        stay within the rate.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._available_at = (max(self._available_at, now) +
+                                  num_bytes / self.rate)
+            delay = self._available_at - now
+        if delay > 0:
+            time.sleep(delay)
+
+    def limit(self, image_iter):
+        for chunk in image_iter:
+            self.consume(len(chunk))
+            yield chunk
+
+
 class Prefetcher(base.CacheApp):
     def __init__(self):
         # NOTE(abhishekk): Importing the glance.gateway just in time to avoid
@@ -39,8 +72,20 @@ class Prefetcher(base.CacheApp):
         import glance.gateway  # noqa
         super(Prefetcher, self).__init__()
         self.gateway = glance.gateway.Gateway()
+        self.rate_limiter = None
+        if CONF.image_cache_prefetch_rate_limit:
+            self.rate_limiter = RateLimiter(
+                CONF.image_cache_prefetch_rate_limit)
 
     def fetch_image_into_cache(self, image_id):
+        # NOTE: An image may have been cached by a download through the
+        # cache middleware since it was queued, or by a previous run of the
+        # prefetcher which was interrupted before it got to dequeue it.
+        if self.cache.is_cached(image_id):
+            LOG.debug("Image '%s' is already cached", image_id)
+            self.cache.delete_queued_image(image_id)
+            return True
+
         ctx = context.RequestContext(is_admin=True, show_deleted=True,
                                      roles=['admin'])
         try:
@@ -64,6 +109,9 @@ class Prefetcher(base.CacheApp):
                 image_data, image_size = glance_store.get_from_backend(
                     loc['url'], context=ctx)
 
+            if self.rate_limiter is not None:
+                image_data = self.rate_limiter.limit(image_data)
+
             LOG.debug("Caching image '%s'", image_id)
             cache_tee_iter = self.cache.cache_tee_iter(image_id, image_data,
                                                        image.checksum)
@@ -74,7 +122,7 @@ class Prefetcher(base.CacheApp):
 
     @lockutils.lock('glance-cache', external=True)
     def run(self):
-        images = self.cache.get_queued_images()
+        images = self.cache.get_prefetch_queue()
         if not images:
             LOG.debug("Nothing to prefetch.")
             return True
@@ -82,7 +130,12 @@ class Prefetcher(base.CacheApp):
         num_images = len(images)
         LOG.debug("Found %d images to prefetch", num_images)
 
-        pool = api_common.get_thread_pool('prefetcher', size=num_images)
+        # NOTE: The images are handed to the pool in order of priority, the
+        # pool fetches at most image_cache_prefetch_workers of them at once.
+        # Every image is dequeued as soon as it is cached, so that a run
+        # which is interrupted resumes with the images not cached yet.
+        pool = api_common.get_thread_pool(
+            'prefetcher', size=CONF.image_cache_prefetch_workers)
         results = pool.map(self.fetch_image_into_cache, images)
         successes = sum([1 for r in results if r is True])
         if successes != num_images:
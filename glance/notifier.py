@@ -27,6 +27,7 @@ from glance.common import exception
 from glance.common import timeutils
 from glance.domain import proxy as domain_proxy
 from glance.i18n import _, _LE
+from glance.image_cache import metadata as cache_metadata
 
 
 notifier_opts = [
@@ -524,6 +525,7 @@ class ImageRepoProxy(NotificationRepoProxy, domain_proxy.Repo):
 
     def save(self, image, from_state=None):
         super(ImageRepoProxy, self).save(image, from_state=from_state)
+        cache_metadata.invalidate(image.image_id)
         self.send_notification('image.update', image)
 
     def add(self, image):
@@ -532,6 +534,7 @@ class ImageRepoProxy(NotificationRepoProxy, domain_proxy.Repo):
 
     def remove(self, image):
         super(ImageRepoProxy, self).remove(image)
+        cache_metadata.invalidate(image.image_id)
         self.send_notification('image.delete', image, extra_payload={
             'deleted': True, 'deleted_at': timeutils.isotime()
         })
@@ -561,14 +564,17 @@ class ImageMemberRepoProxy(NotificationBase, domain_proxy.MemberRepo):
 
     def save(self, member, from_state=None):
         super(ImageMemberRepoProxy, self).save(member, from_state=from_state)
+        cache_metadata.invalidate(member.image_id)
         self.send_notification('image.member.update', member)
 
     def add(self, member):
         super(ImageMemberRepoProxy, self).add(member)
+        cache_metadata.invalidate(member.image_id)
         self.send_notification('image.member.create', member)
 
     def remove(self, member):
         super(ImageMemberRepoProxy, self).remove(member)
+        cache_metadata.invalidate(member.image_id)
         self.send_notification('image.member.delete', member, extra_payload={
             'deleted': True, 'deleted_at': timeutils.isotime()
         })
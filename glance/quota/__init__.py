@@ -343,6 +343,10 @@ class ImageProxy(glance.domain.proxy.Image):
         #         with the smaller size.
         #       - Now, to glance, image has not exceeded quota but, in
         #         reality, the quota has been exceeded.
+        #
+        # The usage memoized by the check above must be forgotten for the
+        # same reason.
+        glance.api.common.drop_project_usage(self.context)
 
         try:
             glance.api.common.check_quota(
@@ -18,6 +18,7 @@ from oslo_limit import limit
 from oslo_log import log as logging
 from oslo_utils import units
 
+from glance.api import common as api_common
 from glance.common import exception
 from glance.db.sqlalchemy import api as db
 from glance.i18n import _LE
@@ -100,7 +101,8 @@ def enforce_image_size_total(context, project_id, delta=0):
     """
     _enforce_one(
         context, project_id, QUOTA_IMAGE_SIZE_TOTAL,
-        lambda: db.user_get_storage_usage(context, project_id) // units.Mi,
+        lambda: api_common.get_project_usage(
+            context, db.user_get_storage_usage, project_id) // units.Mi,
         delta=delta)
 
 
@@ -112,7 +114,8 @@ def enforce_image_staging_total(context, project_id, delta=0):
     """
     _enforce_one(
         context, project_id, QUOTA_IMAGE_STAGING_TOTAL,
-        lambda: db.user_get_staging_usage(context, project_id) // units.Mi,
+        lambda: api_common.get_project_usage(
+            context, db.user_get_staging_usage, project_id) // units.Mi,
         delta=delta)
 
 
@@ -124,7 +127,8 @@ def enforce_image_count_total(context, project_id):
     """
     _enforce_one(
         context, project_id, QUOTA_IMAGE_COUNT_TOTAL,
-        lambda: db.user_get_image_count(context, project_id),
+        lambda: api_common.get_project_usage(
+            context, db.user_get_image_count, project_id),
         delta=1)
 
 
@@ -140,7 +144,8 @@ def enforce_image_count_uploading(context, project_id):
     """
     _enforce_one(
         context, project_id, QUOTA_IMAGE_COUNT_UPLOADING,
-        lambda: db.user_get_uploading_count(context, project_id),
+        lambda: api_common.get_project_usage(
+            context, db.user_get_uploading_count, project_id),
         delta=0)
 
 
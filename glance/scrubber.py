@@ -13,17 +13,20 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import calendar
 from concurrent import futures
+import datetime
+import itertools
+import random
+import threading
 import time
 
 from glance_store import exceptions as store_exceptions
 from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_utils import timeutils
 
 from glance.common import crypt
 from glance.common import exception
-from glance.common import timeutils
 from glance import context
 import glance.db as db_api
 from glance.i18n import _, _LC, _LE, _LI, _LW
@@ -70,6 +73,42 @@ Possible values:
 Related options:
     * ``delayed_delete``
 
+""")),
+    cfg.IntOpt('scrub_store_pool_size', min=1,
+               help=_("""
+The number of image locations deleted in parallel from each store.
+
+The scrubber deletes the locations of the images it scrubs through one thread
+pool per store, so that a slow store does not hold up the deletion of the
+image data from the other stores. This configuration option denotes the
+maximum number of locations deleted in parallel from a single store. The
+locations of one image in different stores are always deleted in parallel.
+When unset, the value of ``scrub_pool_size`` is used.
+
+Possible values:
+    * Any non-zero positive integer
+
+Related options:
+    * ``scrub_pool_size``
+    * ``scrub_store_rate_limit``
+
+""")),
+    cfg.FloatOpt('scrub_store_rate_limit', default=0, min=0,
+                 help=_("""
+The maximum number of image locations deleted per second from each store.
+
+When there is a large backlog of images to scrub, the scrubber can issue
+deletes at a rate that a storage backend cannot absorb alongside its regular
+traffic. This configuration option caps the rate of the deletes sent by the
+scrubber to each store. The default value of zero disables the cap.
+
+Possible values:
+    * Zero to disable the cap
+    * Any positive number of deletes per second
+
+Related options:
+    * ``scrub_store_pool_size``
+
 """)),
     cfg.BoolOpt('delayed_delete', default=False,
                 help=_("""
@@ -97,6 +136,7 @@ Related options:
     * ``scrub_time``
     * ``wakeup_time``
     * ``scrub_pool_size``
+    * ``scrub_store_pool_size``
 
 """)),
 ]
@@ -171,6 +211,7 @@ CONF = cfg.CONF
 CONF.register_opts(scrubber_opts)
 CONF.import_opt('metadata_encryption_key', 'glance.common.config')
 REASONABLE_DB_PAGE_SIZE = 1000
+DAEMON_WAKEUP_JITTER = 0.1
 
 
 class ScrubDBQueue(object):
@@ -197,69 +238,48 @@ class ScrubDBQueue(object):
         else:
             return False
 
-    def _get_images_page(self, marker):
-        filters = {'deleted': True,
-                   'status': 'pending_delete'}
+    def iter_locations(self):
+        """Generator of the image id and location tuples from scrub queue.
 
-        return db_api.get_api().image_get_all(self.admin_context,
-                                              filters=filters,
-                                              marker=marker,
-                                              limit=REASONABLE_DB_PAGE_SIZE)
+        The locations are fetched page by page with a dedicated query which
+        only selects the locations available for scrubbing, so that they can
+        be scrubbed while the queue is still being read. The locations of an
+        image are yielded consecutively.
 
-    def _get_all_images(self):
-        """Generator to fetch all appropriate images, paging as needed."""
+        :returns: a generator of image id, location id and uri tuples from
+            scrub queue
 
+        """
+        deleted_before = timeutils.utcnow() - datetime.timedelta(
+            seconds=self.scrub_time)
         marker = None
         while True:
-            images = self._get_images_page(marker)
-            if len(images) == 0:
+            locations = db_api.get_api().image_location_get_pending_delete(
+                self.admin_context, deleted_before, marker=marker,
+                limit=REASONABLE_DB_PAGE_SIZE)
+            if not locations:
                 break
-            marker = images[-1]['id']
-
-            for image in images:
-                yield image
+            marker = (locations[-1]['image_id'], locations[-1]['id'])
 
-    def get_all_locations(self):
-        """Returns a list of image id and location tuple from scrub queue.
+            for loc in locations:
+                yield self._location_to_job(loc)
 
-        :returns: a list of image id, location id and uri tuple from
-            scrub queue
+            if len(locations) < REASONABLE_DB_PAGE_SIZE:
+                break
 
-        """
-        ret = []
-
-        for image in self._get_all_images():
-            deleted_at = image.get('deleted_at')
-            if not deleted_at:
-                continue
-            # NOTE: Strip off microseconds which may occur after the last '.,'
-            # Example: 2012-07-07T19:14:34.974216
-            deleted_at = timeutils.isotime(deleted_at)
-            date_str = deleted_at.rsplit('.', 1)[0].rsplit(',', 1)[0]
-            delete_time = calendar.timegm(time.strptime(date_str,
-                                                        "%Y-%m-%dT%H:%M:%SZ"))
-
-            if delete_time + self.scrub_time > time.time():
-                continue
-
-            for loc in image['locations']:
-                if loc['status'] != 'pending_delete':
-                    continue
-
-                if self.metadata_encryption_key:
-                    uri = crypt.urlsafe_decrypt(self.metadata_encryption_key,
-                                                loc['url'])
-                else:
-                    uri = loc['url']
+    def _location_to_job(self, loc):
+        if self.metadata_encryption_key:
+            uri = crypt.urlsafe_decrypt(self.metadata_encryption_key,
+                                        loc['url'])
+        else:
+            uri = loc['url']
 
-                # if multi-store is enabled then we need to pass backend
-                # to delete the image.
-                backend = loc['metadata'].get('store')
-                if CONF.enabled_backends:
-                    ret.append((image['id'], loc['id'], uri, backend))
-                else:
-                    ret.append((image['id'], loc['id'], uri))
-        return ret
+        # if multi-store is enabled then we need to pass backend
+        # to delete the image.
+        if CONF.enabled_backends:
+            backend = loc['metadata'].get('store')
+            return (loc['image_id'], loc['id'], uri, backend)
+        return (loc['image_id'], loc['id'], uri)
 
     def has_image(self, image_id):
         """Returns whether the queue contains an image or not.
@@ -285,34 +305,126 @@ def get_scrub_queue():
     return _db_queue
 
 
+class StoreRateLimiter(object):
+    """Spaces out the deletes sent to a store to cap their rate."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.next_time = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """Block until the next delete may be sent to the store."""
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class StoreStats(object):
+    """Counts the locations scrubbed from each store during a run."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.stores = {}
+        self.lock = threading.Lock()
+
+    def add(self, store, success, elapsed):
+        with self.lock:
+            stats = self.stores.setdefault(
+                store, {'scrubbed': 0, 'failed': 0, 'seconds': 0.0})
+            stats['scrubbed' if success else 'failed'] += 1
+            stats['seconds'] += elapsed
+
+    def log(self):
+        run_time = time.monotonic() - self.started
+        with self.lock:
+            for store, stats in sorted(self.stores.items()):
+                LOG.info(_LI("Scrubbed %(scrubbed)d location(s) from store "
+                             "%(store)s in %(run_time).2f seconds "
+                             "(%(rate).2f/s, %(latency).3f seconds per "
+                             "delete), %(failed)d failed"),
+                         {'scrubbed': stats['scrubbed'],
+                          'failed': stats['failed'],
+                          'store': store,
+                          'run_time': run_time,
+                          'rate': stats['scrubbed'] / run_time
+                          if run_time else 0,
+                          'latency': stats['seconds'] /
+                          (stats['scrubbed'] + stats['failed'])})
+
+
 class Daemon(object):
+    """Runs an application periodically until it is stopped.
+
+    The application runs in a single scheduling thread, so that a run never
+    overlaps the previous one. The next run starts ``wakeup_time`` seconds,
+    plus a random jitter of up to ``DAEMON_WAKEUP_JITTER`` of it, after the
+    previous run has finished.
+    """
     def __init__(self, wakeup_time=300, threads=100):
-        LOG.info(_LI("Starting Daemon: wakeup_time=%(wakeup_time)s "
-                     "threads=%(threads)s"),
-                 {'wakeup_time': wakeup_time, 'threads': threads})
+        LOG.info(_LI("Starting Daemon: wakeup_time=%(wakeup_time)s"),
+                 {'wakeup_time': wakeup_time})
         self.wakeup_time = wakeup_time
-        # This pool is used for periodic instantiation of scrubber
-        self.executor = futures.ThreadPoolExecutor(max_workers=threads)
+        # NOTE: A single thread schedules the runs, the application uses
+        # its own pools for the actual work, so threads is ignored.
+        self.executor = futures.ThreadPoolExecutor(max_workers=1)
+        self.stopped = threading.Event()
+        self.future = None
 
     def start(self, application):
-        self._run(application)
+        self.future = self.executor.submit(self._run, application)
+
+    def stop(self):
+        """Stop scheduling runs, letting the current one finish."""
+        self.stopped.set()
 
     def wait(self):
         try:
-            while True:
-                # Keep the daemon alive; can be replaced with more
-                # sophisticated handling.
-                time.sleep(1)
+            while not self.stopped.wait(1):
+                if self.future is not None and self.future.done():
+                    break
         except KeyboardInterrupt:
             LOG.info(_LI("Daemon Shutdown on KeyboardInterrupt"))
+            self.stop()
+        LOG.info(_LI("Stopping Daemon, waiting for the current run to "
+                     "finish"))
+        self.executor.shutdown(wait=True)
+
+    def _get_delay(self):
+        return self.wakeup_time * (
+            1 + random.uniform(0, DAEMON_WAKEUP_JITTER))
 
     def _run(self, application):
-        LOG.debug("Running application")
-        future: futures.Future = self.executor.submit(application.run)
-        # Schedule next run
-        LOG.debug("Next run scheduled in %s seconds", self.wakeup_time)
-        time.sleep(self.wakeup_time)
-        future.add_done_callback(self._run(application))
+        while not self.stopped.is_set():
+            LOG.debug("Running application")
+            started = time.monotonic()
+            try:
+                backlog = application.run()
+            except Exception:
+                LOG.exception(_LE("Scrubber run failed"))
+                backlog = None
+            run_time = time.monotonic() - started
+            if backlog is None:
+                LOG.info(_LI("Run finished in %.2f seconds"), run_time)
+            else:
+                LOG.info(_LI("Run finished in %(run_time).2f seconds, "
+                             "%(backlog)d image(s) processed"),
+                         {'run_time': run_time, 'backlog': backlog})
+            if run_time > self.wakeup_time:
+                LOG.warning(_LW("Run took %(run_time).2f seconds, longer "
+                                "than the wakeup time of %(wakeup)s "
+                                "seconds"),
+                            {'run_time': run_time,
+                             'wakeup': self.wakeup_time})
+
+            delay = self._get_delay()
+            LOG.debug("Next run scheduled in %.2f seconds", delay)
+            self.stopped.wait(delay)
 
 
 class Scrubber(object):
@@ -323,10 +435,36 @@ class Scrubber(object):
         self.db_queue = get_scrub_queue()
         self.executor = futures.ThreadPoolExecutor(
             max_workers=CONF.scrub_pool_size)
+        self.store_executors = {}
+        self.store_limiters = {}
+        self.store_lock = threading.Lock()
+        self.stats = StoreStats()
+
+    def _get_store_executor(self, backend):
+        with self.store_lock:
+            if backend not in self.store_executors:
+                self.store_executors[backend] = futures.ThreadPoolExecutor(
+                    max_workers=(CONF.scrub_store_pool_size or
+                                 CONF.scrub_pool_size))
+                self.store_limiters[backend] = StoreRateLimiter(
+                    CONF.scrub_store_rate_limit)
+            return self.store_executors[backend]
 
     def _get_delete_jobs(self):
+        return dict(self._iter_delete_jobs())
+
+    def _iter_delete_jobs(self):
+        """Generator of (image id, locations) jobs read from the queue.
+
+        The jobs are yielded as soon as all the locations of an image have
+        been read from the queue, rather than once the whole queue has been
+        read.
+        """
         try:
-            records = self.db_queue.get_all_locations()
+            records = self.db_queue.iter_locations()
+            for image_id, jobs in itertools.groupby(records,
+                                                    key=lambda r: r[0]):
+                yield image_id, list(jobs)
         except Exception as err:
             # Note(dharinic): spawn_n, in Daemon mode will log the
             # exception raised. Otherwise, exit 1 will occur.
@@ -334,26 +472,26 @@ class Scrubber(object):
             LOG.critical(msg)
             raise exception.FailedToGetScrubberJobs()
 
-        delete_jobs = {}
-        if CONF.enabled_backends:
-            for image_id, loc_id, loc_uri, backend in records:
-                if image_id not in delete_jobs:
-                    delete_jobs[image_id] = []
-                delete_jobs[image_id].append((image_id, loc_id,
-                                              loc_uri, backend))
-        else:
-            for image_id, loc_id, loc_uri in records:
-                if image_id not in delete_jobs:
-                    delete_jobs[image_id] = []
-                delete_jobs[image_id].append((image_id, loc_id, loc_uri))
-
-        return delete_jobs
-
     def run(self, event=None):
-        delete_jobs = self._get_delete_jobs()
+        """Scrub the images of the queue.
 
-        if delete_jobs:
-            self.executor.map(self._scrub_image, delete_jobs.items())
+        :returns: The number of images found in the queue
+        """
+        # NOTE: Keep at most two jobs per worker in flight, so that reading
+        # the queue does not get ahead of the scrubbing.
+        max_pending = 2 * CONF.scrub_pool_size
+        pending = set()
+        backlog = 0
+        self.stats = StoreStats()
+        for job in self._iter_delete_jobs():
+            if len(pending) >= max_pending:
+                _done, pending = futures.wait(
+                    pending, return_when=futures.FIRST_COMPLETED)
+            pending.add(self.executor.submit(self._scrub_image, job))
+            backlog += 1
+        futures.wait(pending)
+        self.stats.log()
+        return backlog
 
     def _scrub_image(self, delete_jobs):
         if len(delete_jobs) == 0:
@@ -361,20 +499,19 @@ class Scrubber(object):
 
         image_id, loc_details = delete_jobs
         LOG.info(_LI("Scrubbing image %(id)s from %(count)d locations."),
-                 {'id': image_id, 'count': len(delete_jobs)})
-        success = True
+                 {'id': image_id, 'count': len(loc_details)})
+        # NOTE: The locations of the image are deleted in parallel, each
+        # through the pool of its store, so that a slow store only holds up
+        # the images which have a location in it.
+        location_futures = []
         for item in loc_details:
-            try:
-                if CONF.enabled_backends:
-                    img_id, loc_id, uri, backend = item
-                    self._delete_image_location_from_backend(
-                        img_id, loc_id, uri, backend=backend)
-                else:
-                    img_id, loc_id, uri = item
-                    self._delete_image_location_from_backend(
-                        img_id, loc_id, uri)
-            except Exception:
-                success = False
+            backend = item[3] if CONF.enabled_backends else None
+            executor = self._get_store_executor(backend)
+            location_futures.append(
+                executor.submit(self._scrub_location, item, backend))
+        futures.wait(location_futures)
+        success = all(future.exception() is None
+                      for future in location_futures)
 
         if success:
             image = db_api.get_api().image_get(self.admin_context, image_id)
@@ -387,6 +524,24 @@ class Scrubber(object):
                             "from backend. Leaving image '%s' in "
                             "'pending_delete' status"), image_id)
 
+    def _scrub_location(self, item, backend):
+        self.store_limiters[backend].wait()
+        started = time.monotonic()
+        success = False
+        try:
+            if CONF.enabled_backends:
+                img_id, loc_id, uri, backend = item
+                self._delete_image_location_from_backend(
+                    img_id, loc_id, uri, backend=backend)
+            else:
+                img_id, loc_id, uri = item
+                self._delete_image_location_from_backend(
+                    img_id, loc_id, uri)
+            success = True
+        finally:
+            self.stats.add(backend or 'default', success,
+                           time.monotonic() - started)
+
     def _delete_image_location_from_backend(self, image_id, loc_id, uri,
                                             backend=None):
         try:
@@ -334,6 +334,35 @@ class DriverTests(object):
         self.assertEqual('bar', properties['foo']['value'])
         self.assertTrue(properties['foo']['deleted'])
 
+    def test_image_update_delete_properties(self):
+        fixture = {'properties': {'ping': 'pong'}}
+        image = self.db_api.image_update(self.adm_context, UUID1,
+                                         fixture, delete_props=['foo'])
+        properties = {p['name']: p for p in image['properties']}
+
+        self.assertEqual('pong', properties['ping']['value'])
+        self.assertFalse(properties['ping']['deleted'])
+        self.assertTrue(properties['foo']['deleted'])
+        self.assertFalse(properties['far']['deleted'])
+
+    def test_image_update_with_tags(self):
+        self.db_api.image_tag_set_all(self.context, UUID1, ['ping', 'pong'])
+        self.db_api.image_update(self.adm_context, UUID1, {'name': 'foo'},
+                                 tags=['pong', 'king'])
+        tags = self.db_api.image_tag_get_all(self.context, UUID1)
+        self.assertEqual(['pong', 'king'], tags)
+
+    def test_image_update_restores_deleted_property(self):
+        self.db_api.image_update(self.adm_context, UUID1,
+                                 {'properties': {}}, purge_props=True)
+        fixture = {'properties': {'foo': 'baz'}}
+        image = self.db_api.image_update(self.adm_context, UUID1, fixture)
+        properties = {p['name']: p for p in image['properties']}
+
+        self.assertEqual('baz', properties['foo']['value'])
+        self.assertFalse(properties['foo']['deleted'])
+        self.assertTrue(properties['far']['deleted'])
+
     def test_image_update_bad_name(self):
         fixture = {'name': 'A new name with forbidden symbol \U0001f62a'}
         self.assertRaises(exception.Invalid, self.db_api.image_update,
@@ -615,6 +644,26 @@ class DriverTests(object):
         images = self.db_api.image_get_all(self.context, marker=UUID3)
         self.assertEqual(2, len(images))
 
+    def test_image_get_all_pages(self):
+        """Paging through the images returns every image once."""
+        expected = [image['id'] for image in
+                    self.db_api.image_get_all(self.context)]
+        for sort_key, sort_dir in ((None, None),
+                                   (['created_at'], ['asc']),
+                                   (['name', 'size'], ['asc', 'desc'])):
+            marker = None
+            image_ids = []
+            while True:
+                images = self.db_api.image_get_all(
+                    self.context, marker=marker, limit=1,
+                    sort_key=list(sort_key or []),
+                    sort_dir=list(sort_dir or []))
+                if not images:
+                    break
+                image_ids.extend(image['id'] for image in images)
+                marker = images[-1]['id']
+            self.assertEqual(sorted(expected), sorted(image_ids))
+
     def test_image_get_all_marker_with_size(self):
         # Use sort_key=size to test BigInteger
         images = self.db_api.image_get_all(self.context, sort_key=['size'],
@@ -2097,6 +2146,36 @@ class DBPurgeTests(test_utils.BaseTestCase):
         tasks = self.db_api.task_get_all(self.adm_context)
         self.assertEqual(len(tasks), 2)
 
+    def test_db_purge_in_batches(self):
+        report = self.db_api.purge_deleted_rows(self.adm_context, 1, -1,
+                                                batch_size=1)
+
+        images = self.db_api.image_get_all(self.adm_context)
+        self.assertEqual(len(images), 3)
+        tasks = self.db_api.task_get_all(self.adm_context)
+        self.assertEqual(len(tasks), 2)
+        self.assertEqual(1, dict((tbl, rows)
+                                 for tbl, rows, elapsed in report)['tasks'])
+
+    def test_db_purge_images_table_in_batches(self):
+        images = self.db_api.image_get_all(self.adm_context)
+        for image in images:
+            with db_api.session_for_write() as session:
+                session.execute(
+                    sql.delete(models.ImageLocation)
+                    .where(models.ImageLocation.image_id == image['id'])
+                )
+        self.db_api.purge_deleted_rows(self.adm_context, 1, -1,
+                                       batch_size=2)
+
+        report = self.db_api.purge_deleted_rows_from_images(
+            self.adm_context, 1, 5, batch_size=1)
+
+        self.assertEqual([('images', 1)],
+                         [(tbl, rows) for tbl, rows, elapsed in report])
+        images = self.db_api.image_get_all(self.adm_context)
+        self.assertEqual(len(images), 2)
+
     def test_purge_images_table_fk_constraint_failure(self):
         """Test foreign key constraint failure
 
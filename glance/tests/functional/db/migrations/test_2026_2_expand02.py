@@ -0,0 +1,55 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from oslo_db.sqlalchemy import test_fixtures
+from oslo_db.sqlalchemy import utils as db_utils
+
+from glance.tests.functional.db import test_migrations
+import glance.tests.utils as test_utils
+
+INDEXES = (
+    ('image_properties', 'ix_image_properties_name_value'),
+    ('image_tags', 'ix_image_tags_value_image_id'),
+)
+
+
+class Test2026_2Expand02Mixin(test_migrations.AlembicMigrationsMixin):
+
+    def _get_revisions(self, config):
+        return test_migrations.AlembicMigrationsMixin._get_revisions(
+            self, config, head='2026_2_expand02')
+
+    def _pre_upgrade_2026_2_expand02(self, engine):
+        for table, index in INDEXES:
+            self.assertFalse(db_utils.index_exists(engine, table, index))
+
+    def _check_2026_2_expand02(self, engine, data):
+        for table, index in INDEXES:
+            self.assertTrue(db_utils.index_exists(engine, table, index),
+                            'Index %s on table %s does not exist' %
+                            (index, table))
+
+
+class Test2026_2Expand02MySQL(
+    Test2026_2Expand02Mixin,
+    test_fixtures.OpportunisticDBTestMixin,
+    test_utils.BaseTestCase,
+):
+    FIXTURE = test_fixtures.MySQLOpportunisticFixture
+
+
+class Test2026_2Expand02Sqlite(
+    Test2026_2Expand02Mixin,
+    test_fixtures.OpportunisticDBTestMixin,
+    test_utils.BaseTestCase,
+):
+    pass
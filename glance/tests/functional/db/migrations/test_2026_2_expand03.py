@@ -0,0 +1,56 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from oslo_db.sqlalchemy import test_fixtures
+from oslo_db.sqlalchemy import utils as db_utils
+import sqlalchemy
+
+from glance.tests.functional.db import test_migrations
+import glance.tests.utils as test_utils
+
+
+class Test2026_2Expand03Mixin(test_migrations.AlembicMigrationsMixin):
+
+    def _get_revisions(self, config):
+        return test_migrations.AlembicMigrationsMixin._get_revisions(
+            self, config, head='2026_2_expand03')
+
+    def _pre_upgrade_2026_2_expand03(self, engine):
+        self.assertRaises(sqlalchemy.exc.NoSuchTableError,
+                          db_utils.get_table, engine, 'project_usages')
+
+    def _check_2026_2_expand03(self, engine, data):
+        # check that after migration, the 'project_usages' table is created
+        # with expected columns
+        project_usages = db_utils.get_table(engine, 'project_usages')
+        self.assertIn('project_id', project_usages.c)
+        self.assertIn('storage', project_usages.c)
+        self.assertIn('staging', project_usages.c)
+        self.assertIn('image_count', project_usages.c)
+        self.assertIn('uploading_count', project_usages.c)
+        self.assertIn('updated_at', project_usages.c)
+
+
+class Test2026_2Expand03MySQL(
+    Test2026_2Expand03Mixin,
+    test_fixtures.OpportunisticDBTestMixin,
+    test_utils.BaseTestCase,
+):
+    FIXTURE = test_fixtures.MySQLOpportunisticFixture
+
+
+class Test2026_2Expand03Sqlite(
+    Test2026_2Expand03Mixin,
+    test_fixtures.OpportunisticDBTestMixin,
+    test_utils.BaseTestCase,
+):
+    pass
@@ -14,9 +14,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+from unittest import mock
+
 from oslo_config import cfg
 from oslo_db import options
 from oslo_utils.fixture import uuidsentinel as uuids
+from oslo_utils import timeutils
+import sqlalchemy
 
 from glance.common import exception
 from glance import context as glance_context
@@ -76,6 +81,55 @@ class TestSqlAlchemyDriver(base.TestDriver,
                           self.db_api.user_get_storage_usage,
                           self.context, 'fake_owner_id', image_id)
 
+    def _count_statements(self, func, *args, **kwargs):
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, many):
+            statements.append(statement)
+
+        engine = self.db_api.get_engine()
+        sqlalchemy.event.listen(engine, 'before_cursor_execute', count)
+        try:
+            func(*args, **kwargs)
+        finally:
+            sqlalchemy.event.remove(engine, 'before_cursor_execute', count)
+        return statements
+
+    def test_image_update_writes_properties_in_bulk(self):
+        properties = {'prop_%d' % i: 'value' for i in range(50)}
+        tags = ['tag_%d' % i for i in range(50)]
+        self.db_api.image_update(self.adm_context, base.UUID1,
+                                 {'properties': properties}, tags=tags)
+
+        # Modify and delete half of the properties and tags, add as many
+        properties = {'prop_%d' % i: 'new value' for i in range(25, 75)}
+        tags = ['tag_%d' % i for i in range(25, 75)]
+        statements = self._count_statements(
+            self.db_api.image_update, self.adm_context, base.UUID1,
+            {'properties': properties}, purge_props=True, tags=tags)
+
+        # NOTE: One INSERT, UPDATE and soft delete of properties, and one
+        # INSERT and soft delete of tags, whatever the number of rows.
+        writes = [statement for statement in statements
+                  if statement.startswith(('INSERT INTO image_',
+                                           'UPDATE image_'))]
+        self.assertEqual(5, len(writes))
+
+        image = self.db_api.image_get(self.adm_context, base.UUID1)
+        actual = {p['name']: p['value'] for p in image['properties']
+                  if not p['deleted']}
+        self.assertEqual(properties, actual)
+        self.assertEqual(
+            sorted(tags),
+            sorted(self.db_api.image_tag_get_all(self.context, base.UUID1)))
+
+
+class TestSqlAlchemyDriverSemijoinPlan(TestSqlAlchemyDriver):
+
+    def setUp(self):
+        super(TestSqlAlchemyDriverSemijoinPlan, self).setUp()
+        self.config(image_list_filter_plan='semijoin')
+
 
 class TestSqlAlchemyVisibility(base.TestVisibility,
                                base.VisibilityTests):
@@ -95,6 +149,21 @@ class TestSqlAlchemyMembershipVisibility(base.TestMembershipVisibility,
         self.addCleanup(db_tests.reset)
 
 
+class TestSqlAlchemyVisibilityExistsPlan(TestSqlAlchemyVisibility):
+
+    def setUp(self):
+        super(TestSqlAlchemyVisibilityExistsPlan, self).setUp()
+        self.config(image_list_visibility_plan='exists')
+
+
+class TestSqlAlchemyMembershipVisibilityExistsPlan(
+        TestSqlAlchemyMembershipVisibility):
+
+    def setUp(self):
+        super(TestSqlAlchemyMembershipVisibilityExistsPlan, self).setUp()
+        self.config(image_list_visibility_plan='exists')
+
+
 class TestSqlAlchemyDBDataIntegrity(base.TestDriver):
     """Test class for checking the data integrity in the database.
 
@@ -132,6 +201,31 @@ class TestSqlAlchemyDBDataIntegrity(base.TestDriver):
                          fake_paginate_query)
         self.db_api.image_get_all(self.context, sort_key=['name'])
 
+    def test_can_use_keyset(self):
+        can_use_keyset = self.db_api._can_use_keyset
+        self.assertTrue(can_use_keyset(db_models.Image, ['created_at', 'id'],
+                                       ['desc', 'desc']))
+        self.assertTrue(can_use_keyset(db_models.Image, ['status', 'id'],
+                                       ['asc', 'asc']))
+        # Mixed sort directions
+        self.assertFalse(can_use_keyset(db_models.Image,
+                                        ['created_at', 'id'],
+                                        ['asc', 'desc']))
+        # The name may be NULL
+        self.assertFalse(can_use_keyset(db_models.Image,
+                                        ['name', 'created_at', 'id'],
+                                        ['asc', 'asc', 'asc']))
+
+    def test_image_get_all_keyset_marker(self):
+        with mock.patch.object(self.db_api, '_can_use_keyset',
+                               return_value=True) as mock_can_use_keyset:
+            images = self.db_api.image_get_all(self.context,
+                                               marker=base.UUID3)
+        mock_can_use_keyset.assert_called_once_with(
+            db_models.Image, ['created_at', 'id'], ['desc', 'desc'])
+        self.assertEqual([base.UUID2, base.UUID1],
+                         [image['id'] for image in images])
+
 
 class TestSqlAlchemyTask(base.TaskTests):
 
@@ -262,6 +356,33 @@ class TestImageCacheOperations(base.TestDriver):
         # Verify we get last cached image in response
         self.assertEqual(self.images[0]['id'], recently_accessed)
 
+    def test_get_images_to_prune(self):
+        # Verify we only get the least recently accessed image when it
+        # frees enough space
+        entries = self.db_api.get_images_to_prune(
+            self.adm_context, 'node_url_1', 100)
+        self.assertEqual([(self.images[0]['id'], 100)], entries)
+
+        # Verify we get both images in order of access
+        entries = self.db_api.get_images_to_prune(
+            self.adm_context, 'node_url_1', 101)
+        self.assertEqual([(self.images[0]['id'], 100),
+                          (self.images[1]['id'], 100)], entries)
+
+        # Verify nothing is returned for a node without cached images
+        self.assertEqual([], self.db_api.get_images_to_prune(
+            self.adm_context, 'node_url_2', 100))
+
+    def test_delete_cached_images(self):
+        self.db_api.delete_cached_images(
+            self.adm_context, [image['id'] for image in self.images],
+            'node_url_1')
+
+        # Verify that images are deleted
+        cached_images = self.db_api.get_cached_images(
+            self.adm_context, 'node_url_1')
+        self.assertEqual(0, len(cached_images))
+
     def test_is_image_cached_for_node(self):
         # Verify image is cached for node_url_1
         self.assertTrue(self.db_api.is_image_cached_for_node(
@@ -543,3 +664,189 @@ class TestImageStorageUsage(base.TestDriver):
             # Each user has two staged images, one image being copied,
             # and two importing.
             self.assertEqual(5, count)
+
+
+class TestImageStorageUsageCounters(TestImageStorageUsage):
+    def setUp(self):
+        super(TestImageStorageUsageCounters, self).setUp()
+        self.config(use_project_usage_counters=True)
+
+    def _get_usages(self, ctxt):
+        return (self.db_api.user_get_storage_usage(ctxt, ctxt.owner),
+                self.db_api.user_get_staging_usage(ctxt, ctxt.owner),
+                self.db_api.user_get_image_count(ctxt, ctxt.owner),
+                self.db_api.user_get_uploading_count(ctxt, ctxt.owner))
+
+    def _assert_usages_counted(self, ctxt):
+        usages = self._get_usages(ctxt)
+        self.config(use_project_usage_counters=False)
+        self.assertEqual(self._get_usages(ctxt), usages)
+        self.config(use_project_usage_counters=True)
+
+    def test_counters_follow_image_writes(self):
+        ctxt = self.contexts[uuids.owner1]
+        # Read the usages once so that the counters are initialized
+        self._get_usages(ctxt)
+
+        image = self.db_api.image_create(
+            ctxt, {'status': 'queued', 'owner': ctxt.owner, 'size': 1000})
+        self._assert_usages_counted(ctxt)
+
+        self.db_api.image_update(ctxt, image['id'], {'status': 'uploading'})
+        self._assert_usages_counted(ctxt)
+
+        self.db_api.image_update(ctxt, image['id'], {'status': 'active'})
+        self.db_api.image_location_add(
+            ctxt, image['id'],
+            {'url': 'foo://bar', 'metadata': {}, 'status': 'active'})
+        self.db_api.image_location_add(
+            ctxt, image['id'],
+            {'url': 'foo://baz', 'metadata': {}, 'status': 'active'})
+        self.assertEqual(2100,
+                         self.db_api.user_get_storage_usage(ctxt, ctxt.owner))
+        self.assertEqual(100,
+                         self.db_api.user_get_storage_usage(
+                             ctxt, ctxt.owner, image_id=image['id']))
+        self._assert_usages_counted(ctxt)
+
+        self.db_api.image_set_property_atomic(
+            image['id'], 'os_glance_importing_to_stores', 'store1')
+        self._assert_usages_counted(ctxt)
+
+        self.db_api.image_delete_property_atomic(
+            image['id'], 'os_glance_importing_to_stores', 'store1')
+        self._assert_usages_counted(ctxt)
+
+        self.db_api.image_update(ctxt, image['id'], {'status': 'deleted'})
+        self.db_api.image_destroy(ctxt, image['id'])
+        self._assert_usages_counted(ctxt)
+
+        # The counters of the other project are left untouched
+        self._assert_usages_counted(self.contexts[uuids.owner2])
+
+    def test_counters_follow_owner_change(self):
+        ctxt1 = self.contexts[uuids.owner1]
+        ctxt2 = self.contexts[uuids.owner2]
+        self._get_usages(ctxt1)
+        self._get_usages(ctxt2)
+
+        image = self.db_api.image_create(
+            ctxt1, {'status': 'uploading', 'owner': ctxt1.owner,
+                    'size': 1000})
+        self.db_api.image_update(self.adm_context, image['id'],
+                                 {'owner': ctxt2.owner})
+        self.assertEqual(5, self.db_api.user_get_uploading_count(
+            ctxt1, ctxt1.owner))
+        self.assertEqual(6, self.db_api.user_get_uploading_count(
+            ctxt2, ctxt2.owner))
+        self._assert_usages_counted(ctxt1)
+        self._assert_usages_counted(ctxt2)
+
+    def test_counters_created_by_write(self):
+        ctxt = self.contexts[uuids.owner1]
+        usages = self._get_usages(ctxt)
+        with self.db_api.session_for_write() as session:
+            session.query(db_models.ProjectUsage).delete()
+
+        # The write creates the counters of the project, including itself
+        self.db_api.image_create(
+            ctxt, {'status': 'queued', 'owner': ctxt.owner, 'size': 1000})
+        with mock.patch.object(self.db_api, '_project_usage_compute',
+                               side_effect=AssertionError):
+            self.assertEqual(usages[2] + 1, self._get_usages(ctxt)[2])
+        self._assert_usages_counted(ctxt)
+
+    def test_counters_created_concurrently(self):
+        ctxt = self.contexts[uuids.owner1]
+        usages = self._get_usages(ctxt)
+
+        with self.db_api.session_for_write() as session:
+            # Another transaction created the counters first
+            self.assertIsNone(
+                self.db_api._project_usage_create(session, ctxt.owner))
+            # The transaction can still be used
+            session.query(db_models.ProjectUsage).filter_by(
+                project_id=ctxt.owner).update(
+                    {'image_count': db_models.ProjectUsage.image_count + 1},
+                    synchronize_session=False)
+
+        self.assertEqual(usages[2] + 1, self._get_usages(ctxt)[2])
+
+    def test_reconcile(self):
+        ctxt = self.contexts[uuids.owner1]
+        self._get_usages(ctxt)
+
+        # Writes are not counted while the counters are disabled
+        self.config(use_project_usage_counters=False)
+        self.db_api.image_create(
+            ctxt, {'status': 'queued', 'owner': ctxt.owner, 'size': 1000})
+        self.config(use_project_usage_counters=True)
+        self.assertEqual(8, self.db_api.user_get_image_count(
+            ctxt, ctxt.owner))
+
+        self.assertEqual(2, self.db_api.project_usage_reconcile(
+            self.adm_context))
+        self.assertEqual(9, self.db_api.user_get_image_count(
+            ctxt, ctxt.owner))
+        self._assert_usages_counted(ctxt)
+
+
+class TestImageLocationPendingDelete(base.TestDriver):
+    def setUp(self):
+        db_tests.load(get_db, reset_db)
+        super(TestImageLocationPendingDelete, self).setUp()
+        self.addCleanup(db_tests.reset)
+
+    def _create_pending_delete_image(self, location_count):
+        locations = [{'url': 'foo://bar/%i' % num,
+                      'metadata': {'store': 'fast'},
+                      'status': 'active'}
+                     for num in range(location_count)]
+        image = self.db_api.image_create(
+            self.adm_context, {'status': 'active', 'locations': locations})
+        for loc in image['locations']:
+            self.db_api.image_location_delete(
+                self.adm_context, image['id'], loc['id'], 'pending_delete')
+        self.db_api.image_update(self.adm_context, image['id'],
+                                 {'status': 'pending_delete'})
+        self.db_api.image_destroy(self.adm_context, image['id'])
+        return image
+
+    def test_image_location_get_pending_delete(self):
+        image = self._create_pending_delete_image(2)
+        self._create_pending_delete_image(3)
+        # Locations of images which are not pending delete are ignored
+        self.db_api.image_create(
+            self.adm_context,
+            {'status': 'active',
+             'locations': [{'url': 'foo://baz', 'metadata': {},
+                            'status': 'active'}]})
+        deleted_before = timeutils.utcnow() + datetime.timedelta(seconds=1)
+
+        locations = self.db_api.image_location_get_pending_delete(
+            self.adm_context, deleted_before)
+        self.assertEqual(5, len(locations))
+        self.assertEqual(sorted((loc['image_id'], loc['id'])
+                                for loc in locations),
+                         [(loc['image_id'], loc['id'])
+                          for loc in locations])
+        self.assertEqual({'store': 'fast'}, locations[0]['metadata'])
+        self.assertIn({'image_id': image['id'],
+                       'id': image['locations'][0]['id'],
+                       'url': 'foo://bar/0',
+                       'metadata': {'store': 'fast'}}, locations)
+
+        # Paging resumes after the marker
+        page = self.db_api.image_location_get_pending_delete(
+            self.adm_context, deleted_before, limit=2)
+        self.assertEqual(locations[:2], page)
+        page = self.db_api.image_location_get_pending_delete(
+            self.adm_context, deleted_before,
+            marker=(page[-1]['image_id'], page[-1]['id']), limit=4)
+        self.assertEqual(locations[2:], page)
+
+    def test_image_location_get_pending_delete_scrub_time(self):
+        self._create_pending_delete_image(2)
+        deleted_before = timeutils.utcnow() - datetime.timedelta(hours=1)
+        self.assertEqual([], self.db_api.image_location_get_pending_delete(
+            self.adm_context, deleted_before))
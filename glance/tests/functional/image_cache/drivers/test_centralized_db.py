@@ -480,6 +480,35 @@ class TestCentralizedDb(functional.SynchronousAPIBase):
         self.assertEqual(images['public'], image_id)
         self.assertEqual(len(DATA), size)
 
+    def test_get_images_to_prune(self):
+        self.start_server(enable_cache=True)
+        images = self.load_data()
+        self.driver = centralized_db.Driver()
+        self.driver.configure()
+
+        # Verify nothing is returned when no image is cached yet
+        self.assertEqual([], self.driver.get_images_to_prune(len(DATA)))
+
+        # Now cache the images
+        for visibility in ('public', 'private'):
+            path = '/v2/cache/%s' % images[visibility]
+            self.api_put(path)
+            self.wait_for_caching(images[visibility])
+
+        # Verify that only the 1st image is needed to free len(DATA) bytes
+        self.assertEqual([(images['public'], len(DATA))],
+                         self.driver.get_images_to_prune(len(DATA)))
+        self.assertEqual([(images['public'], len(DATA)),
+                          (images['private'], len(DATA))],
+                         self.driver.get_images_to_prune(len(DATA) + 1))
+
+        # Delete both images in one go
+        self.driver.delete_cached_images([images['public'],
+                                          images['private']])
+        self.assertFalse(self.driver.is_cached(images['public']))
+        self.assertFalse(self.driver.is_cached(images['private']))
+        self.assertEqual(0, len(self.driver.get_cached_images()))
+
     def test_open_for_write_good(self):
         """
         Test to see if open_for_write works in normal case
@@ -145,7 +145,7 @@ class BaseCacheMiddlewareTest(object):
     def test_partial_download_of_cached_images_v2_api(self):
         """
         Verify that partial download requests for a fully cached image
-        succeeds; we do not serve it from cache.
+        succeed and are served from cache.
         """
         self.start_server()
         # Add an image and verify success
@@ -185,12 +185,12 @@ class BaseCacheMiddlewareTest(object):
         # Verify that the image is now in cache
         self.assertTrue(os.path.exists(image_cached_path))
         # Modify the data in cache so we can verify the partially downloaded
-        # content was not from cache indeed.
+        # content was from cache indeed.
         with open(image_cached_path, 'w') as cache_file:
             cache_file.write('0123456789')
 
-        # Partially attempt a download of this image and verify that is not
-        # from cache
+        # Partially attempt a download of this image and verify that it is
+        # served from cache
         # range download request
         range_ = 'bytes=3-5'
         headers = self._headers({'Range': range_,
@@ -198,9 +198,8 @@ class BaseCacheMiddlewareTest(object):
         response = self.api_get('/v2/images/%s/file' % image_id,
                                 headers=headers)
         self.assertEqual(http_client.PARTIAL_CONTENT, response.status_code)
-        self.assertEqual(b'DEF', response.text.encode('utf-8'))
-        self.assertNotEqual(b'345', response.text.encode('utf-8'))
-        self.assertNotEqual(image_data, response.text.encode('utf-8'))
+        self.assertEqual(b'345', response.text.encode('utf-8'))
+        self.assertEqual('bytes 3-5/26', response.headers['Content-Range'])
 
         # content-range download request
         # NOTE(dharinic): Glance incorrectly supports Content-Range for partial
@@ -212,9 +211,8 @@ class BaseCacheMiddlewareTest(object):
         response = self.api_get('/v2/images/%s/file' % image_id,
                                 headers=headers)
         self.assertEqual(http_client.PARTIAL_CONTENT, response.status_code)
-        self.assertEqual(b'DEF', response.text.encode('utf-8'))
-        self.assertNotEqual(b'345', response.text.encode('utf-8'))
-        self.assertNotEqual(image_data, response.text.encode('utf-8'))
+        self.assertEqual(b'345', response.text.encode('utf-8'))
+        self.assertEqual('bytes 3-5/26', response.headers['Content-Range'])
 
     @skip_if_disabled
     def test_cache_middleware_trans_v2_without_download_image_policy(self):
@@ -197,3 +197,50 @@ class TestThreadPool(testtools.TestCase):
             glance.api.common.get_thread_pool('test-pool')
             mock_log.debug.assert_called_once_with(
                 'Initializing named threadpool %r', 'test-pool')
+
+
+class TestProjectUsage(testtools.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.context = mock.MagicMock(project_usage={})
+        # NOTE: A MagicMock would record the __hash__ calls made when used
+        # in the keys of the memoized usages.
+        self.usage_fn = mock.Mock(return_value=100)
+
+    def test_get_project_usage_memoized(self):
+        get_project_usage = glance.api.common.get_project_usage
+
+        self.assertEqual(100, get_project_usage(self.context, self.usage_fn,
+                                                'project1'))
+        self.assertEqual(100, get_project_usage(self.context, self.usage_fn,
+                                                'project1'))
+        get_project_usage(self.context, self.usage_fn, 'project1',
+                          image_id='image1')
+        get_project_usage(self.context, self.usage_fn, 'project2')
+
+        # The usage is computed once per project and arguments
+        self.assertEqual([
+            mock.call(self.context, 'project1'),
+            mock.call(self.context, 'project1', image_id='image1'),
+            mock.call(self.context, 'project2')],
+            self.usage_fn.call_args_list)
+
+    def test_drop_project_usage(self):
+        get_project_usage = glance.api.common.get_project_usage
+
+        get_project_usage(self.context, self.usage_fn, 'project1')
+        glance.api.common.drop_project_usage(self.context)
+        get_project_usage(self.context, self.usage_fn, 'project1')
+
+        self.assertEqual(2, self.usage_fn.call_count)
+
+    def test_get_project_usage_without_memo(self):
+        context = mock.MagicMock(spec=[])
+
+        glance.api.common.get_project_usage(context, self.usage_fn,
+                                            'project1')
+        glance.api.common.get_project_usage(context, self.usage_fn,
+                                            'project1')
+        glance.api.common.drop_project_usage(context)
+
+        self.assertEqual(2, self.usage_fn.call_count)
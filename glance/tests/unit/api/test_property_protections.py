@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from unittest import mock
+
 from glance.api import policy
 from glance.api import property_protections
 from glance.common import exception
@@ -95,6 +97,26 @@ class TestProtectedImageRepoProxy(utils.BaseTestCase):
         self.assertEqual('r', result_extra_props['spl_read_prop'])
         self.assertNotIn('forbidden', result_extra_props.keys())
 
+    def test_readonly_list_image(self):
+        image_repo = property_protections.ReadOnlyProtectedImageRepoProxy(
+            self.ImageRepoStub(self.fixtures), self.context,
+            self.property_rules)
+        with mock.patch.object(self.property_rules, 'check_property_rules',
+                               wraps=self.property_rules.check_property_rules
+                               ) as mock_check:
+            result_images = image_repo.list()
+        self.assertEqual(3, len(result_images))
+        self.assertEqual({'spl_create_prop': 'c',
+                          'spl_read_prop': 'r',
+                          'spl_update_prop': 'u',
+                          'spl_delete_prop': 'd'},
+                         dict(result_images[0].extra_properties))
+        self.assertEqual({}, dict(result_images[1].extra_properties))
+        self.assertEqual({'spl_read_prop': 'r'},
+                         dict(result_images[2].extra_properties))
+        # NOTE: The rule of each property is only checked once per list
+        self.assertEqual(5, mock_check.call_count)
+
 
 class TestProtectedImageProxy(utils.BaseTestCase):
 
@@ -13,15 +13,20 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import http.client
+import http.server
 import os
+import threading
 from unittest import mock
 
 from glance_store import backend
 from oslo_config import cfg
+from oslo_utils import units
 from taskflow.types import failure
 
 from glance.async_.flows import api_image_import
 import glance.common.exception
+from glance.common.scripts import utils as script_utils
 from glance import domain
 import glance.tests.unit.utils as unit_test_utils
 import glance.tests.utils as test_utils
@@ -205,3 +210,106 @@ class TestBaseDownloadTask(test_utils.BaseTestCase):
         # this will verify that revert does not break because of failure
         # while deleting data in staging area
         self.base_download_task.revert(result)
+
+
+def _get_range_http_handler_class(data, accept_ranges, ranges):
+    class RangeHTTPRequestHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            byte_range = self.headers.get('Range')
+            ranges.append(byte_range)
+            if byte_range and accept_ranges:
+                start, end = byte_range[len('bytes='):].split('-')
+                start, end = int(start), int(end)
+                body = data[start:end + 1]
+                self.send_response(http.client.PARTIAL_CONTENT)
+                self.send_header('Content-Range', 'bytes %d-%d/%d' % (
+                    start, end, len(data)))
+            else:
+                body = data
+                self.send_response(http.client.OK)
+                if accept_ranges:
+                    self.send_header('Accept-Ranges', 'bytes')
+                    self.send_header('ETag', '"fake-etag"')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                # NOTE: The first response is closed unread when the data
+                # is downloaded in segments.
+                pass
+
+        def log_message(self, *args, **kwargs):
+            return
+
+    return RangeHTTPRequestHandler
+
+
+class TestSegmentedDownload(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(TestSegmentedDownload, self).setUp()
+
+        self.config(node_staging_uri='file://%s' % self.test_dir)
+        self.config(download_segments=4, download_segment_min_size=1,
+                    group='image_import_opts')
+        self.data = os.urandom(3 * units.Mi + 5)
+        self.ranges = []
+        action_wrapper = api_image_import.ImportActionWrapper(
+            mock.MagicMock(), 'fake-image-id', 'fake-task-id')
+        self.download_task = unit_test_utils.FakeBaseDownloadPlugin(
+            'fake-task-id', 'import', action_wrapper, ['foo'],
+            'FakeBaseDownload')
+
+    def _get_data(self, accept_ranges=True):
+        handler_class = _get_range_http_handler_class(
+            self.data, accept_ranges, self.ranges)
+        httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0),
+                                                handler_class)
+        thread = threading.Thread(target=httpd.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(httpd.server_close)
+        self.addCleanup(httpd.shutdown)
+
+        uri = 'http://127.0.0.1:%d/image' % httpd.socket.getsockname()[1]
+        return script_utils.get_image_data_iter(uri)
+
+    def test_download_segments(self):
+        data, size = self._get_data()
+
+        path = self.download_task._download_segments(data, size)
+
+        staging_file = os.path.join(self.test_dir, 'fake-image-id')
+        self.assertEqual('file://%s' % staging_file, path)
+        with open(staging_file, 'rb') as f:
+            self.assertEqual(self.data, f.read())
+        # NOTE: The 4 segments are capped to the 3 MiB of the image divided
+        # by the minimum size of a segment.
+        self.assertEqual(
+            [None, 'bytes=0-1048576', 'bytes=1048577-2097153',
+             'bytes=2097154-3145732'],
+            [self.ranges[0]] + sorted(self.ranges[1:],
+                                      key=lambda r: int(r[6:].split('-')[0])))
+
+    def test_download_segments_not_supported(self):
+        data, size = self._get_data(accept_ranges=False)
+
+        self.assertIsNone(self.download_task._download_segments(data, size))
+        self.assertEqual(self.data, data.read())
+        self.assertEqual([None], self.ranges)
+        self.assertIsNone(self.download_task._path)
+
+    def test_download_segments_image_too_small(self):
+        self.config(download_segment_min_size=2, group='image_import_opts')
+        data, size = self._get_data()
+
+        self.assertIsNone(self.download_task._download_segments(data, size))
+        self.assertEqual([None], self.ranges)
+
+    def test_download_segments_disabled(self):
+        self.config(download_segments=1, group='image_import_opts')
+        data, size = self._get_data()
+
+        self.assertIsNone(self.download_task._download_segments(data, size))
+        self.assertEqual([None], self.ranges)
@@ -160,6 +160,120 @@ class TestCalculateHashTask(test_utils.BaseTestCase):
         hash_calculation.revert(None)
         self.assertIsNone(self.image.os_hash_algo)
 
+    @mock.patch.object(task_tracker, 'signal_finished')
+    @mock.patch.object(task_tracker, 'register_operation')
+    def test_hash_calculation_resumes_at_offset(self, mock_register_operation,
+                                                mock_signal_finished):
+        hashing_algo = CONF.hashing_algorithm
+        data = b'a' * units.Ki + b'b' * units.Ki
+        self.image.size = len(data)
+        self.image.checksum = None
+        self.image.os_hash_value = None
+
+        def broken_data(offset=0):
+            yield data[:units.Ki]
+            raise IOError
+
+        self.image.get_data.side_effect = [
+            broken_data(), iter([data[units.Ki:]])]
+        hash_calculation = import_flow._CalculateHash(TASK_ID1, TASK_TYPE,
+                                                      self.image_repo,
+                                                      IMAGE_ID1,
+                                                      hashing_algo)
+        hash_calculation.execute()
+
+        self.image.get_data.assert_has_calls([mock.call(offset=0),
+                                              mock.call(offset=units.Ki)])
+        self.assertEqual(hashlib.md5(data).hexdigest(), self.image.checksum)
+        self.assertEqual(hashlib.new(hashing_algo, data).hexdigest(),
+                         self.image.os_hash_value)
+
+    @mock.patch.object(task_tracker, 'signal_finished')
+    @mock.patch.object(task_tracker, 'register_operation')
+    def test_hash_calculation_restarts_if_offset_ignored(
+            self, mock_register_operation, mock_signal_finished):
+        hashing_algo = CONF.hashing_algorithm
+        data = b'a' * units.Ki + b'b' * units.Ki
+        self.image.size = len(data)
+        self.image.checksum = None
+        self.image.os_hash_value = None
+
+        def broken_data(offset=0):
+            yield data[:units.Ki]
+            raise IOError
+
+        # The store returns the whole data again instead of the range
+        self.image.get_data.side_effect = [
+            broken_data(), iter([data]), iter([data])]
+        # NOTE: The hash is calculated again in the attempt that resumed
+        self.config(http_retries='2')
+        hash_calculation = import_flow._CalculateHash(TASK_ID1, TASK_TYPE,
+                                                      self.image_repo,
+                                                      IMAGE_ID1,
+                                                      hashing_algo)
+        hash_calculation.execute()
+
+        self.image.get_data.assert_has_calls([mock.call(offset=0),
+                                              mock.call(offset=units.Ki),
+                                              mock.call(offset=0)])
+        self.assertEqual(hashlib.md5(data).hexdigest(), self.image.checksum)
+        self.assertEqual(hashlib.new(hashing_algo, data).hexdigest(),
+                         self.image.os_hash_value)
+
+    @mock.patch.object(task_tracker, 'signal_finished')
+    @mock.patch.object(task_tracker, 'register_operation')
+    def test_hash_calculation_does_not_resume_without_size(
+            self, mock_register_operation, mock_signal_finished):
+        hashing_algo = CONF.hashing_algorithm
+        data = b'a' * units.Ki + b'b' * units.Ki
+        self.image.size = 0
+        self.image.checksum = None
+        self.image.os_hash_value = None
+
+        def broken_data(offset=0):
+            yield data[:units.Ki]
+            raise IOError
+
+        # The store ignores the offset and returns the whole data
+        self.image.get_data.side_effect = [broken_data(), iter([data])]
+        hash_calculation = import_flow._CalculateHash(TASK_ID1, TASK_TYPE,
+                                                      self.image_repo,
+                                                      IMAGE_ID1,
+                                                      hashing_algo)
+        hash_calculation.execute()
+
+        self.image.get_data.assert_has_calls([mock.call(offset=0),
+                                              mock.call(offset=0)])
+        self.assertEqual(2, self.image.get_data.call_count)
+        self.assertEqual(hashlib.md5(data).hexdigest(), self.image.checksum)
+        self.assertEqual(hashlib.new(hashing_algo, data).hexdigest(),
+                         self.image.os_hash_value)
+
+    @mock.patch('glance.common.scripts.utils.get_task')
+    @mock.patch.object(task_tracker, 'signal_finished')
+    @mock.patch.object(task_tracker, 'register_operation')
+    def test_hash_calculation_reports_progress(self, mock_register_operation,
+                                               mock_signal_finished,
+                                               mock_get_task):
+        hashing_algo = CONF.hashing_algorithm
+        self.image.checksum = None
+        self.image.os_hash_value = None
+        self.image.get_data.return_value = iter([b'*' * units.Mi] * 2)
+        mock_get_task.return_value = self.task
+        hash_calculation = import_flow._CalculateHash(TASK_ID1, TASK_TYPE,
+                                                      self.image_repo,
+                                                      IMAGE_ID1,
+                                                      hashing_algo,
+                                                      task_repo=self.task_repo)
+        with mock.patch.object(import_flow.timeutils, 'now') as mock_now:
+            mock_now.side_effect = [100, 100, 200, 200]
+            hash_calculation.execute()
+
+        mock_get_task.assert_has_calls(
+            [mock.call(self.task_repo, TASK_ID1)] * 2)
+        self.assertEqual('Hashed 2 MiB', self.task.message)
+        self.assertEqual(2, self.task_repo.save.call_count)
+
     @mock.patch.object(task_tracker, 'signal_finished')
     @mock.patch.object(task_tracker, 'register_operation')
     def test_execute_hash_calculation_fails_without_validation_data(
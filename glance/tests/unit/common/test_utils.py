@@ -14,6 +14,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import hashlib
 import io
 import ipaddress
 import socket
@@ -464,6 +465,49 @@ class TestUtils(test_utils.BaseTestCase):
 
         self.assertRaises(exception.ImageSizeLimitExceeded, _consume_all_read)
 
+    def test_multi_hasher(self):
+        """Ensure all the digests are computed in a single pass"""
+        data = [b'a' * 10, b'b' * utils.HASH_OFFLOAD_MIN_SIZE, b'c']
+        hasher = utils.MultiHasher(('md5', 'sha512', 'sha256'))
+        for chunk in data:
+            hasher.update(chunk)
+
+        expected = b''.join(data)
+        self.assertEqual(len(expected), hasher.bytes_read)
+        self.assertEqual(
+            {'md5': hashlib.md5(expected,
+                                usedforsecurity=False).hexdigest(),
+             'sha512': hashlib.sha512(expected).hexdigest(),
+             'sha256': hashlib.sha256(expected).hexdigest()},
+            hasher.hexdigests())
+        self.assertEqual(hashlib.sha512(expected).hexdigest(),
+                         hasher.hexdigest('sha512'))
+
+    def test_multi_hasher_same_algorithm(self):
+        hasher = utils.MultiHasher(('md5', 'md5'))
+        hasher.update(b'*' * 1024)
+        self.assertEqual(['md5'], list(hasher.hexdigests()))
+
+    def test_hashing_reader(self):
+        """Ensure hashing reader hashes the data passing through"""
+        BYTES = 1024
+        hasher = utils.MultiHasher(('md5', 'sha256'))
+        bytes_read = sum(len(chunk) for chunk in utils.HashingReader(
+            io.BytesIO(b'*' * BYTES), hasher))
+
+        self.assertEqual(BYTES, bytes_read)
+        self.assertEqual(hashlib.sha256(b'*' * BYTES).hexdigest(),
+                         hasher.hexdigest('sha256'))
+
+        hasher = utils.MultiHasher(('sha256',))
+        reader = utils.HashingReader(io.BytesIO(b'*' * BYTES), hasher)
+        while reader.read(100):
+            pass
+
+        self.assertEqual(BYTES, hasher.bytes_read)
+        self.assertEqual(hashlib.sha256(b'*' * BYTES).hexdigest(),
+                         hasher.hexdigest('sha256'))
+
     def test_get_meta_from_headers(self):
         resp = webob.Response()
         resp.headers = {"x-image-meta-name": 'test',
@@ -449,6 +449,52 @@ class JSONResponseSerializerTest(test_utils.BaseTestCase):
         self.assertEqual('application/json', response.content_type)
         self.assertEqual(b'{"key": "value"}', response.body)
 
+    def _test_stream_collection(self, items, body=None):
+        response = webob.Response()
+        wsgi.JSONResponseSerializer().stream_collection(
+            response, 'items', items, body)
+        self.assertEqual('application/json', response.content_type)
+        expected = {'items': items}
+        expected.update(body or {})
+        self.assertEqual(expected, jsonutils.loads(response.body))
+
+    def test_stream_collection(self):
+        self._test_stream_collection(
+            [{'id': 1, 'name': 'café'}, {'id': 2, 'name': None}],
+            {'first': '/v2/items', 'next': '/v2/items?marker=2'})
+
+    def test_stream_collection_empty(self):
+        self._test_stream_collection([])
+
+    def test_stream_collection_without_orjson(self):
+        with mock.patch.object(wsgi, 'orjson', None):
+            self._test_stream_collection(
+                [{'id': 1, 'name': 'café'}], {'first': '/v2/items'})
+
+    def test_stream_collection_unsupported_by_orjson(self):
+        self._test_stream_collection([{'size': 2 ** 70}])
+
+    def test_stream_collection_sanitized(self):
+        response = webob.Response()
+        items = [{'date': datetime.datetime(1901, 3, 8, 2),
+                  'tags': set(['foo'])}]
+        wsgi.JSONResponseSerializer().stream_collection(
+            response, 'items', items)
+        self.assertEqual({'items': [{'date': '1901-03-08T02:00:00.000000',
+                                     'tags': ['foo']}]},
+                         jsonutils.loads(response.body))
+
+    @mock.patch.object(wsgi, 'STREAM_CHUNK_SIZE', 32)
+    def test_stream_collection_chunks(self):
+        items = [{'id': i, 'name': 'item-%d' % i} for i in range(10)]
+        response = webob.Response()
+        wsgi.JSONResponseSerializer().stream_collection(
+            response, 'items', items, {'first': '/v2/items'})
+        chunks = list(response.app_iter)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual({'items': items, 'first': '/v2/items'},
+                         jsonutils.loads(b''.join(chunks)))
+
 
 class JSONRequestDeserializerTest(test_utils.BaseTestCase):
 
@@ -14,6 +14,8 @@
 #    under the License.
 
 import http.client as http
+import io
+from unittest import mock
 from unittest.mock import patch
 
 from oslo_log.fixture import logging_error as log_fixture
@@ -26,6 +28,8 @@ import glance.api.middleware.cache
 import glance.api.policy
 from glance.common import exception
 from glance import context
+from glance.image_cache import metadata as cache_metadata
+from glance.image_cache import metrics as cache_metrics
 from glance.tests.unit import base
 from glance.tests.unit import fixtures as glance_fixtures
 from glance.tests.unit import test_policy
@@ -128,6 +132,7 @@ class ChecksumTestCacheFilter(glance.api.middleware.cache.CacheFilter):
                 self.image_checksum = image_checksum
 
         self.cache = DummyCache()
+        self.metrics = cache_metrics.CacheMetrics()
         self.policy = unit_test_utils.FakePolicyEnforcer()
 
 
@@ -183,6 +188,7 @@ class ProcessRequestTestCacheFilter(glance.api.middleware.cache.CacheFilter):
                 pass
 
         self.cache = DummyCache()
+        self.metrics = cache_metrics.CacheMetrics()
         self.policy = unit_test_utils.FakePolicyEnforcer()
 
 
@@ -303,6 +309,280 @@ class TestCacheMiddlewareProcessRequest(base.IsolatedUnitTest):
             request, image_id, dummy_img_iterator(), image_meta)
         self.assertNotIn('Content-MD5', response.headers.keys())
 
+    def test_v2_process_request_range_response_headers(self):
+        def dummy_img_iterator():
+            yield b'DEF'
+
+        image_id = 'test1'
+        request = webob.Request.blank('/v2/images/test1/file')
+        request.context = context.RequestContext()
+        image = ImageStub(image_id, request.context.project_id)
+        image.checksum = 'c1234'
+        image.size = 26
+        request.environ['api.cache.image'] = image
+        request.environ['api.cache.range'] = (3, 3, 5)
+
+        image_meta = {
+            'id': image_id,
+            'name': 'fake_image',
+            'status': 'active',
+            'size': 26,
+        }
+
+        cache_filter = ProcessRequestTestCacheFilter()
+        response = cache_filter._process_v2_request(
+            request, image_id, dummy_img_iterator(), image_meta)
+        self.assertEqual(http.PARTIAL_CONTENT, response.status_int)
+        self.assertEqual('bytes 3-5/26', response.headers['Content-Range'])
+        self.assertEqual('3', response.headers['Content-Length'])
+        self.assertEqual('c1234', response.headers['Content-MD5'])
+        self.assertEqual([b'DEF'], list(response.app_iter))
+
+    def _test_get_request_range(self, headers, expected, image_size=26):
+        request = webob.Request.blank('/v2/images/test1/file',
+                                      headers=headers)
+        cache_filter = ProcessRequestTestCacheFilter()
+        with patch.object(cache_filter.cache, 'get_image_size',
+                          return_value=image_size):
+            actual = cache_filter._get_request_range(request, 'test1')
+        self.assertEqual(expected, actual)
+
+    def test_get_request_range_no_range(self):
+        self._test_get_request_range({}, None)
+
+    def test_get_request_range(self):
+        self._test_get_request_range({'Range': 'bytes=3-5'}, (3, 3, 5))
+
+    def test_get_request_range_open_ended(self):
+        self._test_get_request_range({'Range': 'bytes=20-'}, (20, 6, 25))
+
+    def test_get_request_range_suffix_length(self):
+        self._test_get_request_range({'Range': 'bytes=-2'}, (24, 2, 25))
+
+    def test_get_request_range_end_past_image_size(self):
+        self._test_get_request_range({'Range': 'bytes=20-100'}, (20, 6, 25))
+
+    def test_get_request_range_content_range(self):
+        self._test_get_request_range({'Content-Range': 'bytes 3-5/*'},
+                                     (3, 3, 5))
+
+    def test_get_request_range_unsatisfiable(self):
+        self.assertRaises(webob.exc.HTTPRequestRangeNotSatisfiable,
+                          self._test_get_request_range,
+                          {'Range': 'bytes=30-40'}, None)
+
+    def test_get_request_range_multiple_ranges(self):
+        self.assertRaises(webob.exc.HTTPBadRequest,
+                          self._test_get_request_range,
+                          {'Range': 'bytes=1-2,4-5'}, None)
+
+    def test_get_from_cache_with_range(self):
+        cache_filter = ProcessRequestTestCacheFilter()
+        cache_file = io.BytesIO(b'ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+        open_for_read = mock.MagicMock()
+        open_for_read.return_value.__enter__.return_value = cache_file
+        cache_filter.cache.open_for_read = open_for_read
+        actual = b''.join(cache_filter.get_from_cache(
+            'test1', offset=3, chunk_size=3))
+        self.assertEqual(b'DEF', actual)
+        cache_filter.cache.open_for_read.assert_called_once_with('test1')
+
+    def test_process_request_range_served_from_cache(self):
+        image_id = 'test1'
+
+        def fake_get_v2_image_metadata(*args, **kwargs):
+            image = ImageStub(image_id, request.context.project_id)
+            image.size = 26
+            request.environ['api.cache.image'] = image
+            return image, glance.api.policy.ImageTarget(image)
+
+        request = webob.Request.blank('/v2/images/test1/file',
+                                      headers={'Range': 'bytes=3-5'})
+        request.context = context.RequestContext(roles=['member'])
+        cache_filter = ProcessRequestTestCacheFilter()
+        cache_filter._get_v2_image_metadata = fake_get_v2_image_metadata
+        cache_filter.get_from_cache = mock.Mock(return_value=iter([b'DEF']))
+        with patch.object(cache_filter.cache, 'get_image_size',
+                          return_value=26):
+            response = cache_filter.process_request(request)
+
+        self.assertEqual(http.PARTIAL_CONTENT, response.status_int)
+        self.assertEqual('bytes 3-5/26', response.headers['Content-Range'])
+        cache_filter.get_from_cache.assert_called_once_with(
+            image_id, offset=3, chunk_size=3)
+
+        self.assertEqual(b'DEF', b''.join(response.app_iter))
+        result = cache_filter.metrics.to_dict()
+        self.assertEqual(1, result['counters']['hits'])
+        self.assertEqual(3, result['counters']['bytes_from_cache'])
+        self.assertEqual(
+            1, result['histograms']['hit_time_to_first_byte']['count'])
+
+    def test_process_request_miss(self):
+        request = webob.Request.blank('/v2/images/test1/file')
+        request.context = context.RequestContext()
+        cache_filter = ProcessRequestTestCacheFilter()
+        with patch.object(cache_filter.cache, 'is_cached',
+                          return_value=False):
+            self.assertIsNone(cache_filter.process_request(request))
+
+        result = cache_filter.metrics.to_dict()
+        self.assertEqual(1, result['counters']['misses'])
+        self.assertEqual(0.0, result['hit_ratio'])
+
+    def _test_v2_process_request_file_wrapper(self, image_size=26,
+                                              file_wrapper=True):
+        image_id = 'test1'
+        request = webob.Request.blank('/v2/images/test1/file')
+        request.context = context.RequestContext()
+        if file_wrapper:
+            request.environ['wsgi.file_wrapper'] = mock.Mock()
+        image = ImageStub(image_id, request.context.project_id)
+        image.size = 26
+        request.environ['api.cache.image'] = image
+        image_meta = {'id': image_id, 'owner': image.owner,
+                      'status': 'active', 'size': 26}
+
+        cache_file = io.BytesIO(b'ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+        cache_filter = ProcessRequestTestCacheFilter()
+        open_for_read = mock.MagicMock()
+        open_for_read.return_value.__enter__.return_value = cache_file
+        cache_filter.cache.open_for_read = open_for_read
+        with patch.object(cache_filter.cache, 'get_image_size',
+                          return_value=image_size):
+            response = cache_filter._process_v2_request(
+                request, image_id, iter([b'ABC']), image_meta)
+        self.assertEqual('26', response.headers['Content-Length'])
+        return request, response, open_for_read
+
+    @patch('glance.api.middleware.cache.image_send_notification')
+    def test_v2_process_request_file_wrapper(self, mock_notify):
+        self.config(image_cache_use_file_wrapper=True)
+        request, response, open_for_read = (
+            self._test_v2_process_request_file_wrapper())
+
+        file_wrapper = request.environ['wsgi.file_wrapper']
+        self.assertEqual(file_wrapper.return_value, response.app_iter)
+        reader = file_wrapper.call_args[0][0]
+        self.assertIsInstance(
+            reader, glance.api.middleware.cache.CacheFileReader)
+        self.assertEqual(b'ABC', reader.read(3))
+        mock_notify.assert_not_called()
+
+        reader.close()
+        open_for_read.return_value.__exit__.assert_called_once_with(
+            None, None, None)
+        mock_notify.assert_called_once_with(26, 26, mock.ANY, request,
+                                            mock.ANY)
+        # Closing the reader again is a noop
+        reader.close()
+        self.assertEqual(1, mock_notify.call_count)
+
+    def test_v2_process_request_file_wrapper_disabled(self):
+        request, response, open_for_read = (
+            self._test_v2_process_request_file_wrapper())
+        request.environ['wsgi.file_wrapper'].assert_not_called()
+        open_for_read.assert_not_called()
+
+    def test_v2_process_request_file_wrapper_not_provided(self):
+        self.config(image_cache_use_file_wrapper=True)
+        request, response, open_for_read = (
+            self._test_v2_process_request_file_wrapper(file_wrapper=False))
+        open_for_read.assert_not_called()
+
+    def test_v2_process_request_file_wrapper_size_mismatch(self):
+        self.config(image_cache_use_file_wrapper=True)
+        request, response, open_for_read = (
+            self._test_v2_process_request_file_wrapper(image_size=10))
+        request.environ['wsgi.file_wrapper'].assert_not_called()
+        open_for_read.assert_not_called()
+
+    def _test_process_request_coalesce(self, headers=None):
+        image_id = 'test1'
+
+        def fake_get_v2_image_metadata(*args, **kwargs):
+            image = ImageStub(image_id, request.context.project_id)
+            image.size = 26
+            request.environ['api.cache.image'] = image
+            return image, glance.api.policy.ImageTarget(image)
+
+        request = webob.Request.blank('/v2/images/test1/file',
+                                      headers=headers)
+        request.context = context.RequestContext(roles=['member'])
+        cache_filter = ProcessRequestTestCacheFilter()
+        cache_filter._get_v2_image_metadata = fake_get_v2_image_metadata
+        cache_filter.cache.is_cached = mock.Mock(return_value=False)
+        cache_filter.cache.is_being_cached = mock.Mock(return_value=True)
+        cache_filter.cache.get_coalescing_iter = mock.Mock(
+            return_value=iter([b'ABC']))
+        return cache_filter, cache_filter.process_request(request)
+
+    def test_process_request_coalesce_disabled(self):
+        cache_filter, response = self._test_process_request_coalesce()
+        self.assertIsNone(response)
+        cache_filter.cache.get_coalescing_iter.assert_not_called()
+
+    def test_process_request_coalesce(self):
+        self.config(image_cache_coalesce_misses=True)
+        cache_filter, response = self._test_process_request_coalesce()
+        self.assertEqual(http.OK, response.status_int)
+        self.assertEqual('26', response.headers['Content-Length'])
+        cache_filter.cache.get_coalescing_iter.assert_called_once_with(
+            'test1', 26, fallback=mock.ANY)
+        self.assertEqual(
+            1, cache_filter.metrics.to_dict()['counters']['coalesced_hits'])
+
+    def test_process_request_coalesce_range(self):
+        self.config(image_cache_coalesce_misses=True)
+        cache_filter, response = self._test_process_request_coalesce(
+            headers={'Range': 'bytes=3-5'})
+        self.assertIsNone(response)
+        cache_filter.cache.get_coalescing_iter.assert_not_called()
+
+    @mock.patch('glance.db.ImageRepo')
+    def test_get_v2_image_metadata_cached(self, mock_repo):
+        self.config(image_cache_metadata_ttl=60)
+        image = ImageStub('test1', uuids.owner)
+        mock_repo.return_value.get.return_value = image
+        cache_filter = ProcessRequestTestCacheFilter()
+
+        with mock.patch.object(cache_metadata, 'METADATA_CACHE',
+                               new=cache_metadata.ImageMetadataCache()):
+            for i in range(2):
+                request = webob.Request.blank('/v2/images/test1/file')
+                request.context = context.RequestContext(
+                    project_id=uuids.owner)
+                result, target = cache_filter._get_v2_image_metadata(
+                    request, 'test1')
+                self.assertEqual(image, result)
+                self.assertEqual(image, request.environ['api.cache.image'])
+            mock_repo.return_value.get.assert_called_once_with('test1')
+
+            # Deleting the image drops its cached metadata
+            cache_filter._process_DELETE_response(mock.Mock(), 'test1')
+            cache_filter._get_v2_image_metadata(request, 'test1')
+            self.assertEqual(2, mock_repo.return_value.get.call_count)
+
+    def test_get_from_backend(self):
+        request = webob.Request.blank('/v2/images/test1/file')
+        cache_filter = ProcessRequestTestCacheFilter()
+        cache_filter.application = mock.Mock(
+            wraps=webob.Response(status=206, body=b'DEF'))
+
+        app_iter = cache_filter._get_from_backend(request, 3)
+
+        self.assertEqual(b'DEF', b''.join(app_iter))
+        environ = cache_filter.application.call_args[0][0]
+        self.assertEqual('bytes=3-', environ['HTTP_RANGE'])
+
+    def test_get_from_backend_fails(self):
+        request = webob.Request.blank('/v2/images/test1/file')
+        request.environ['api.cache.image_id'] = 'test1'
+        cache_filter = ProcessRequestTestCacheFilter()
+        cache_filter.application = webob.exc.HTTPServiceUnavailable()
+        self.assertRaises(exception.GlanceException,
+                          cache_filter._get_from_backend, request, 3)
+
     def test_process_request_without_download_image_policy(self):
         """
         Test for cache middleware skip processing when request
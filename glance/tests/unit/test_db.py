@@ -317,6 +317,34 @@ class TestImageRepo(test_utils.BaseTestCase):
         # Verify we will only get one image in response
         self.assertEqual(UUID1, recently_accessed)
 
+    def test_get_images_to_prune(self):
+        cached_images = self.db.get_cached_images(self.context,
+                                                  'node_url_1')
+        size = cached_images[0]['size']
+        entries = self.db.get_images_to_prune(self.context, 'node_url_1',
+                                              size)
+        # Verify we only get the least recently accessed image
+        self.assertEqual([(UUID1, size)], entries)
+
+        entries = self.db.get_images_to_prune(self.context, 'node_url_1',
+                                              size + 1)
+        self.assertEqual(2, len(entries))
+        self.assertEqual(UUID1, entries[0][0])
+
+    def test_delete_cached_images(self):
+        cached_images = self.db.get_cached_images(self.context,
+                                                  'node_url_1')
+        self.assertEqual(2, len(cached_images))
+
+        self.db.delete_cached_images(
+            self.context, [image['image_id'] for image in cached_images],
+            'node_url_1')
+
+        # Verify that all given images from node_url_1 are deleted
+        cached_images = self.db.get_cached_images(self.context,
+                                                  'node_url_1')
+        self.assertEqual(0, len(cached_images))
+
     def test_is_image_cached_for_node(self):
         # Verify UUID1 is cached for node_url_1
         self.assertTrue(self.db.is_image_cached_for_node(
@@ -667,6 +695,59 @@ class TestImageRepo(test_utils.BaseTestCase):
         self.assertEqual(fake_uuid,
                          image.extra_properties['os_glance_import_task'])
 
+    def test_save_image_only_changes(self):
+        image = self.image_repo.get(UUID1)
+        image.name = 'foo'
+        image.extra_properties['ping'] = 'pong'
+        with mock.patch.object(self.db, 'image_update') as mock_update:
+            mock_update.return_value = {'updated_at': timeutils.utcnow()}
+            self.image_repo.save(image)
+            mock_update.assert_called_once_with(
+                self.context, UUID1,
+                {'name': 'foo', 'properties': {'ping': 'pong'}},
+                purge_props=False, from_state=None,
+                atomic_props=glance.db.IMAGE_ATOMIC_PROPS,
+                delete_props=None, tags=None)
+
+            mock_update.reset_mock()
+            del image.extra_properties['ping']
+            image.tags = ['king']
+            self.image_repo.save(image)
+            mock_update.assert_called_once_with(
+                self.context, UUID1, {'properties': {}},
+                purge_props=False, from_state=None,
+                atomic_props=glance.db.IMAGE_ATOMIC_PROPS,
+                delete_props=['ping'], tags={'king'})
+
+    def test_save_image_deleted_property(self):
+        image = self.image_repo.get(UUID1)
+        image.extra_properties['ping'] = 'pong'
+        self.image_repo.save(image)
+        del image.extra_properties['ping']
+        image.tags = ['king']
+        self.image_repo.save(image)
+
+        image = self.image_repo.get(UUID1)
+        self.assertNotIn('ping', image.extra_properties)
+        self.assertEqual({'king'}, image.tags)
+
+    def test_save_image_without_saved_state(self):
+        image = self.image_repo.get(UUID1)
+        new_image = glance.domain.Image(
+            image_id=UUID1, status=image.status,
+            created_at=image.created_at, updated_at=image.updated_at,
+            name='foo', extra_properties={'ping': 'pong'}, tags=['king'])
+        with mock.patch.object(self.db, 'image_update',
+                               wraps=self.db.image_update) as mock_update:
+            self.image_repo.save(new_image)
+            self.assertTrue(mock_update.call_args[1]['purge_props'])
+            self.assertEqual({'king'}, mock_update.call_args[1]['tags'])
+
+        image = self.image_repo.get(UUID1)
+        self.assertEqual('foo', image.name)
+        self.assertEqual({'ping': 'pong'}, dict(image.extra_properties))
+        self.assertEqual({'king'}, image.tags)
+
     def test_remove_image(self):
         image = self.image_repo.get(UUID1)
         previous_update_time = image.updated_at
@@ -146,6 +146,33 @@ class TestImage(test_utils.BaseTestCase):
         del self.image.extra_properties['foo']
         self.assertEqual({}, self.image.extra_properties)
 
+    def test_get_changes_without_saved_state(self):
+        self.assertIsNone(self.image.get_changes())
+
+    def test_get_changes(self):
+        self.image.extra_properties = {'foo': 'bar', 'ping': 'pong'}
+        self.image.mark_clean()
+        self.assertEqual({}, self.image.get_changes())
+
+        self.image.name = 'new name'
+        self.image.extra_properties['foo'] = 'baz'
+        self.image.extra_properties['king'] = 'kong'
+        del self.image.extra_properties['ping']
+        self.image.tags = ['a']
+        self.image.locations.append({'url': 'file:///tmp/foo',
+                                     'metadata': {}, 'status': 'active'})
+        changes = self.image.get_changes()
+        self.assertEqual('new name', changes['name'])
+        self.assertEqual({'foo': 'baz', 'king': 'kong'},
+                         changes['extra_properties'])
+        self.assertEqual(['ping'], changes['deleted_properties'])
+        self.assertEqual({'a'}, changes['tags'])
+        self.assertEqual(1, len(changes['locations']))
+        self.assertNotIn('status', changes)
+
+        self.image.mark_clean()
+        self.assertEqual({}, self.image.get_changes())
+
     def test_visibility_enumerated(self):
         self.image.visibility = 'public'
         self.image.visibility = 'private'
@@ -18,6 +18,7 @@ from unittest import mock
 from glance.api import property_protections
 from glance.common import property_utils
 from glance import context
+import glance.db
 from glance import gateway
 from glance import notifier
 from glance import quota
@@ -85,6 +86,17 @@ class TestGateway(test_utils.BaseTestCase):
         self.assertIsInstance(repo,
                               property_protections.ProtectedImageRepoProxy)
 
+    def test_get_readonly_repo(self):
+        repo = self.gateway.get_readonly_repo(self.context)
+        self.assertIsInstance(repo, glance.db.ImageRepo)
+
+    @mock.patch('glance.common.property_utils.PropertyRules._load_rules')
+    def test_get_readonly_repo_with_pp(self, mock_load):
+        self.config(property_protection_file='foo')
+        repo = self.gateway.get_readonly_repo(self.context)
+        self.assertIsInstance(
+            repo, property_protections.ReadOnlyProtectedImageRepoProxy)
+
     def test_get_image_factory(self):
         factory = self.gateway.get_image_factory(self.context)
         self.assertIsInstance(factory, notifier.ImageFactoryProxy)
@@ -100,3 +100,35 @@ class DBCommandsTestCase(test_utils.BaseTestCase):
         mock_context.return_value = self.context
         self.commands.purge_images_table(max_rows=-1)
         mock_db_purge.assert_called_once_with(self.context, 180, -1)
+
+    @mock.patch.object(db_api, 'purge_deleted_rows')
+    @mock.patch.object(context, 'get_admin_context')
+    def test_purge_command_in_batches(self, mock_context, mock_db_purge):
+        mock_context.return_value = self.context
+        mock_db_purge.return_value = [('images', 3, 0.5)]
+        self.commands.purge(max_rows=-1, batch_size=500, batch_sleep=0.5)
+        mock_db_purge.assert_called_once_with(self.context, 30, -1,
+                                              batch_size=500,
+                                              batch_sleep=0.5)
+
+    @mock.patch.object(db_api, 'purge_deleted_rows_from_images')
+    @mock.patch.object(context, 'get_admin_context')
+    def test_purge_images_table_in_batches(self, mock_context,
+                                           mock_db_purge):
+        mock_context.return_value = self.context
+        self.commands.purge_images_table(max_rows=-1, batch_size=500)
+        mock_db_purge.assert_called_once_with(self.context, 180, -1,
+                                              batch_size=500,
+                                              batch_sleep=0.0)
+
+    def test_purge_invalid_batch_size(self):
+        ex = self.assertRaises(SystemExit, self.commands.purge, 1, 100,
+                               batch_size=0)
+        self.assertEqual("Must supply a positive value for batch_size.",
+                         ex.code)
+
+    def test_purge_negative_batch_sleep(self):
+        ex = self.assertRaises(SystemExit, self.commands.purge, 1, 100,
+                               batch_size=10, batch_sleep=-1)
+        self.assertEqual("Must supply a non-negative value for batch_sleep.",
+                         ex.code)
@@ -34,6 +34,8 @@ from glance.common import exception
 from glance import context
 from glance import gateway as glance_gateway
 from glance import image_cache
+from glance.image_cache import metadata
+from glance.image_cache import metrics
 from glance.image_cache import prefetcher
 from glance.tests.unit import utils as unit_test_utils
 from glance.tests import utils as test_utils
@@ -78,6 +80,23 @@ class ImageCacheTestCase(object):
 
         self.assertEqual(FIXTURE_DATA, buff.getvalue())
 
+    @skip_if_disabled
+    def test_get_prefetch_queue(self):
+        """Test the prefetch queue is ordered by priority, then age."""
+        for image_id, priority in (('0', 0), ('1', 5), ('2', 0), ('3', 10)):
+            self.assertTrue(self.cache.queue_image(image_id,
+                                                   priority=priority))
+            path = self.cache.driver.get_image_filepath(image_id, 'queue')
+            os.utime(path, (int(image_id), int(image_id)))
+
+        self.assertEqual(['0', '1', '2', '3'],
+                         self.cache.get_queued_images())
+        self.assertEqual(['3', '1', '0', '2'],
+                         self.cache.get_prefetch_queue())
+        self.assertEqual(10, self.cache.driver.get_queue_priority('3'))
+        self.assertEqual(0, self.cache.driver.get_queue_priority('0'))
+        self.assertEqual(0, self.cache.driver.get_queue_priority('4'))
+
     @skip_if_disabled
     def test_open_for_read(self):
         """Test convenience wrapper for opening a cache file via
@@ -290,6 +309,64 @@ class ImageCacheTestCase(object):
         self.assertEqual(0, self.cache.get_cache_size())
         self.assertFalse(self.cache.is_cached('xxx'))
 
+    def _setup_eviction_fixture(self):
+        # Cache six 1K images with a maximum cache size of 5K. Images 0 to 4
+        # are hit twice, image 5 is hit once but accessed last, so the least
+        # recently and the least frequently used images differ.
+        for x in range(6):
+            FIXTURE_FILE = io.BytesIO(FIXTURE_DATA)
+            self.assertTrue(self.cache.cache_image_file(str(x), FIXTURE_FILE))
+
+        for x in list(range(5)) * 2 + [5]:
+            with self.cache.open_for_read(str(x)) as cache_file:
+                for chunk in cache_file:
+                    pass
+
+        self.assertEqual(6 * units.Ki, self.cache.get_cache_size())
+
+    @skip_if_disabled
+    def test_prune_lfu(self):
+        """Test the lfu eviction policy removes the least used image."""
+        self.config(image_cache_eviction_policy='lfu')
+        self._setup_eviction_fixture()
+
+        self.assertEqual((1, units.Ki), self.cache.prune())
+
+        self.assertFalse(self.cache.is_cached('5'))
+        for x in range(5):
+            self.assertTrue(self.cache.is_cached(str(x)))
+
+    @skip_if_disabled
+    def test_prune_max_age(self):
+        """Test the max_age eviction policy removes expired images."""
+        self.config(image_cache_eviction_policy='max_age',
+                    image_cache_max_age=3600)
+        FIXTURE_FILE = io.BytesIO(FIXTURE_DATA)
+        self.assertTrue(self.cache.cache_image_file('xxx', FIXTURE_FILE))
+
+        # The cache is below its maximum size and the image is not expired
+        self.assertEqual((0, 0), self.cache.prune())
+        self.assertTrue(self.cache.is_cached('xxx'))
+
+        with mock.patch('glance.image_cache.eviction.time.time',
+                        return_value=time.time() + 7200):
+            self.assertEqual((1, units.Ki), self.cache.prune())
+        self.assertFalse(self.cache.is_cached('xxx'))
+
+    @skip_if_disabled
+    def test_get_prune_report(self):
+        """Test the prune report does not remove any image."""
+        self._setup_eviction_fixture()
+
+        report = self.cache.get_prune_report()
+
+        self.assertEqual(['gdsf', 'lfu', 'lru', 'max_age'], sorted(report))
+        for policy in ('lfu', 'gdsf'):
+            self.assertEqual({'images': ['5'], 'total_files': 1,
+                              'total_bytes': units.Ki}, report[policy])
+        self.assertEqual(1, report['lru']['total_files'])
+        self.assertEqual(6 * units.Ki, self.cache.get_cache_size())
+
     @skip_if_disabled
     def test_queue(self):
         """
@@ -469,6 +546,92 @@ class ImageCacheTestCase(object):
         self.assertFalse(os.path.exists(incomplete_file_path))
         self.assertTrue(os.path.exists(invalid_file_path))
 
+    def _start_caching(self, image_id, data, checksum=None):
+        # NOTE: Chunks larger than the write buffer of the cache file are
+        # written to the incomplete file right away.
+        caching_iter = self.cache.get_caching_iter(image_id, checksum,
+                                                   iter(data))
+        self.assertEqual(data[0], next(caching_iter))
+        self.assertTrue(self.cache.is_being_cached(image_id))
+        return caching_iter
+
+    @skip_if_disabled
+    def test_coalescing_iter(self):
+        image_id = '1'
+        data = [b'a' * 16 * units.Ki, b'b' * 16 * units.Ki]
+        caching_iter = self._start_caching(image_id, data)
+        fallback = mock.Mock()
+
+        coalescing_iter = self.cache.get_coalescing_iter(
+            image_id, 32 * units.Ki, fallback=fallback)
+        self.assertEqual(data[0], next(coalescing_iter))
+
+        # The other download completes caching the image
+        self.assertEqual(data[1:], list(caching_iter))
+        self.assertTrue(self.cache.is_cached(image_id))
+
+        self.assertEqual(data[1], b''.join(coalescing_iter))
+        fallback.assert_not_called()
+
+    @skip_if_disabled
+    def test_coalescing_iter_caching_fails(self):
+        image_id = '1'
+
+        def faulty_backend():
+            yield b'a' * 16 * units.Ki
+            raise exception.GlanceException('Backend failure')
+
+        caching_iter = self.cache.get_caching_iter(image_id, None,
+                                                   faulty_backend())
+        next(caching_iter)
+        fallback = mock.Mock(return_value=iter([b'b' * 16 * units.Ki]))
+
+        coalescing_iter = self.cache.get_coalescing_iter(
+            image_id, 32 * units.Ki, fallback=fallback)
+        self.assertEqual(b'a' * 16 * units.Ki, next(coalescing_iter))
+
+        self.assertRaises(exception.GlanceException, list, caching_iter)
+        self.assertFalse(self.cache.is_cached(image_id))
+
+        self.assertEqual([b'b' * 16 * units.Ki], list(coalescing_iter))
+        fallback.assert_called_once_with(16 * units.Ki)
+
+    @skip_if_disabled
+    def test_coalescing_iter_caching_fails_without_fallback(self):
+        image_id = '1'
+        data = [b'a' * 16 * units.Ki, b'b' * 16 * units.Ki]
+        caching_iter = self._start_caching(image_id, data)
+        coalescing_iter = self.cache.get_coalescing_iter(image_id,
+                                                         32 * units.Ki)
+        self.assertEqual(data[0], next(coalescing_iter))
+
+        # The other download is interrupted
+        caching_iter.close()
+        self.assertFalse(self.cache.is_cached(image_id))
+        self.assertRaises(exception.GlanceException, list, coalescing_iter)
+
+    @skip_if_disabled
+    def test_coalescing_iter_bad_checksum(self):
+        image_id = '1'
+        data = [b'a' * 16 * units.Ki, b'b' * 16 * units.Ki]
+        caching_iter = self._start_caching(image_id, data,
+                                           checksum='foobar')
+        coalescing_iter = self.cache.get_coalescing_iter(image_id,
+                                                         32 * units.Ki)
+        self.assertEqual(data[0], next(coalescing_iter))
+
+        self.assertRaises(exception.GlanceException, list, caching_iter)
+        self.assertRaises(exception.GlanceException, list, coalescing_iter)
+
+    @skip_if_disabled
+    def test_coalescing_iter_already_cached(self):
+        self._setup_fixture_file()
+        fallback = mock.Mock()
+        coalescing_iter = self.cache.get_coalescing_iter(
+            1, FIXTURE_LENGTH, fallback=fallback)
+        self.assertEqual(FIXTURE_DATA, b''.join(coalescing_iter))
+        fallback.assert_not_called()
+
     @skip_if_disabled
     def test_gate_caching_iter_good_checksum(self):
         image = b"12345678990abcdefghijklmnop"
@@ -509,6 +672,41 @@ class ImageCacheTestCase(object):
         # checksum is invalid, caching will fail:
         self.assertFalse(cache.is_cached(image_id))
 
+    @skip_if_disabled
+    def test_caching_iter_metrics(self):
+        self.cache.metrics = metrics.CacheMetrics()
+        image = b"12345678990abcdefghijklmnop"
+        checksum = hashlib.md5(image, usedforsecurity=False).hexdigest()
+
+        for chunk in self.cache.get_caching_iter('good', checksum, [image]):
+            pass
+        self.assertRaises(exception.GlanceException, list,
+                          self.cache.get_caching_iter('bad', 'foobar',
+                                                      [image]))
+
+        result = self.cache.get_metrics()
+        self.assertEqual(2 * len(image),
+                         result['counters']['bytes_from_backend'])
+        self.assertEqual(1, result['counters']['fills_completed'])
+        self.assertEqual(1, result['counters']['fill_failures'])
+        self.assertEqual(1, result['counters']['checksum_aborts'])
+        self.assertEqual(1, result['histograms']['fill_time']['count'])
+
+    @skip_if_disabled
+    def test_prune_metrics(self):
+        self.cache.metrics = metrics.CacheMetrics()
+        self.config(image_cache_max_size=0)
+        FIXTURE_FILE = io.BytesIO(FIXTURE_DATA)
+        self.assertTrue(self.cache.cache_image_file('xxx', FIXTURE_FILE))
+
+        self.cache.prune()
+
+        result = self.cache.get_metrics()
+        self.assertEqual(1, result['counters']['prune_runs'])
+        self.assertEqual(1, result['counters']['pruned_files'])
+        self.assertEqual(FIXTURE_LENGTH, result['counters']['pruned_bytes'])
+        self.assertEqual(1, result['histograms']['prune_time']['count'])
+
 
 class TestImageCacheXattr(test_utils.BaseTestCase,
                           ImageCacheTestCase):
@@ -726,10 +924,108 @@ class TestImageCacheNoDep(test_utils.BaseTestCase):
 
         self.driver = OpenFailingDriver()
         cache = image_cache.ImageCache()
+        cache.metrics = metrics.CacheMetrics()
         data = [b'a', b'b', b'c', b'd', b'e', b'f']
 
         caching_iter = cache.get_caching_iter('dummy_id', None, iter(data))
         self.assertEqual(data, list(caching_iter))
+        counters = cache.get_metrics()['counters']
+        self.assertEqual(1, counters['fill_failures'])
+        self.assertEqual(len(data), counters['bytes_from_backend'])
+
+
+class TestCacheMetrics(test_utils.BaseTestCase):
+
+    def test_to_dict(self):
+        cache_metrics = metrics.CacheMetrics()
+        result = cache_metrics.to_dict()
+        self.assertIsNone(result['hit_ratio'])
+        self.assertEqual(0, result['counters']['hits'])
+
+        cache_metrics.incr('hits', 3)
+        cache_metrics.incr('misses')
+        cache_metrics.observe('fill_time', 0.02)
+        cache_metrics.observe('fill_time', 1000)
+
+        result = cache_metrics.to_dict()
+        self.assertEqual(0.75, result['hit_ratio'])
+        fill_time = result['histograms']['fill_time']
+        self.assertEqual(2, fill_time['count'])
+        self.assertEqual(1000.02, fill_time['sum'])
+        self.assertEqual(0, fill_time['buckets']['0.01'])
+        self.assertEqual(1, fill_time['buckets']['0.05'])
+        self.assertEqual(1, fill_time['buckets']['300'])
+        self.assertEqual(2, fill_time['buckets']['+Inf'])
+
+    def test_count_bytes(self):
+        cache_metrics = metrics.CacheMetrics()
+        data = [b'abc', b'de']
+
+        self.assertEqual(data, list(cache_metrics.count_bytes(
+            iter(data), 'bytes_from_cache', started_at=time.monotonic())))
+
+        result = cache_metrics.to_dict()
+        self.assertEqual(5, result['counters']['bytes_from_cache'])
+        self.assertEqual(
+            1, result['histograms']['hit_time_to_first_byte']['count'])
+
+
+class TestImageMetadataCache(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(TestImageMetadataCache, self).setUp()
+        self.config(image_cache_metadata_ttl=60)
+        self.metadata_cache = metadata.ImageMetadataCache()
+        self.image = mock.Mock(image_id='image1')
+        self.context = context.RequestContext(project_id='tenant1')
+
+    def test_get_set(self):
+        self.assertIsNone(self.metadata_cache.get(self.context, 'image1'))
+        self.metadata_cache.set(self.context, self.image,
+                                self.metadata_cache.generation)
+        self.assertEqual(self.image,
+                         self.metadata_cache.get(self.context, 'image1'))
+
+        # The image may not be visible to other projects
+        other_context = context.RequestContext(project_id='tenant2')
+        self.assertIsNone(self.metadata_cache.get(other_context, 'image1'))
+
+    def test_disabled(self):
+        self.config(image_cache_metadata_ttl=0)
+        self.metadata_cache.set(self.context, self.image,
+                                self.metadata_cache.generation)
+        self.assertIsNone(self.metadata_cache.get(self.context, 'image1'))
+
+    def test_expired(self):
+        self.metadata_cache.set(self.context, self.image,
+                                self.metadata_cache.generation)
+        with mock.patch('time.monotonic',
+                        return_value=time.monotonic() + 120):
+            self.assertIsNone(self.metadata_cache.get(self.context,
+                                                      'image1'))
+
+    def test_invalidate(self):
+        self.metadata_cache.set(self.context, self.image,
+                                self.metadata_cache.generation)
+        self.metadata_cache.invalidate('image1')
+        self.assertIsNone(self.metadata_cache.get(self.context, 'image1'))
+
+    def test_set_after_invalidate(self):
+        # An image read before it was invalidated must not be cached
+        generation = self.metadata_cache.generation
+        self.metadata_cache.invalidate('image1')
+        self.metadata_cache.set(self.context, self.image, generation)
+        self.assertIsNone(self.metadata_cache.get(self.context, 'image1'))
+
+    @mock.patch.object(metadata, 'MAX_IMAGES', new=2)
+    def test_evict(self):
+        for image_id in ('image1', 'image2', 'image3'):
+            self.metadata_cache.set(self.context,
+                                    mock.Mock(image_id=image_id),
+                                    self.metadata_cache.generation)
+        self.assertIsNone(self.metadata_cache.get(self.context, 'image1'))
+        self.assertIsNotNone(self.metadata_cache.get(self.context,
+                                                     'image3'))
 
 
 class TestImagePrefetcher(test_utils.BaseTestCase):
@@ -741,6 +1037,37 @@ class TestImagePrefetcher(test_utils.BaseTestCase):
                     image_cache_max_size=5 * units.Ki)
         self.prefetcher = prefetcher.Prefetcher()
 
+    def test_fetch_image_into_cache_already_cached(self):
+        with mock.patch.object(self.prefetcher, 'cache') as mock_cache:
+            mock_cache.is_cached.return_value = True
+            with mock.patch.object(self.prefetcher.gateway,
+                                   'get_repo') as mock_get:
+                self.assertTrue(
+                    self.prefetcher.fetch_image_into_cache('fake-image-id'))
+                mock_get.assert_not_called()
+            mock_cache.delete_queued_image.assert_called_once_with(
+                'fake-image-id')
+
+    def test_run_in_priority_order(self):
+        self.config(image_cache_prefetch_workers=1)
+        with mock.patch.object(self.prefetcher, 'cache') as mock_cache:
+            mock_cache.get_prefetch_queue.return_value = ['2', '1']
+            with mock.patch.object(self.prefetcher,
+                                   'fetch_image_into_cache',
+                                   return_value=True) as mock_fetch:
+                self.assertTrue(self.prefetcher.run())
+        self.assertEqual([mock.call('2'), mock.call('1')],
+                         mock_fetch.call_args_list)
+
+    @mock.patch('time.sleep')
+    def test_rate_limiter(self, mock_sleep):
+        with mock.patch('time.monotonic', return_value=100.0):
+            limiter = prefetcher.RateLimiter(1000)
+            self.assertEqual([b'a' * 500, b'b' * 1500],
+                             list(limiter.limit([b'a' * 500,
+                                                 b'b' * 1500])))
+        mock_sleep.assert_has_calls([mock.call(0.5), mock.call(2.0)])
+
     def test_fetch_image_into_cache_without_auth(self):
         with mock.patch.object(self.prefetcher.gateway,
                                'get_repo') as mock_get:
@@ -679,6 +679,24 @@ class TestManage(TestManageBase):
                                db_api.get_engine(),
                                '/mock/')
 
+    @mock.patch.object(db_api, 'project_usage_reconcile', return_value=3)
+    @mock.patch('glance.context.get_admin_context')
+    def test_db_reconcile_usage(self, mock_context, mock_reconcile):
+        self._main_test_helper(['glance.cmd.manage', 'db', 'reconcile_usage'],
+                               db_api.project_usage_reconcile,
+                               mock_context.return_value, project_id=None)
+        self.assertIn('Rebuilt the usage counters of 3 project(s)',
+                      self.output.getvalue())
+
+    @mock.patch.object(db_api, 'project_usage_reconcile', return_value=1)
+    @mock.patch('glance.context.get_admin_context')
+    def test_db_reconcile_usage_project(self, mock_context, mock_reconcile):
+        self._main_test_helper(['glance.cmd.manage', 'db', 'reconcile_usage',
+                                '--project_id', 'project1'],
+                               db_api.project_usage_reconcile,
+                               mock_context.return_value,
+                               project_id='project1')
+
     def test_db_no_action_shows_help(self):
         """Test that running 'glance-manage db' without action shows help."""
         self.useFixture(
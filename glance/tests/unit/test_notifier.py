@@ -170,6 +170,11 @@ class TestImageNotifications(utils.BaseTestCase):
         if 'location' in output_log['payload']:
             self.fail('Notification contained location field.')
 
+    @mock.patch('glance.image_cache.metadata.invalidate')
+    def test_image_save_invalidates_cached_metadata(self, mock_invalidate):
+        self.image_repo_proxy.save(self.image_proxy)
+        mock_invalidate.assert_called_once_with(UUID1)
+
     def test_image_save_notification_disabled(self):
         self.config(disabled_notifications=["image.update"])
         self.image_repo_proxy.save(self.image_proxy)
@@ -573,6 +578,13 @@ class TestImageMemberNotifications(utils.BaseTestCase):
         self.assertEqual('image.member.create', output_log['event_type'])
         self._assert_image_member_with_notifier(output_log)
 
+    @mock.patch('glance.image_cache.metadata.invalidate')
+    def test_image_member_add_invalidates_cached_metadata(
+            self, mock_invalidate):
+        self.image_member_repo_proxy.add(self.image_member_proxy)
+        mock_invalidate.assert_called_once_with(
+            self.image_member_proxy.image_id)
+
     def test_image_member_add_notification_disabled(self):
         self.config(disabled_notifications=['image.member.create'])
         self.image_member_repo_proxy.add(self.image_member_proxy)
@@ -292,6 +292,27 @@ class TestPolicyEnforcer(base.IsolatedUnitTest):
         self.assertRaises(exception.Forbidden,
                           enforcer.enforce, context, 'get_image', {})
 
+    def test_policy_get_target_keys(self):
+        rules = {"get_image": "project_id:%(project_id)s or "
+                              "'public':%(visibility)s or rule:is_member",
+                 "is_member": "project_id:%(member_id)s and not "
+                              "role:%(os_role)s"}
+        self.set_policy_rules(rules)
+
+        enforcer = glance.api.policy.Enforcer(
+            suppress_deprecation_warnings=True)
+        self.assertEqual(('member_id', 'os_role', 'project_id', 'visibility'),
+                         enforcer.get_target_keys('get_image'))
+
+    def test_policy_get_target_keys_unknown_check(self):
+        rules = {"get_image": "project_id:%(project_id)s or "
+                              "http://example.com/check"}
+        self.set_policy_rules(rules)
+
+        enforcer = glance.api.policy.Enforcer(
+            suppress_deprecation_warnings=True)
+        self.assertIsNone(enforcer.get_target_keys('get_image'))
+
     def test_policy_file_custom_location(self):
         self.config(policy_file=os.path.join(self.test_dir, 'gobble.gobble'),
                     group='oslo_policy')
@@ -591,6 +612,12 @@ class TestImageTarget(base.IsolatedUnitTest):
         self.assertEqual(image.owner, target['project_id'])
         self.assertEqual(image.owner, target['owner'])
 
+    def test_image_target_keys_exclude_methods(self):
+        target = glance.api.policy.ImageTarget(ImageStub())
+        self.assertIn('owner', list(target))
+        self.assertNotIn('get_data', list(target))
+        self.assertNotIn('get_changes', list(target))
+
     def test_image_target_transforms(self):
         fake_image = mock.MagicMock()
         fake_image.image_id = mock.sentinel.image_id
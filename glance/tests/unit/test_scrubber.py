@@ -21,6 +21,9 @@ import glance_store
 from oslo_config import cfg
 
 from glance.common import exception
+from glance import context
+import glance.db
+from glance.db.simple import api as simple_db
 from glance.db.sqlalchemy import api as db_api
 from glance import scrubber
 from glance.tests import utils as test_utils
@@ -95,12 +98,11 @@ class TestScrubber(test_utils.BaseTestCase):
     def test_scrubber_exits(self):
         # Checks for Scrubber exits when it is not able to fetch jobs from
         # the queue
-        scrub_jobs = scrubber.ScrubDBQueue.get_all_locations
-        scrub_jobs = mock.MagicMock()
-        scrub_jobs.side_effect = exception.NotFound
         scrub = scrubber.Scrubber(glance_store)
-        self.assertRaises(exception.FailedToGetScrubberJobs,
-                          scrub._get_delete_jobs)
+        with patch.object(scrub.db_queue, 'iter_locations',
+                          side_effect=exception.NotFound):
+            self.assertRaises(exception.FailedToGetScrubberJobs,
+                              scrub._get_delete_jobs)
 
     @mock.patch.object(db_api, "image_restore")
     def test_scrubber_revert_image_status(self, mock_image_restore):
@@ -117,56 +119,240 @@ class TestScrubber(test_utils.BaseTestCase):
                           scrub.revert_image_status,
                           'fake_id')
 
+    def test_scrubber_groups_streamed_locations(self):
+        scrub = scrubber.Scrubber(glance_store)
+        locations = [('image-00', 0, 'uri0'), ('image-00', 1, 'uri1'),
+                     ('image-01', 2, 'uri2')]
+
+        with patch.object(scrub.db_queue, 'iter_locations',
+                          return_value=iter(locations)), \
+                patch.object(scrub, '_scrub_image') as _mock_scrub_image:
+            scrub.run()
+
+        _mock_scrub_image.assert_has_calls(
+            [mock.call(('image-00', locations[:2])),
+             mock.call(('image-01', locations[2:]))], any_order=True)
+
+    def test_scrub_image_uses_store_pools(self):
+        self.config(enabled_backends={'fast': 'file', 'slow': 'file'})
+        scrub = scrubber.Scrubber(glance_store)
+        items = [('image', 1, 'uri1', 'fast'), ('image', 2, 'uri2', 'slow')]
+
+        with patch.object(scrub, '_delete_image_location_from_backend') as (
+                _mock_delete), \
+                patch.object(db_api, 'image_get',
+                             return_value={'status': 'pending_delete'}), \
+                patch.object(db_api, 'image_update') as _mock_update:
+            scrub._scrub_image(('image', items))
+
+        _mock_delete.assert_has_calls(
+            [mock.call('image', 1, 'uri1', backend='fast'),
+             mock.call('image', 2, 'uri2', backend='slow')], any_order=True)
+        _mock_update.assert_called_once_with(scrub.admin_context, 'image',
+                                             {'status': 'deleted'})
+        self.assertEqual({'fast', 'slow'}, set(scrub.store_executors))
+        self.assertEqual({'scrubbed': 1, 'failed': 0},
+                         {k: v for k, v in scrub.stats.stores['slow'].items()
+                          if k != 'seconds'})
+
+    @mock.patch('concurrent.futures.ThreadPoolExecutor')
+    def test_store_pool_size_defaults_to_scrub_pool_size(self, mock_pool):
+        self.config(scrub_pool_size=4)
+        scrub = scrubber.Scrubber(glance_store)
+        scrub._get_store_executor('fast')
+        self.config(scrub_store_pool_size=2)
+        scrub._get_store_executor('slow')
+
+        self.assertEqual([mock.call(max_workers=4), mock.call(max_workers=4),
+                          mock.call(max_workers=2)],
+                         mock_pool.call_args_list)
+
+    def test_scrub_image_location_failure(self):
+        self.config(enabled_backends={'fast': 'file', 'slow': 'file'})
+        scrub = scrubber.Scrubber(glance_store)
+        items = [('image', 1, 'uri1', 'fast'), ('image', 2, 'uri2', 'slow')]
+
+        def fake_delete(image_id, loc_id, uri, backend=None):
+            if backend == 'slow':
+                raise Exception('slow store failure')
+
+        with patch.object(scrub, '_delete_image_location_from_backend',
+                          side_effect=fake_delete), \
+                patch.object(db_api, 'image_update') as _mock_update:
+            scrub._scrub_image(('image', items))
+
+        _mock_update.assert_not_called()
+        self.assertEqual(1, scrub.stats.stores['fast']['scrubbed'])
+        self.assertEqual(1, scrub.stats.stores['slow']['failed'])
+
+
+class TestStoreRateLimiter(test_utils.BaseTestCase):
+
+    @mock.patch('time.sleep')
+    @mock.patch('time.monotonic', return_value=100.0)
+    def test_wait_spaces_out_deletes(self, mock_monotonic, mock_sleep):
+        limiter = scrubber.StoreRateLimiter(4)
+        for x in range(3):
+            limiter.wait()
+
+        mock_sleep.assert_has_calls([mock.call(0.25), mock.call(0.5)])
+
+    @mock.patch('time.sleep')
+    def test_wait_without_limit(self, mock_sleep):
+        limiter = scrubber.StoreRateLimiter(0)
+        for x in range(3):
+            limiter.wait()
+
+        mock_sleep.assert_not_called()
+
+
+class TestDaemon(test_utils.BaseTestCase):
+
+    def _make_application(self, daemon, runs, side_effect=None):
+        application = mock.MagicMock()
+        results = list(side_effect or [0] * runs)
+
+        def fake_run():
+            result = results.pop(0)
+            if not results:
+                daemon.stop()
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        application.run.side_effect = fake_run
+        return application
+
+    def test_runs_until_stopped(self):
+        daemon = scrubber.Daemon(wakeup_time=0)
+        application = self._make_application(daemon, 3)
+
+        daemon.start(application)
+        daemon.wait()
+
+        self.assertEqual(3, application.run.call_count)
+        self.assertTrue(daemon.future.done())
+
+    def test_run_failure_does_not_stop_daemon(self):
+        daemon = scrubber.Daemon(wakeup_time=0)
+        application = self._make_application(
+            daemon, 2, side_effect=[Exception('db down'), 5])
+
+        daemon.start(application)
+        daemon.wait()
+
+        self.assertEqual(2, application.run.call_count)
+
+    def test_get_delay_is_jittered(self):
+        daemon = scrubber.Daemon(wakeup_time=100)
+        for x in range(10):
+            delay = daemon._get_delay()
+            self.assertGreaterEqual(delay, 100)
+            self.assertLessEqual(
+                delay, 100 * (1 + scrubber.DAEMON_WAKEUP_JITTER))
+
 
 class TestScrubDBQueue(test_utils.BaseTestCase):
 
     def setUp(self):
         super(TestScrubDBQueue, self).setUp()
 
-    def _create_image_list(self, count):
-        images = []
-        for x in range(count):
-            images.append({'id': x})
-
-        return images
+    def _create_location_list(self, count, per_image=2):
+        return [{'image_id': 'image-%02d' % (x // per_image),
+                 'id': x,
+                 'url': 'file://some/path/%d' % x,
+                 'metadata': {'store': 'fast'}}
+                for x in range(count)]
 
-    def test_get_all_images(self):
+    @mock.patch.object(scrubber, 'REASONABLE_DB_PAGE_SIZE', 4)
+    def test_iter_locations_paged(self):
         scrub_queue = scrubber.ScrubDBQueue()
-        images = self._create_image_list(15)
-        image_pager = ImagePager(images)
+        locations = self._create_location_list(10)
+        pager = ImagePager(locations, page_size=4)
+
+        with patch.object(db_api, 'image_location_get_pending_delete') as (
+                _mock_get_locations):
+            _mock_get_locations.side_effect = (
+                lambda ctx, deleted_before, marker=None, limit=None: pager())
+            actual = list(scrub_queue.iter_locations())
+
+        self.assertEqual([(loc['image_id'], loc['id'], loc['url'])
+                          for loc in locations], actual)
+        # The last page is short, so no empty page is fetched
+        self.assertEqual(3, _mock_get_locations.call_count)
+        self.assertEqual(('image-01', 3),
+                         _mock_get_locations.call_args_list[1][1]['marker'])
+
+    def test_iter_locations_multi_store(self):
+        self.config(enabled_backends={'fast': 'file'})
+        scrub_queue = scrubber.ScrubDBQueue()
+        locations = self._create_location_list(2)
+
+        with patch.object(db_api, 'image_location_get_pending_delete',
+                          side_effect=[locations]):
+            actual = list(scrub_queue.iter_locations())
+
+        self.assertEqual([('image-00', 0, 'file://some/path/0', 'fast'),
+                          ('image-00', 1, 'file://some/path/1', 'fast')],
+                         actual)
+
+
+class TestScrubDBQueueSimpleDriver(test_utils.BaseTestCase):
 
-        def make_get_images_detailed(pager):
-            def mock_get_images_detailed(ctx, filters, marker=None,
-                                         limit=None):
-                return pager()
-            return mock_get_images_detailed
+    def setUp(self):
+        super(TestScrubDBQueueSimpleDriver, self).setUp()
+        simple_db.reset()
+        self.addCleanup(simple_db.reset)
+        patcher = patch.object(glance.db, 'get_api', return_value=simple_db)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, scrubber, '_db_queue', None)
+        self.context = context.get_admin_context(show_deleted=True)
+
+    def _create_pending_delete_image(self, image_id, location_count):
+        locations = [{'url': 'file://some/path/%s/%d' % (image_id, x),
+                      'metadata': {}, 'status': 'active'}
+                     for x in range(location_count)]
+        image = simple_db.image_create(
+            self.context, {'id': image_id, 'status': 'active',
+                           'locations': locations})
+        for loc in image['locations']:
+            simple_db.image_location_delete(
+                self.context, image_id, loc['id'], 'pending_delete')
+        simple_db.image_update(self.context, image_id,
+                               {'status': 'pending_delete'})
+        simple_db.image_destroy(self.context, image_id)
+        return sorted((image_id, loc['id'], loc['url'])
+                      for loc in image['locations'])
+
+    @mock.patch.object(scrubber, 'REASONABLE_DB_PAGE_SIZE', 2)
+    def test_iter_locations(self):
+        self.config(scrub_time=0)
+        expected = (self._create_pending_delete_image('image-00', 3) +
+                    self._create_pending_delete_image('image-01', 2))
+        # Locations of images which are not pending delete are ignored
+        simple_db.image_create(
+            self.context,
+            {'id': 'image-02', 'status': 'active',
+             'locations': [{'url': 'file://some/path/active',
+                            'metadata': {}, 'status': 'active'}]})
 
-        with patch.object(db_api, 'image_get_all') as (
-                _mock_get_images_detailed):
-            _mock_get_images_detailed.side_effect = (
-                make_get_images_detailed(image_pager))
-            actual = list(scrub_queue._get_all_images())
+        scrub_queue = scrubber.ScrubDBQueue()
+        self.assertEqual(expected, list(scrub_queue.iter_locations()))
 
-        self.assertEqual(images, actual)
+    def test_iter_locations_scrub_time(self):
+        self.config(scrub_time=3600)
+        self._create_pending_delete_image('image-00', 2)
 
-    def test_get_all_images_paged(self):
         scrub_queue = scrubber.ScrubDBQueue()
-        images = self._create_image_list(15)
-        image_pager = ImagePager(images, page_size=4)
-
-        def make_get_images_detailed(pager):
-            def mock_get_images_detailed(ctx, filters, marker=None,
-                                         limit=None):
-                return pager()
-            return mock_get_images_detailed
-
-        with patch.object(db_api, 'image_get_all') as (
-                _mock_get_images_detailed):
-            _mock_get_images_detailed.side_effect = (
-                make_get_images_detailed(image_pager))
-            actual = list(scrub_queue._get_all_images())
-
-        self.assertEqual(images, actual)
+        self.assertEqual([], list(scrub_queue.iter_locations()))
+
+    def test_scrubber_get_delete_jobs(self):
+        self.config(scrub_time=0)
+        expected = self._create_pending_delete_image('image-00', 2)
+
+        scrub = scrubber.Scrubber(glance_store)
+        self.assertEqual({'image-00': expected}, scrub._get_delete_jobs())
 
 
 class ImagePager(object):
@@ -16,6 +16,8 @@ import threading
 import time
 from unittest import mock
 
+import webob
+
 from glance.api.v2 import cached_images
 from glance import notifier
 import glance.tests.unit.utils as unit_test_utils
@@ -114,7 +116,8 @@ class TestCacheManageAPI(test_utils.BaseTestCase):
              'cache_delete'], image_mock=False)
 
     def test_get_cache_state(self):
-        self._main_test_helper(['get_cached_images,get_queued_images',
+        self._main_test_helper(['get_cached_images,get_queued_images,'
+                                'get_metrics',
                                 'get_cache_state',
                                 'cache_list'], image_mock=False)
 
@@ -134,13 +137,66 @@ class TestCacheManageAPI(test_utils.BaseTestCase):
                 e.assert_called_once_with(self.req, new_policy='cache_prune')
                 ic.prune.assert_called_once()
 
+    def test_prune_cache_dry_run(self):
+        self.req.headers['x-image-cache-prune-dry-run'] = 'true'
+        report = {'lru': {'images': [UUID1], 'total_files': 1,
+                          'total_bytes': 1024}}
+        with mock.patch.object(cached_images.CacheController,
+                               '_enforce') as e:
+            with mock.patch('glance.image_cache.ImageCache') as ic:
+                cc = cached_images.CacheController()
+                cc.cache = ic
+                ic.get_prune_report.return_value = report
+                result = cc.prune_cache(self.req)
+                e.assert_called_once_with(self.req, new_policy='cache_prune')
+                ic.prune.assert_not_called()
+                self.assertEqual({'eviction_policy': 'lru',
+                                  'policies': report}, result)
+
+    def test_prune_cache_dry_run_invalid(self):
+        self.req.headers['x-image-cache-prune-dry-run'] = 'maybe'
+        with mock.patch.object(cached_images.CacheController, '_enforce'):
+            with mock.patch('glance.image_cache.ImageCache') as ic:
+                cc = cached_images.CacheController()
+                cc.cache = ic
+                self.assertRaises(webob.exc.HTTPBadRequest,
+                                  cc.prune_cache, self.req)
+                ic.prune.assert_not_called()
+
     @mock.patch.object(cached_images, 'WORKER')
-    def test_queue_image_from_api(self, mock_worker):
-        self._main_test_helper(['queue_image',
-                                'queue_image_from_api',
-                                'cache_image',
-                                UUID1])
-        mock_worker.submit.assert_called_once_with(UUID1)
+    def _test_queue_image_from_api(self, mock_worker, priority=0):
+        with mock.patch.object(notifier.ImageRepoProxy, 'get') as mock_get:
+            image = FakeImage()
+            mock_get.return_value = image
+            with mock.patch.object(cached_images.CacheController,
+                                   '_enforce') as e:
+                with mock.patch('glance.image_cache.ImageCache') as ic:
+                    cc = cached_images.CacheController()
+                    cc.cache = ic
+                    cc.queue_image_from_api(self.req, UUID1)
+                    e.assert_called_once_with(self.req, image=image,
+                                              new_policy='cache_image')
+                    ic.queue_image.assert_called_once_with(
+                        UUID1, priority=priority)
+        mock_worker.submit.assert_called_once_with(UUID1, priority=priority)
+
+    def test_queue_image_from_api(self):
+        self._test_queue_image_from_api()
+
+    def test_queue_image_from_api_with_priority(self):
+        self.req.headers['x-image-cache-priority'] = '10'
+        self._test_queue_image_from_api(priority=10)
+
+    @mock.patch.object(cached_images, 'WORKER')
+    def test_queue_image_from_api_invalid_priority(self, mock_worker):
+        self.req.headers['x-image-cache-priority'] = 'high'
+        with mock.patch('glance.image_cache.ImageCache') as ic:
+            cc = cached_images.CacheController()
+            cc.cache = ic
+            self.assertRaises(webob.exc.HTTPBadRequest,
+                              cc.queue_image_from_api, self.req, UUID1)
+            ic.queue_image.assert_not_called()
+        mock_worker.submit.assert_not_called()
 
     def test_clean_cache_concurrent_execution(self):
         """Test that concurrent clean_cache calls are serialized."""
@@ -273,3 +329,14 @@ class TestCacheWorker(test_utils.BaseTestCase):
         self.assertFalse(worker.is_alive())
         mock_pf.return_value.fetch_image_into_cache.assert_has_calls([
             mock.call('123'), mock.call('456')])
+
+    @mock.patch('glance.image_cache.prefetcher.Prefetcher')
+    def test_worker_priority(self, mock_pf):
+        worker = cached_images.CacheWorker()
+        worker.submit('123')
+        worker.submit('456', priority=5)
+        worker.submit('789')
+        worker.start()
+        worker.terminate()
+        mock_pf.return_value.fetch_image_into_cache.assert_has_calls([
+            mock.call('456'), mock.call('123'), mock.call('789')])
@@ -0,0 +1,121 @@
+# Copyright 2026 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare the image list pipeline with the full image repo.
+
+The images listed through Gateway.get_readonly_repo must serialize exactly
+like the ones listed through Gateway.get_repo. The throughput of both paths
+is attached to the results of the tests as images/sec, it is not asserted
+on since it depends on the test node.
+"""
+
+import datetime
+import time
+
+from testtools import content as ttc
+
+import glance.api.v2.images
+from glance import gateway
+from glance.tests.unit import base
+import glance.tests.unit.utils as unit_test_utils
+
+DATETIME = datetime.datetime(2012, 5, 16, 15, 27, 36, 325355)
+BASE_URI = unit_test_utils.BASE_URI
+TENANT1 = unit_test_utils.TENANT1
+TENANT2 = unit_test_utils.TENANT2
+
+IMAGE_COUNT = 100
+ROUNDS = 5
+
+
+class TestImagesListBenchmark(base.IsolatedUnitTest):
+
+    def setUp(self):
+        super(TestImagesListBenchmark, self).setUp()
+        self.db = unit_test_utils.FakeDB(initialize=False)
+        self.policy = unit_test_utils.FakePolicyEnforcer()
+        self.notifier = unit_test_utils.FakeNotifier()
+        self.store = unit_test_utils.FakeStoreAPI()
+        self.serializer = glance.api.v2.images.ResponseSerializer()
+        self._create_images()
+
+    def _create_images(self):
+        for i in range(IMAGE_COUNT):
+            image_id = 'image-%04d' % i
+            properties = {'spl_read_prop': 'r', 'spl_update_prop': 'u',
+                          'forbidden': 'f', 'prop_%d' % (i % 10): str(i)}
+            self.db.image_create(None, {
+                'id': image_id, 'name': 'image %d' % i,
+                'owner': TENANT1 if i % 2 else TENANT2,
+                'visibility': 'public' if i % 3 else 'private',
+                'status': 'active', 'size': 1024, 'virtual_size': 2048,
+                'disk_format': 'raw', 'container_format': 'bare',
+                'checksum': None, 'os_hash_algo': None,
+                'os_hash_value': None, 'protected': False,
+                'min_ram': 0, 'min_disk': 0, 'properties': properties,
+                'locations': [{'url': '%s/%s' % (BASE_URI, image_id),
+                               'metadata': {}, 'status': 'active'}],
+                'created_at': DATETIME, 'updated_at': DATETIME})
+            self.db.image_tag_set_all(None, image_id, ['ping', 'pong'])
+
+    def _list(self, context, get_repo):
+        images = get_repo(context).list(limit=IMAGE_COUNT)
+        return [self.serializer._format_image(image) for image in images]
+
+    def _measure(self, name, context, get_repo):
+        start = time.monotonic()
+        for i in range(ROUNDS):
+            images = self._list(context, get_repo)
+        elapsed = max(time.monotonic() - start, 1e-9)
+        self.addDetail('%s images/sec' % name, ttc.text_content(
+            '%.1f' % (len(images) * ROUNDS / elapsed)))
+        return images
+
+    def _test_list(self, context):
+        image_gateway = gateway.Gateway(self.db, self.store, self.notifier,
+                                        self.policy)
+        expected = self._measure('get_repo', context, image_gateway.get_repo)
+        actual = self._measure('get_readonly_repo', context,
+                               image_gateway.get_readonly_repo)
+        self.assertNotEqual([], actual)
+        self.assertEqual(expected, actual)
+        return actual
+
+    def test_list(self):
+        request = unit_test_utils.get_fake_request(tenant=TENANT1)
+        images = self._test_list(request.context)
+        self.assertIn('forbidden', images[0])
+
+    def test_list_admin(self):
+        request = unit_test_utils.get_fake_request(is_admin=True)
+        images = self._test_list(request.context)
+        self.assertEqual(IMAGE_COUNT, len(images))
+
+    def test_list_property_protections(self):
+        self.set_property_protections()
+        request = unit_test_utils.get_fake_request(roles=['spl_role'])
+        images = self._test_list(request.context)
+        for image in images:
+            self.assertEqual('r', image['spl_read_prop'])
+            self.assertNotIn('forbidden', image)
+
+    def test_list_show_locations(self):
+        self.config(show_multiple_locations=True)
+        self.config(show_image_direct_url=True)
+        request = unit_test_utils.get_fake_request(tenant=TENANT1)
+        images = self._test_list(request.context)
+        for image in images:
+            self.assertEqual(image['locations'][0]['url'],
+                             image['direct_url'])
@@ -35,6 +35,7 @@ import glance.api.v2.image_actions
 import glance.api.v2.images
 from glance.common import exception
 from glance.common import store_utils
+from glance.common import wsgi
 from glance import domain
 import glance.notifier
 import glance.schema
@@ -325,6 +326,24 @@ class TestImagesController(base.IsolatedUnitTest):
         expected = set([UUID3])
         self.assertEqual(expected, actual)
 
+    def test_index_with_policy_enforcer(self):
+        request = unit_test_utils.get_fake_request()
+        expected = [image.image_id
+                    for image in self.controller.index(request)['images']]
+        enforcer = glance.api.policy.Enforcer(
+            suppress_deprecation_warnings=True)
+        # NOTE: The get_image decisions are memoized on the target keys
+        # read from the rules of the enforcer.
+        self.assertIsNotNone(enforcer.get_target_keys('get_image'))
+        self.controller = glance.api.v2.images.ImagesController(self.db,
+                                                                enforcer,
+                                                                self.notifier,
+                                                                self.store)
+        output = self.controller.index(unit_test_utils.get_fake_request())
+        self.assertNotEqual([], expected)
+        self.assertEqual(expected,
+                         [image.image_id for image in output['images']])
+
     def test_index_member_status_accepted(self):
         self.config(limit_param_default=5, api_limit_max=5)
         request = unit_test_utils.get_fake_request(tenant=TENANT2)
@@ -5776,7 +5795,31 @@ class TestImagesSerializer(test_utils.BaseTestCase):
         # The image index should work though the user is forbidden
         result['images'][0].locations = ImageLocations()
         self.serializer.index(response, result)
+        output = jsonutils.loads(response.body)
         self.assertEqual(http.OK, response.status_int)
+        self.assertEqual(len(self.fixtures), len(output['images']))
+
+    def test_index_format_image_error(self):
+        fixtures = self.fixtures
+
+        class FakeController(object):
+            def index(self, req):
+                return {'images': fixtures}
+
+        # NOTE: The images are formatted before the response is returned,
+        # so an error formatting any of them still sets its status.
+        resource = wsgi.Resource(FakeController(),
+                                 wsgi.JSONRequestDeserializer(),
+                                 self.serializer)
+        env = {'wsgiorg.routing_args': [None, {'action': 'index'}]}
+        request = wsgi.Request.blank('/v2/images', environ=env)
+        with mock.patch.object(self.serializer, '_format_image',
+                               side_effect=[{'id': UUID1},
+                                            webob.exc.HTTPForbidden()]):
+            response = resource(request)
+
+        self.assertIsInstance(response, webob.exc.HTTPForbidden)
+        self.assertEqual(http.FORBIDDEN, response.status_int)
 
     def test_show_full_fixture(self):
         expected = {
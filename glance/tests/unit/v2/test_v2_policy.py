@@ -16,6 +16,7 @@ from unittest import mock
 
 import webob.exc
 
+from glance.api import policy as base_policy
 from glance.api.v2 import policy
 from glance.common import exception
 from glance.tests import utils
@@ -90,6 +91,49 @@ class APIPolicyBase(utils.BaseTestCase):
         self.assertIsNone(policy.check_is_image_mutable(context, image))
 
 
+class APIImageListPolicy(utils.BaseTestCase):
+    def setUp(self):
+        super(APIImageListPolicy, self).setUp()
+        self.enforcer = mock.MagicMock(spec=base_policy.Enforcer)
+        self.enforcer.get_target_keys.return_value = ('project_id',
+                                                      'visibility')
+        self.context = mock.MagicMock()
+
+    def _image(self, owner, visibility, name):
+        image = mock.MagicMock()
+        image.owner = owner
+        image.visibility = visibility
+        image.name = name
+        return image
+
+    def test_check_get_image_memoized(self):
+        self.enforcer.enforce.side_effect = [None, exception.Forbidden]
+        list_policy = policy.ImageListAPIPolicy(self.context,
+                                                enforcer=self.enforcer)
+        self.enforcer.get_target_keys.assert_called_once_with('get_image')
+
+        images = [self._image('foo', 'shared', 'a'),
+                  self._image('foo', 'shared', 'b'),
+                  self._image('bar', 'private', 'c'),
+                  self._image('bar', 'private', 'd')]
+        self.assertEqual([True, True, False, False],
+                         [list_policy.check_get_image(image)
+                          for image in images])
+        self.assertEqual(2, self.enforcer.enforce.call_count)
+
+    def test_check_get_image_not_memoized(self):
+        self.enforcer.get_target_keys.return_value = None
+        list_policy = policy.ImageListAPIPolicy(self.context,
+                                                enforcer=self.enforcer)
+
+        images = [self._image('foo', 'shared', 'a'),
+                  self._image('foo', 'shared', 'b')]
+        self.assertEqual([True, True],
+                         [list_policy.check_get_image(image)
+                          for image in images])
+        self.assertEqual(2, self.enforcer.enforce.call_count)
+
+
 class APIImagePolicy(APIPolicyBase):
     def setUp(self):
         super(APIImagePolicy, self).setUp()